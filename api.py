@@ -1,30 +1,91 @@
-from fastapi import FastAPI, HTTPException, Depends
-from pydantic import BaseModel
+import time
+_BOOT_START = time.perf_counter()
+
+import asyncio
+import base64
+import binascii
+import collections
+import contextlib
+import hashlib
+import importlib
+import os
+import re
+import sys
+import threading
+
+# Per-module import times in seconds, reported by /startup-report
+STARTUP_TIMINGS = {}
+
+# Workers are expected to finish importing this module inside this budget
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "1.0"))
+
+def timed_import(module_name):
+    """Import a module and record how long its first import took"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    STARTUP_TIMINGS[module_name] = round(time.perf_counter() - start, 4)
+    return module
+
+timed_import("fastapi")
+timed_import("pydantic")
+timed_import("dotenv")
+
+from fastapi import FastAPI, HTTPException, Depends, Request
+from pydantic import BaseModel, ValidationError, validator
 from typing import List, Optional
 import sqlite3
-import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
-from langchain.llms import OpenAI
-from langchain.chains import LLMChain
-from langchain.agents import load_tools, initialize_agent, AgentType
-from langchain.prompts import PromptTemplate
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-import os
-import streamlit as st
-from googletrans import Translator
-
-# Use Streamlit secrets if available, otherwise try to load from .env
-try:
-    # When running in Streamlit Cloud
-    os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
-    # If you have a SerpAPI key, uncomment this:
-    # os.environ["SERPAPI_API_KEY"] = st.secrets.get("SERPAPI_API_KEY", "")
-except:
+from fastapi.responses import Response, StreamingResponse
+import prescription_store
+from consultation_details import (
+    HISTORY_QUERY, delete_consultation_details, diagnosis_counts, diagnosis_rows, insert_diagnoses,
+    load_consultation_details, patients_with, save_consultation_details, symptom_counts, triage_consultations,
+    vitals_trend
+)
+from db_migrations import CACHE_TABLES, run_migrations
+from db_pool import ConnectionPool
+from diagnosis_parser import confirmed_diagnoses, parse_diagnosis
+from label_bundles import load_label_bundles
+from medication_parser import load_structured_medications, medications_to_markdown, parse_medications
+from vital_signs import numeric_vitals_from_dict
+
+def load_api_keys():
+    """
+    Load API keys without importing streamlit.
+    Inside the Streamlit process we reuse its already-loaded secrets; standalone
+    workers read .streamlit/secrets.toml directly and fall back to .env.
+    """
+    st = sys.modules.get("streamlit")
+    if st is not None:
+        try:
+            # When running in Streamlit Cloud
+            os.environ["OPENAI_API_KEY"] = st.secrets["OPENAI_API_KEY"]
+            # If you have a SerpAPI key, uncomment this:
+            # os.environ["SERPAPI_API_KEY"] = st.secrets.get("SERPAPI_API_KEY", "")
+            return
+        except Exception:
+            pass
+    
+    try:
+        import tomllib
+        with open(os.path.join(".streamlit", "secrets.toml"), "rb") as f:
+            secrets = tomllib.load(f)
+        os.environ["OPENAI_API_KEY"] = secrets["OPENAI_API_KEY"]
+        return
+    except Exception:
+        pass
+    
     # When running locally with .env file
     from dotenv import load_dotenv
     load_dotenv()
 
+load_api_keys()
+
 # Initialize FastAPI
 app = FastAPI()
 
@@ -40,26 +101,731 @@ app.add_middleware(
 # Database path
 DATABASE_PATH = "docassist.db"
 
-# Initialize LangChain components
+# Apply pending schema migrations when the API starts. Off by default: with
+# several workers every one of them would run it, so deploys run
+# db_init.py / db_migrations.py once instead.
+RUN_MIGRATIONS_ON_STARTUP = os.environ.get("RUN_MIGRATIONS_ON_STARTUP", "0") == "1"
+
+# SQLite connections kept open between requests, and how long (ms) a writer waits for a lock
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Upstream model used by the LLM-backed routes
+LLM_MODEL_NAME = os.environ.get("LLM_MODEL_NAME", "gpt-3.5-turbo")
+
+# Sampling temperature for every LLM call, streamed or not
+LLM_TEMPERATURE = 0.7
+
+# Keep-alive HTTP connections to the OpenAI API shared by all request threads
+LLM_POOL_SIZE = int(os.environ.get("LLM_POOL_SIZE", "32"))
+
+# Prompt templates for the LLM-backed routes: name -> (input variables, template)
+PROMPT_TEMPLATES = {
+    "diagnosis": (["patient_info"], "{patient_info}"),
+    "prescription": (["diagnosis"], """Generate a detailed prescription with appropriate medications available in the Pakistani market for this diagnosis: {diagnosis}
+            
+Include for each medication:
+1. Medication name
+2. Dosage information
+3. Frequency of administration
+4. Duration of treatment
+5. Common side effects
+6. Potential interactions with other medications
+7. Pregnancy safety information (FDA category and recommendations)
+
+Format your response as a structured and clear table with all the above information."""),
+    "prescription_json": (["request"], """{request}
+
+Respond with only a JSON array, no other text. Each element is one medication:
+{{"medication": "name and strength", "dosage": "...", "frequency": "...", "duration": "...", "side_effects": "...", "interactions": "...", "pregnancy_safety": "FDA category and recommendation"}}
+Every value is a string; use "" when something does not apply."""),
+}
+
+# Process-wide LLM client and chains, built on first use. None of these objects
+# hold per-request state (no memory is attached to the chains), so requests stay
+# isolated by passing their own inputs to run() rather than by rebuilding them.
+_llm_lock = threading.RLock()
+_llm_client = None
+_llm_chains = {}
+
+def _build_http_session():
+    """Create the pooled, keep-alive HTTP session used for OpenAI calls"""
+    requests = timed_import("requests")
+    adapters = timed_import("requests.adapters")
+    
+    session = requests.Session()
+    adapter = adapters.HTTPAdapter(pool_connections=4, pool_maxsize=LLM_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
 def get_llm():
-    # Create a new LLM instance for each request to avoid context leakage
-    return OpenAI(temperature=0.7, model_name="gpt-3.5-turbo")
+    """Return the shared LLM client, creating it and its connection pool on first use"""
+    global _llm_client
+    with _llm_lock:
+        if _llm_client is None:
+            openai = timed_import("openai")
+            # openai reuses this one session from every thread instead of opening
+            # a new session (and TLS handshake) per worker thread
+            openai.requestssession = _build_http_session()
+            
+            llms = timed_import("langchain.llms")
+            _llm_client = llms.OpenAI(temperature=LLM_TEMPERATURE, model_name=LLM_MODEL_NAME)
+        return _llm_client
 
-search_tools = load_tools(["serpapi"], llm=get_llm())
+def get_chain(name):
+    """Return the prebuilt LLMChain for one of PROMPT_TEMPLATES"""
+    with _llm_lock:
+        if name not in _llm_chains:
+            prompts = timed_import("langchain.prompts")
+            chains = timed_import("langchain.chains")
+            
+            input_variables, template = PROMPT_TEMPLATES[name]
+            prompt = prompts.PromptTemplate(input_variables=input_variables, template=template)
+            _llm_chains[name] = chains.LLMChain(llm=get_llm(), prompt=prompt)
+        return _llm_chains[name]
 
-# Initialize the agent
-agent = initialize_agent(
-    search_tools,
-    get_llm(),
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True
+# Concurrent upstream calls allowed per model; requests beyond this wait in line.
+# LLM_MODEL_CONCURRENCY overrides individual models, e.g. "gpt-4=4,gpt-3.5-turbo=24"
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "16"))
+LLM_MODEL_CONCURRENCY = dict(
+    (model.strip(), int(limit))
+    for model, limit in (
+        item.split("=", 1) for item in os.environ.get("LLM_MODEL_CONCURRENCY", "").split(",") if "=" in item
+    )
 )
 
-# Database connection helper
+class ModelLimiter:
+    """Caps concurrent calls to one upstream model and tracks its queue depth"""
+    
+    def __init__(self, model_name, limit):
+        self.model_name = model_name
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.in_flight = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_seconds = 0.0
+    
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        queued_at = time.perf_counter()
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.total_wait_seconds += time.perf_counter() - queued_at
+        
+        self.in_flight += 1
+        try:
+            yield
+            self.completed += 1
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.semaphore.release()
+    
+    def stats(self):
+        finished = self.completed + self.failed
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_seconds": round(self.total_wait_seconds / finished, 4) if finished else 0.0
+        }
+
+_model_limiters = {}
+
+def get_model_limiter(model_name):
+    """Return the limiter for an upstream model, creating it on first use"""
+    if model_name not in _model_limiters:
+        limit = LLM_MODEL_CONCURRENCY.get(model_name, LLM_CONCURRENCY)
+        _model_limiters[model_name] = ModelLimiter(model_name, limit)
+    return _model_limiters[model_name]
+
+# aiohttp session shared by all async OpenAI calls on this worker's event loop
+_aiohttp_session = None
+
+def _get_aiohttp_session():
+    global _aiohttp_session
+    if _aiohttp_session is None or _aiohttp_session.closed:
+        aiohttp = timed_import("aiohttp")
+        _aiohttp_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=LLM_POOL_SIZE, keepalive_timeout=60)
+        )
+    return _aiohttp_session
+
+async def run_chain_async(name, text):
+    """Run one of the prebuilt chains without blocking the event loop"""
+    async with get_model_limiter(LLM_MODEL_NAME).slot():
+        openai = timed_import("openai")
+        # aiosession is a ContextVar, so it is set for this request's task only
+        openai.aiosession.set(_get_aiohttp_session())
+        return await get_chain(name).arun(text)
+
+async def stream_chain_async(name, text):
+    """Yield the completion for one of the prebuilt chains token by token"""
+    input_variable = PROMPT_TEMPLATES[name][0][0]
+    prompt = get_chain(name).prompt.format(**{input_variable: text})
+    
+    async with get_model_limiter(LLM_MODEL_NAME).slot():
+        openai = timed_import("openai")
+        openai.aiosession.set(_get_aiohttp_session())
+        # Same request the chain would send, but streamed
+        response = await openai.ChatCompletion.acreate(
+            model=LLM_MODEL_NAME,
+            temperature=LLM_TEMPERATURE,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True
+        )
+        async for chunk in response:
+            token = chunk["choices"][0].get("delta", {}).get("content")
+            if token:
+                yield token
+
+def sse_event(data, event=None):
+    """Format one server-sent event with a JSON payload"""
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
+
+async def stream_chain_events(name, text, result_key, finalize=None):
+    """
+    Stream a chain as server-sent events: one "token" event per chunk, then a
+    "done" event carrying the full text under result_key (or an "error" event).
+    finalize, if given, is awaited with the full text to post-process it; it
+    returns the text, or a dict to send as the "done" payload.
+    """
+    tokens = []
+    try:
+        async for token in stream_chain_async(name, text):
+            tokens.append(token)
+            yield sse_event({"token": token})
+        
+        result = "".join(tokens)
+        if finalize is not None:
+            result = await finalize(result)
+        # finalize may return the whole payload instead of the text
+        yield sse_event(result if isinstance(result, dict) else {result_key: result}, event="done")
+    except Exception as e:
+        yield sse_event({"detail": str(e)}, event="error")
+
+def structure_diagnosis(diagnosis):
+    """Parse a diagnosis once, here, so clients get its sections as lists"""
+    return DiagnosisResult(**parse_diagnosis(diagnosis)).dict()
+
+def diagnosis_response(diagnosis):
+    return {"diagnosis": diagnosis, "structured": structure_diagnosis(diagnosis)}
+
+HISTORY_SUMMARY_HEADER = "PATIENT HISTORY SUMMARY:"
+
+def splice_history_summary(diagnosis, history_summary):
+    """Replace the placeholder history section of a diagnosis with the generated summary"""
+    if not history_summary or HISTORY_SUMMARY_HEADER not in diagnosis:
+        return diagnosis
+    
+    parts = diagnosis.split(HISTORY_SUMMARY_HEADER)
+    # Find the end of the history section
+    history_end = parts[1].find("DIAGNOSIS:")
+    if history_end <= 0:
+        return diagnosis
+    return parts[0] + HISTORY_SUMMARY_HEADER + "\n" + history_summary.strip() + "\n\n" + parts[1][history_end:]
+
+def consultation_set_hash(consultation_ids):
+    """Stable hash of the set of consultations a history summary was built from"""
+    key = ",".join(str(consultation_id) for consultation_id in sorted(set(consultation_ids)))
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+# Cache tables (CACHE_TABLES) are created by db_migrations.py, or lazily here on
+# databases that have not been migrated yet
+_ready_cache_tables = set()
+
+def ensure_cache_table(conn, name):
+    """Create one of CACHE_TABLES if this process has not done so yet"""
+    if name not in _ready_cache_tables:
+        # Runs inside the caller's transaction if one is open, so never commit here
+        conn.execute(CACHE_TABLES[name])
+        if not conn.in_transaction:
+            _ready_cache_tables.add(name)
+
+def get_cached_history_summary(patient_id, consultation_hash):
+    conn = get_db_connection()
+    try:
+        ensure_cache_table(conn, "history_summaries")
+        row = conn.execute(
+            "SELECT summary FROM history_summaries WHERE patient_id = ? AND consultation_hash = ?",
+            (patient_id, consultation_hash)
+        ).fetchone()
+        return row["summary"] if row else None
+    finally:
+        conn.close()
+
+def store_history_summary(patient_id, consultation_hash, summary):
+    conn = get_db_connection()
+    try:
+        ensure_cache_table(conn, "history_summaries")
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO history_summaries (patient_id, consultation_hash, summary, created_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (patient_id, consultation_hash, summary, datetime.now().isoformat())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+def invalidate_history_summaries(conn, patient_id):
+    """Drop cached summaries for a patient; runs inside the caller's transaction"""
+    ensure_cache_table(conn, "history_summaries")
+    conn.execute("DELETE FROM history_summaries WHERE patient_id = ?", (patient_id,))
+
+async def summarize_history(history_prompt, patient_id=None, consultation_ids=None):
+    """
+    Generate the patient history summary, reusing the stored summary when the
+    patient's consultations have not changed. A failure only loses the summary.
+    The cache is read and written in the threadpool, off the event loop.
+    """
+    consultation_hash = None
+    if patient_id and consultation_ids:
+        consultation_hash = consultation_set_hash(consultation_ids)
+        try:
+            cached = await run_in_threadpool(get_cached_history_summary, patient_id, consultation_hash)
+            if cached:
+                return cached
+        except sqlite3.Error as e:
+            print(f"History summary cache lookup failed: {e}")
+    
+    try:
+        summary = await run_chain_async("diagnosis", history_prompt)
+    except Exception as e:
+        print(f"History summary failed: {e}")
+        return None
+    
+    if consultation_hash and summary:
+        try:
+            await run_in_threadpool(store_history_summary, patient_id, consultation_hash, summary)
+        except sqlite3.Error as e:
+            print(f"History summary cache store failed: {e}")
+    return summary
+
+async def stream_diagnosis_events(request):
+    """Stream the diagnosis while the history summary is generated in parallel"""
+    summary_task = asyncio.ensure_future(
+        summarize_history(request.history_prompt, request.patient_id, request.consultation_ids)
+    )
+    
+    async def add_history_summary(diagnosis):
+        return diagnosis_response(splice_history_summary(diagnosis, await summary_task))
+    
+    try:
+        async for event in stream_chain_events("diagnosis", request.prompt, "diagnosis", finalize=add_history_summary):
+            yield event
+    finally:
+        # No-op once the summary has been used
+        summary_task.cancel()
+
+def sse_response(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream, which would defeat the point
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Prescription drafts for common diagnoses, reused across patients of the same
+# age band and gender. Doctors still review and edit every draft.
+PRESCRIPTION_CACHE_SIZE = int(os.environ.get("PRESCRIPTION_CACHE_SIZE", "256"))
+PRESCRIPTION_CACHE_TTL_SECONDS = float(os.environ.get("PRESCRIPTION_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+
+class PrescriptionCache:
+    """In-memory LRU cache with a time-to-live and hit/miss counters"""
+    
+    def __init__(self, max_size, ttl_seconds):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                entry = None
+            
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+prescription_cache = PrescriptionCache(PRESCRIPTION_CACHE_SIZE, PRESCRIPTION_CACHE_TTL_SECONDS)
+
+def normalize_diagnosis(diagnosis):
+    """
+    Reduce a confirmed diagnosis to a canonical form, so that e.g.
+    "Selected Diagnoses:\n• URTI" and "1. urti" share a cache entry
+    """
+    lines = []
+    for line in diagnosis.lower().splitlines():
+        line = re.sub(r"^\s*(?:[•*\-]|\d+[.)])\s*", "", line)
+        line = re.sub(r"[^\w\s/+-]", " ", line)
+        line = " ".join(line.split())
+        if line and line not in ("selected diagnoses", "additional notes"):
+            lines.append(line)
+    return "; ".join(sorted(set(lines)))
+
+def age_band(age):
+    """Group ages into bands that usually share dosing"""
+    try:
+        age = int(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    if age < 2:
+        return "0-1"
+    if age < 12:
+        return "2-11"
+    if age < 18:
+        return "12-17"
+    if age < 65:
+        return "18-64"
+    return "65+"
+
+def prompt_template_hash(name):
+    """Short hash of one of PROMPT_TEMPLATES, so a changed template never serves old drafts"""
+    return hashlib.sha256(PROMPT_TEMPLATES[name][1].encode("utf-8")).hexdigest()[:16]
+
+def prescription_cache_key(request, chain):
+    """
+    Cache key for a prescription request generated with one of the prompt
+    chains, or None if it must not be cached. Only structured drafts are cached:
+    a text draft can repeat the patient's name or other details from the prompt,
+    which would then be served to every patient with the same key.
+    """
+    if not request.structured or not request.diagnosis or request.age is None or not request.gender:
+        return None
+    normalized = normalize_diagnosis(request.diagnosis)
+    if not normalized:
+        return None
+    return (normalized, age_band(request.age), request.gender.strip().lower(), chain, prompt_template_hash(chain))
+
+def cacheable_prescription(result):
+    """A structured draft without the model's free text; its table is rebuilt from the medication rows"""
+    medications = result["medications"]
+    return {"prescription": medications_to_markdown(medications), "medications": medications}
+
+def structure_prescription(text):
+    """
+    The response of the prescription_json chain as {"prescription", "medications"}:
+    medications validated against Medication, and the text rebuilt from them as
+    a markdown table. A model that answers with a table instead of JSON is
+    parsed as text, so structured callers always get a list.
+    """
+    try:
+        rows = load_structured_medications(text)
+        prescription = None
+    except ValueError as e:
+        print(f"Prescription was not valid JSON, parsing it as text: {e}")
+        rows = parse_medications(text)
+        prescription = text
+    return validated_prescription(rows, prescription)
+
+def structure_text_prescription(text):
+    """A text (table) prescription with its medication rows parsed and validated, as structure_prescription returns"""
+    return validated_prescription(parse_medications(text), text)
+
+def validated_prescription(rows, prescription=None):
+    """{"prescription", "medications"} from rows checked against Medication; the text defaults to their table"""
+    medications = []
+    for row in rows:
+        try:
+            medications.append(Medication(**row).dict())
+        except ValidationError:
+            continue
+    return {
+        "prescription": prescription if prescription is not None else medications_to_markdown(medications),
+        "medications": medications
+    }
+
+# Fixed prescription labels per language, built by build_label_bundles.py and
+# loaded once per worker so they never reach the translation backend
+LABEL_BUNDLES = load_label_bundles()
+
+# SQLite has a limit on bound parameters per statement
+TRANSLATION_LOOKUP_CHUNK = 500
+
+def lookup_translation_memory(texts, language):
+    """Return {text: translation} for the texts already in the translation memory"""
+    found = {}
+    conn = get_db_connection()
+    try:
+        ensure_cache_table(conn, "translation_memory")
+        for start in range(0, len(texts), TRANSLATION_LOOKUP_CHUNK):
+            chunk = texts[start:start + TRANSLATION_LOOKUP_CHUNK]
+            placeholders = ", ".join("?" for _ in chunk)
+            rows = conn.execute(
+                f"SELECT text, translated_text FROM translation_memory WHERE language = ? AND text IN ({placeholders})",
+                [language] + chunk
+            ).fetchall()
+            found.update((row["text"], row["translated_text"]) for row in rows)
+    finally:
+        conn.close()
+    return found
+
+def store_translation_memory(translations, language):
+    if not translations:
+        return
+    conn = get_db_connection()
+    try:
+        ensure_cache_table(conn, "translation_memory")
+        created_at = datetime.now().isoformat()
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO translation_memory (text, language, translated_text, created_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            [(text, language, translated, created_at) for text, translated in translations.items()]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+# Upper bounds (seconds) of the translation latency histogram buckets
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+class LatencyHistogram:
+    """Cumulative latency histogram in the style of a Prometheus histogram"""
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, seconds, error=False):
+        with self._lock:
+            index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+            self.counts[index] += 1
+            self.count += 1
+            self.total_seconds += seconds
+            if error:
+                self.errors += 1
+    
+    def stats(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_seconds": round(self.total_seconds / self.count, 4) if self.count else 0.0,
+            "buckets": buckets
+        }
+
+class TranslationBackend:
+    """Translates one string at a time; raises if it fails, returns None if it has no translation"""
+    
+    name = None
+    # Whether results are worth keeping in the translation memory
+    persistent = False
+    # Whether translate_texts looks strings up in the translation memory first
+    reads_memory = False
+    # Whether translate() calls are recorded in the latency histogram
+    timed = True
+    
+    def translate(self, text, language):
+        raise NotImplementedError
+
+class GoogleTransBackend(TranslationBackend):
+    """The unofficial googletrans web client"""
+    
+    name = "googletrans"
+    persistent = True
+    reads_memory = True
+    
+    def __init__(self):
+        googletrans = timed_import("googletrans")
+        self.translator = googletrans.Translator()
+    
+    def translate(self, text, language):
+        return self.translator.translate(text, dest=language).text
+
+class LocalDictionaryBackend(TranslationBackend):
+    """
+    Offline backend answering from the label bundles and the translation
+    memory only. translate_texts looks up the whole batch in both before
+    calling the backend, so any string that reaches translate() has never
+    been seen and is left untranslated.
+    """
+    
+    name = "local"
+    reads_memory = True
+    # translate() does no work of its own, so its timings would say nothing
+    timed = False
+    
+    def translate(self, text, language):
+        return None
+
+class FakeBackend(TranslationBackend):
+    """Deterministic stand-in for tests and benchmarks; never touches the network"""
+    
+    name = "fake"
+    
+    def translate(self, text, language):
+        return f"[{language}] {text}"
+
+TRANSLATION_BACKENDS = {
+    backend.name: backend for backend in (GoogleTransBackend, LocalDictionaryBackend, FakeBackend)
+}
+
+# Backend used unless a request asks for a specific one
+TRANSLATION_BACKEND = os.environ.get("TRANSLATION_BACKEND", "googletrans")
+
+_translation_backends = {}
+_translation_latency = collections.defaultdict(LatencyHistogram)
+
+def get_translation_backend(name=None):
+    """Return the shared instance of a translation backend, creating it on first use"""
+    name = (name or TRANSLATION_BACKEND).lower()
+    if name not in TRANSLATION_BACKENDS:
+        raise ValueError(f"Unknown translation backend: {name}")
+    if name not in _translation_backends:
+        _translation_backends[name] = TRANSLATION_BACKENDS[name]()
+    return _translation_backends[name]
+
+def translate_texts(texts, target_language, backend_name=None):
+    """
+    Translate many strings to one language. Fixed labels come from LABEL_BUNDLES,
+    previously seen strings from the translation memory, and only the rest go to
+    the translation backend. Returns {text: translation or None if it failed}.
+    """
+    language = target_language.lower()
+    backend = get_translation_backend(backend_name)
+    histogram = _translation_latency[backend.name] if backend.timed else None
+    unique_texts = list(dict.fromkeys(text for text in texts if text and text.strip()))
+    
+    labels = LABEL_BUNDLES.get(language, {})
+    results = {text: labels[text] for text in unique_texts if text in labels}
+    
+    pending = [text for text in unique_texts if text not in results]
+    if pending and backend.reads_memory:
+        try:
+            results.update(lookup_translation_memory(pending, language))
+        except sqlite3.Error as e:
+            print(f"Translation memory lookup failed: {e}")
+    
+    new_translations = {}
+    for text in unique_texts:
+        if text in results:
+            continue
+        start = time.perf_counter()
+        try:
+            translated = backend.translate(text, language)
+            if histogram:
+                histogram.observe(time.perf_counter() - start)
+        except Exception as e:
+            if histogram:
+                histogram.observe(time.perf_counter() - start, error=True)
+            print(f"Translation of {text[:40]!r} to {language} with {backend.name} failed: {e}")
+            translated = None
+        if translated is None:
+            results[text] = None
+        else:
+            new_translations[text] = translated
+    results.update(new_translations)
+    
+    if backend.persistent:
+        try:
+            store_translation_memory(new_translations, language)
+        except sqlite3.Error as e:
+            print(f"Translation memory store failed: {e}")
+    return results
+
+# Tools each agent is built from. Nothing here is constructed until a route
+# asks for the agent, so workers that never search never pay for LangChain.
+AGENT_TOOLS = {
+    "search": ["serpapi"],
+}
+
+_registry_lock = threading.Lock()
+_tool_registry = {}
+_agent_registry = {}
+
+def get_tools(tool_names):
+    """Return the named LangChain tools, loading any that are not built yet"""
+    with _registry_lock:
+        missing = [name for name in tool_names if name not in _tool_registry]
+        if missing:
+            agents = timed_import("langchain.agents")
+            for name, tool in zip(missing, agents.load_tools(missing, llm=get_llm())):
+                _tool_registry[name] = tool
+        return [_tool_registry[name] for name in tool_names]
+
+def get_agent(name="search"):
+    """Return the named agent, initializing it on first use"""
+    if name not in AGENT_TOOLS:
+        raise KeyError(f"Unknown agent: {name}")
+    
+    # Tools are loaded before taking the lock again, get_tools() holds it itself
+    tools = get_tools(AGENT_TOOLS[name])
+    with _registry_lock:
+        if name not in _agent_registry:
+            agents = timed_import("langchain.agents")
+            _agent_registry[name] = agents.initialize_agent(
+                tools,
+                get_llm(),
+                agent=agents.AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+                verbose=True
+            )
+        return _agent_registry[name]
+
+# Database connection helper; close() returns the connection to the pool
+db_pool = ConnectionPool(DATABASE_PATH, max_size=DB_POOL_SIZE, busy_timeout_ms=DB_BUSY_TIMEOUT_MS)
+
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db_pool.acquire()
 
 # Pydantic models
 class LoginRequest(BaseModel):
@@ -68,9 +834,53 @@ class LoginRequest(BaseModel):
 
 class DiagnosisRequest(BaseModel):
     prompt: str
+    # Optional prompt for the patient history summary, generated alongside the diagnosis
+    history_prompt: Optional[str] = None
+    # Patient and consultations the history prompt covers, used to cache the summary
+    patient_id: Optional[str] = None
+    consultation_ids: Optional[List[int]] = None
 
 class PrescriptionRequest(BaseModel):
     prompt: str
+    # Confirmed diagnosis and patient details; when given, structured drafts are cached
+    diagnosis: Optional[str] = None
+    age: Optional[int] = None
+    gender: Optional[str] = None
+    # Return the medications as a validated list instead of only a text table
+    structured: bool = False
+
+class Medication(BaseModel):
+    medication: str
+    dosage: str = ""
+    frequency: str = ""
+    duration: str = ""
+    side_effects: str = ""
+    interactions: str = ""
+    pregnancy_safety: str = ""
+    
+    @validator("*", pre=True)
+    def strip_text(cls, value):
+        return "" if value is None else str(value).strip()
+    
+    @validator("medication")
+    def require_name(cls, value):
+        if not value:
+            raise ValueError("medication name is required")
+        return value
+
+class DiagnosisResult(BaseModel):
+    """A diagnosis split into its sections (see diagnosis_parser)"""
+    history_summary: Optional[str] = None
+    diagnoses: List[str] = []
+    reasons: List[str] = []
+    treatment_plan: List[str] = []
+    # The diagnoses the doctor confirmed, and their notes
+    selected: List[str] = []
+    notes: Optional[str] = None
+    
+    @validator("diagnoses", "reasons", "treatment_plan", "selected", each_item=True)
+    def strip_item(cls, value):
+        return value.strip()
 
 class ConsultationRequest(BaseModel):
     doctor_id: int
@@ -82,85 +892,33 @@ class ConsultationRequest(BaseModel):
     tests: Optional[List[str]] = None  # List of tests to be performed
     prescription_pdf: Optional[str] = None  # Path to PDF file
     referrals: Optional[List[dict]] = None  # List of specialist referrals
+    diagnosis_details: Optional[DiagnosisResult] = None  # Parsed from diagnosis when not given
     date: str
 
+class ConsultationBundleRequest(ConsultationRequest):
+    prescription_sha256: Optional[str] = None  # Hash returned by POST /prescription-files
+    prescription_pdf_base64: Optional[str] = None  # Or the PDF bytes inline
+
 class TranslationRequest(BaseModel):
     text: str
     target_language: str
+    backend: Optional[str] = None  # Defaults to TRANSLATION_BACKEND
+
+class BatchTranslationRequest(BaseModel):
+    texts: List[str]
+    target_language: str
+    backend: Optional[str] = None  # Defaults to TRANSLATION_BACKEND
 
 class ReferralRequest(BaseModel):
     doctor_id: int
     patient_id: str
-    specialist_id: int
+    specialist_id: Optional[int] = None  # 0 or None for a manual referral
     reason: str
     date: str
 
-# Helper function to create prescription PDF
-def create_prescription_pdf(patient_data, diagnosis, prescription, tests=None):
-    from fpdf import FPDF
-    import tempfile
-    import os
-    
-    # Create a temporary file
-    temp_filename = os.path.join(tempfile.gettempdir(), "prescription.pdf")
-    
-    # Create PDF
-    pdf = FPDF()
-    # Set font to support Unicode characters
-    pdf.add_page()
-    pdf.add_font('DejaVu', '', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf', uni=True)
-    pdf.set_font('DejaVu', '', 12)
-    
-    # Add header
-    pdf.set_font('DejaVu', '', 16)
-    pdf.cell(0, 10, "Medical Prescription", 0, 1, 'C')
-    pdf.ln(5)
-    
-    # Add patient information
-    pdf.set_font('DejaVu', '', 12)
-    pdf.cell(0, 8, f"Patient: {patient_data.get('name', 'N/A')}", 0, 1)
-    pdf.cell(0, 8, f"Age: {patient_data.get('age', 'N/A')}", 0, 1)
-    pdf.cell(0, 8, f"Gender: {patient_data.get('gender', 'N/A')}", 0, 1)
-    pdf.cell(0, 8, f"Date: {patient_data.get('date', 'N/A')}", 0, 1)
-    pdf.ln(5)
-    
-    # Add diagnosis
-    pdf.set_font('DejaVu', '', 14)
-    pdf.cell(0, 10, "Diagnosis:", 0, 1)
-    pdf.set_font('DejaVu', '', 12)
-    
-    # Replace bullet points with a hyphen to avoid Unicode issues
-    diagnosis_text = diagnosis.replace('\u2022', '-')
-    
-    # Add diagnosis with multiline support
-    pdf.multi_cell(0, 8, diagnosis_text)
-    pdf.ln(5)
-    
-    # Add prescription
-    pdf.set_font('DejaVu', '', 14)
-    pdf.cell(0, 10, "Prescription:", 0, 1)
-    pdf.set_font('DejaVu', '', 12)
-    
-    # Replace bullet points with a hyphen to avoid Unicode issues
-    prescription_text = prescription.replace('\u2022', '-')
-    
-    # Add prescription with multiline support
-    pdf.multi_cell(0, 8, prescription_text)
-    
-    # Add tests if present
-    if tests and len(tests) > 0:
-        pdf.ln(5)
-        pdf.set_font('DejaVu', '', 14)
-        pdf.cell(0, 10, "Recommended Tests:", 0, 1)
-        pdf.set_font('DejaVu', '', 12)
-        
-        for test in tests:
-            pdf.cell(0, 8, f"- {test}", 0, 1)
-    
-    # Output the PDF
-    pdf.output(temp_filename)
-    
-    return temp_filename
+def referral_specialist_id(specialist_id):
+    """Specialist a referral is stored under; manual referrals (placeholder id 0) have none"""
+    return specialist_id or None
 
 # Routes
 @app.post("/login")
@@ -201,6 +959,9 @@ def get_patient(patient_id: str):
             "gender": result["gender"],
             "temperature": result["temperature"],
             "blood_pressure": result["blood_pressure"],
+            "temp_c": result["temp_c"],
+            "systolic": result["systolic"],
+            "diastolic": result["diastolic"],
             "pre_conditions": result["pre_conditions"],
             "language": result["language"]  # Added language field
         }
@@ -227,51 +988,24 @@ def get_patient_history(patient_id: str, limit: int = 3):
     patient_result = cursor.fetchone()
     pre_conditions = patient_result["pre_conditions"] if patient_result else ""
     
-    cursor.execute(
-        """
-        SELECT diagnosis, prescription, consultation_date, 
-               vital_signs, symptoms, tests
-        FROM consultations 
-        WHERE patient_id = ? 
-        ORDER BY consultation_date DESC 
-        LIMIT ?
-        """,
-        (patient_id, limit)
-    )
+    cursor.execute(HISTORY_QUERY, (patient_id, limit))
     
     results = cursor.fetchall()
+    # Symptoms, tests and vital signs come from the consultation detail tables
+    details = load_consultation_details(conn, [row["id"] for row in results])
     conn.close()
     
     history = []
     for row in results:
-        vital_signs = {}
-        try:
-            if row["vital_signs"]:
-                vital_signs = json.loads(row["vital_signs"])
-        except:
-            vital_signs = {}
-            
-        symptoms = []
-        try:
-            if row["symptoms"]:
-                symptoms = json.loads(row["symptoms"])
-        except:
-            symptoms = []
-            
-        tests = []
-        try:
-            if row["tests"]:
-                tests = json.loads(row["tests"])
-        except:
-            tests = []
-            
         history.append({
+            "id": row["id"],
             "diagnosis": row["diagnosis"],
             "prescription": row["prescription"],
             "date": row["consultation_date"],
-            "vital_signs": vital_signs,
-            "symptoms": symptoms,
-            "tests": tests,
+            "vital_signs": details[row["id"]]["vital_signs"],
+            "symptoms": details[row["id"]]["symptoms"],
+            "tests": details[row["id"]]["tests"],
+            "diagnoses": details[row["id"]]["diagnoses"],
             # Add pre-existing conditions from patient table, not consultation
             "pre_conditions": pre_conditions
         })
@@ -279,101 +1013,352 @@ def get_patient_history(patient_id: str, limit: int = 3):
     return history
 
 @app.post("/generate-diagnosis")
-def generate_diagnosis(request: DiagnosisRequest):
+async def generate_diagnosis(request: DiagnosisRequest):
     try:
-        # Create a fresh LLM instance for this request
-        llm = get_llm()
-        
         # Use LangChain with OpenAI
-        diagnosis_prompt = PromptTemplate(
-            input_variables=["patient_info"],
-            template="{patient_info}"
-        )
+        diagnosis = await run_chain_async("diagnosis", request.prompt)
         
-        diagnosis_chain = LLMChain(llm=llm, prompt=diagnosis_prompt)
-        diagnosis = diagnosis_chain.run(request.prompt)
+        return diagnosis_response(diagnosis)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/generate-diagnosis-composite")
+async def generate_composite_diagnosis(request: DiagnosisRequest):
+    """
+    Generate the diagnosis and, when a history prompt is given, the patient
+    history summary in parallel, splicing the summary into the diagnosis.
+    """
+    try:
+        if not request.history_prompt:
+            return diagnosis_response(await run_chain_async("diagnosis", request.prompt))
         
-        return {"diagnosis": diagnosis}
+        diagnosis, history_summary = await asyncio.gather(
+            run_chain_async("diagnosis", request.prompt),
+            summarize_history(request.history_prompt, request.patient_id, request.consultation_ids)
+        )
+        return diagnosis_response(splice_history_summary(diagnosis, history_summary))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/generate-prescription")
-def generate_prescription(request: PrescriptionRequest):
+async def generate_prescription(request: PrescriptionRequest):
     try:
-        # Create a fresh LLM instance for this request
-        llm = get_llm()
+        cache_key = prescription_cache_key(request, "prescription_json")
+        if cache_key is not None:
+            cached = prescription_cache.get(cache_key)
+            if cached is not None:
+                return {**cached, "cached": True}
         
-        # Use LangChain with OpenAI and search tools
-        medication_prompt = PromptTemplate(
-            input_variables=["diagnosis"],
-            template="""Generate a detailed prescription with appropriate medications available in the Pakistani market for this diagnosis: {diagnosis}
-            
-Include for each medication:
-1. Medication name
-2. Dosage information
-3. Frequency of administration
-4. Duration of treatment
-5. Common side effects
-6. Potential interactions with other medications
-7. Pregnancy safety information (FDA category and recommendations)
-
-Format your response as a structured and clear table with all the above information."""
-        )
+        if request.structured:
+            result = structure_prescription(await run_chain_async("prescription_json", request.prompt))
+            if cache_key is not None and result["medications"]:
+                prescription_cache.put(cache_key, cacheable_prescription(result))
+            return {**result, "cached": False}
         
         # First try with direct LLM for faster response
-        medication_chain = LLMChain(llm=llm, prompt=medication_prompt)
-        prescription = medication_chain.run(request.prompt)
+        prescription = await run_chain_async("prescription", request.prompt)
         
         # If we need to search for specific medications, we could use the agent
-        # result = agent.run(f"Find specific medications available in Pakistan for {prescription}")
+        # result = get_agent("search").run(f"Find specific medications available in Pakistan for {prescription}")
         
-        return {"prescription": prescription}
+        return {"prescription": prescription, "cached": False}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/generate-diagnosis/stream")
+async def stream_diagnosis(request: DiagnosisRequest):
+    """Server-sent event version of /generate-diagnosis-composite"""
+    if request.history_prompt:
+        return sse_response(stream_diagnosis_events(request))
+    
+    async def add_structure(diagnosis):
+        return diagnosis_response(diagnosis)
+    
+    return sse_response(stream_chain_events("diagnosis", request.prompt, "diagnosis", finalize=add_structure))
+
+@app.post("/generate-prescription/stream")
+async def stream_prescription(request: PrescriptionRequest):
+    """
+    Server-sent event version of /generate-prescription. The text prescription
+    is streamed in both modes, so it can be shown as it is written; in structured
+    mode the "done" event also carries the medications parsed from it here.
+    """
+    cache_key = prescription_cache_key(request, "prescription")
+    
+    cached = prescription_cache.get(cache_key) if cache_key is not None else None
+    if cached is not None:
+        return sse_response(iter([sse_event({**cached, "cached": True}, event="done")]))
+    
+    async def finish_prescription(prescription):
+        if request.structured:
+            result = structure_text_prescription(prescription)
+            if cache_key is not None and result["medications"]:
+                prescription_cache.put(cache_key, cacheable_prescription(result))
+            return result
+        return prescription
+    
+    return sse_response(stream_chain_events("prescription", request.prompt, "prescription", finalize=finish_prescription))
+
+def insert_consultation(conn, request, prescription_pdf=None):
+    """Insert a consultation and its detail rows in the caller's transaction; returns its id"""
+    if request.diagnosis_details is not None:
+        diagnosis_details = request.diagnosis_details.dict()
+    else:
+        diagnosis_details = structure_diagnosis(request.diagnosis)
+    cursor = conn.execute(
+        """
+        INSERT INTO consultations (
+            doctor_id, patient_id, symptoms, vital_signs,
+            diagnosis, prescription, prescription_pdf, consultation_date, 
+            tests, referrals, temp_c, systolic, diastolic, diagnosis_json
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            request.doctor_id,
+            request.patient_id,
+            json.dumps(request.symptoms),
+            json.dumps(request.vital_signs),
+            request.diagnosis,
+            request.prescription,
+            prescription_pdf or request.prescription_pdf,
+            request.date,
+            json.dumps(request.tests) if request.tests else None,
+            json.dumps(request.referrals) if request.referrals else None,
+            *numeric_vitals_from_dict(request.vital_signs),
+            json.dumps(diagnosis_details)
+        )
+    )
+    consultation_id = cursor.lastrowid
+    save_consultation_details(
+        conn, consultation_id, request.patient_id, request.date,
+        request.symptoms, request.vital_signs, request.tests
+    )
+    insert_diagnoses(conn, diagnosis_rows(
+        consultation_id, request.patient_id, request.date, confirmed_diagnoses(diagnosis_details)
+    ))
+    # The patient's history changed, so cached summaries are stale
+    invalidate_history_summaries(conn, request.patient_id)
+    return consultation_id
+
+def prescription_file_url(sha256):
+    return f"/prescription-files/{sha256}"
+
+def stored_prescription_size(conn, sha256):
+    row = conn.execute("SELECT size FROM prescription_files WHERE sha256 = ?", (sha256,)).fetchone()
+    return row["size"] if row else None
+
+def prescription_file_response(request, sha256, size):
+    """Serve a stored PDF, honouring a single byte range so viewers can fetch pages lazily"""
+    path = prescription_store.store_path(sha256)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Prescription file not found")
+    headers = {
+        "Accept-Ranges": "bytes",
+        # Content-addressed, so the bytes behind this URL never change
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "ETag": f'"{sha256}"'
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    try:
+        byte_range = prescription_store.parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        prescription_store.iter_file(path, start, end),
+        status_code=status_code,
+        media_type="application/pdf",
+        headers=headers
+    )
+
 @app.post("/save-consultation")
 def save_consultation(request: ConsultationRequest):
     conn = get_db_connection()
-    cursor = conn.cursor()
     
     try:
-        cursor.execute(
+        consultation_id = insert_consultation(conn, request)
+        conn.commit()
+        return {"status": "success", "consultation_id": consultation_id}
+    except Exception as e:
+        conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        conn.close()
+
+@app.post("/consultations")
+def create_consultation(request: ConsultationBundleRequest):
+    """
+    Save a consultation, its referrals and its prescription PDF in one transaction.
+    Either everything is stored or nothing is.
+    """
+    pdf_bytes = None
+    if request.prescription_pdf_base64:
+        try:
+            pdf_bytes = base64.b64decode(request.prescription_pdf_base64, validate=True)
+        except (binascii.Error, ValueError):
+            raise HTTPException(status_code=400, detail="prescription_pdf_base64 is not valid base64")
+    elif request.prescription_sha256 and not prescription_store.is_sha256(request.prescription_sha256):
+        raise HTTPException(status_code=400, detail="prescription_sha256 is not a SHA-256 hex digest")
+    
+    conn = get_db_connection()
+    try:
+        sha256 = request.prescription_sha256
+        if pdf_bytes is not None:
+            # Content-addressed, so the file is harmless if the transaction below fails
+            try:
+                sha256, size, _ = prescription_store.store_bytes(pdf_bytes)
+            except prescription_store.NotAPdf as e:
+                raise HTTPException(status_code=415, detail=str(e))
+            except prescription_store.UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=str(e))
+            prescription_store.record_file(conn, sha256, size)
+        elif sha256 and stored_prescription_size(conn, sha256) is None:
+            raise HTTPException(status_code=400, detail="Unknown prescription file; upload it first")
+        
+        consultation_id = insert_consultation(conn, request)
+        if sha256:
+            conn.execute(
+                "UPDATE consultations SET prescription_sha256 = ?, prescription_pdf = ? WHERE id = ?",
+                (sha256, prescription_file_url(sha256), consultation_id)
+            )
+        
+        referrals = request.referrals or []
+        conn.executemany(
             """
-            INSERT INTO consultations (
-                doctor_id, patient_id, symptoms, vital_signs,
-                diagnosis, prescription, prescription_pdf, consultation_date, 
-                tests, referrals
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO referrals (
+                doctor_id, patient_id, specialist_id, reason, referral_date, consultation_id
+            ) VALUES (?, ?, ?, ?, ?, ?)
             """,
-            (
-                request.doctor_id,
-                request.patient_id,
-                json.dumps(request.symptoms),
-                json.dumps(request.vital_signs),
-                request.diagnosis,
-                request.prescription,
-                request.prescription_pdf,
-                request.date,
-                json.dumps(request.tests) if request.tests else None,
-                json.dumps(request.referrals) if request.referrals else None
-            )
+            [
+                (
+                    request.doctor_id,
+                    request.patient_id,
+                    referral_specialist_id(referral.get("specialist_id")),
+                    referral.get("reason", ""),
+                    request.date,
+                    consultation_id
+                )
+                for referral in referrals
+            ]
         )
-        # Get the ID of the inserted record
-        consultation_id = cursor.lastrowid
+        # executemany does not report row ids; read them back through idx_referrals_consultation
+        referral_ids = [
+            row["id"] for row in conn.execute(
+                "SELECT id FROM referrals WHERE consultation_id = ? ORDER BY id", (consultation_id,)
+            ).fetchall()
+        ]
         conn.commit()
-        return {"status": "success", "consultation_id": consultation_id}
+        return {
+            "status": "success",
+            "consultation_id": consultation_id,
+            "referral_ids": referral_ids,
+            "prescription_sha256": sha256,
+            "prescription_pdf": prescription_file_url(sha256) if sha256 else None
+        }
+    except HTTPException:
+        conn.rollback()
+        raise
     except Exception as e:
         conn.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         conn.close()
 
+def record_uploaded_prescription_file(sha256, size):
+    conn = get_db_connection()
+    try:
+        prescription_store.record_file(conn, sha256, size)
+        conn.commit()
+    finally:
+        conn.close()
+
+@app.post("/prescription-files")
+async def upload_prescription_file(request: Request):
+    """
+    Store a prescription PDF sent as the raw request body (Content-Type: application/pdf).
+    The body is hashed and written as it arrives, so it is never held in memory whole.
+    File and database work runs in the threadpool, off the event loop.
+    """
+    upload = await run_in_threadpool(prescription_store.PrescriptionUpload)
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(upload.write, chunk)
+        sha256, size, _ = await run_in_threadpool(upload.finish)
+    except prescription_store.NotAPdf as e:
+        await run_in_threadpool(upload.discard)
+        raise HTTPException(status_code=415, detail=str(e))
+    except prescription_store.UploadTooLarge as e:
+        await run_in_threadpool(upload.discard)
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception:
+        await run_in_threadpool(upload.discard)
+        raise
+    
+    await run_in_threadpool(record_uploaded_prescription_file, sha256, size)
+    return {"sha256": sha256, "size": size, "url": prescription_file_url(sha256)}
+
+@app.get("/prescription-files/{sha256}")
+def download_prescription_file(sha256: str, request: Request):
+    """Download a stored prescription PDF; supports Range requests"""
+    if not prescription_store.is_sha256(sha256):
+        raise HTTPException(status_code=404, detail="Prescription file not found")
+    conn = get_db_connection()
+    try:
+        size = stored_prescription_size(conn, sha256)
+    finally:
+        conn.close()
+    if size is None:
+        raise HTTPException(status_code=404, detail="Prescription file not found")
+    return prescription_file_response(request, sha256, size)
+
+@app.get("/consultations/{consultation_id}/prescription")
+def download_consultation_prescription(consultation_id: int, request: Request):
+    """Download the prescription PDF saved with a consultation"""
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            """
+            SELECT f.sha256, f.size FROM consultations c
+            JOIN prescription_files f ON f.sha256 = c.prescription_sha256
+            WHERE c.id = ?
+            """,
+            (consultation_id,)
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        raise HTTPException(status_code=404, detail="No prescription saved for this consultation")
+    return prescription_file_response(request, row["sha256"], row["size"])
+
 @app.post("/translate")
 def translate_text(request: TranslationRequest):
+    """
+    Translate one string. If there is no translation for it, the text comes
+    back as it was with "translated": false.
+    """
     try:
-        translator = Translator()
-        translated = translator.translate(request.text, dest=request.target_language.lower())
-        return {"translated_text": translated.text}
+        translated = translate_texts([request.text], request.target_language, request.backend).get(request.text)
+        if translated is None:
+            return {"translated_text": request.text, "translated": False}
+        return {"translated_text": translated, "translated": True}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Translation error: {str(e)}")
+
+@app.post("/translate-batch")
+def translate_batch(request: BatchTranslationRequest):
+    """
+    Translate many strings in one call. Translations are returned in the same
+    order as the request, with null for any string that could not be translated.
+    """
+    try:
+        results = translate_texts(request.texts, request.target_language, request.backend)
+        return {"translations": [results.get(text, text if not text.strip() else None) for text in request.texts]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Translation error: {str(e)}")
 
@@ -388,6 +1373,8 @@ def update_patient(patient_id: str, pre_conditions: str):
             "UPDATE patients SET pre_conditions = ? WHERE id = ?",
             (pre_conditions, patient_id)
         )
+        # Pre-existing conditions are part of the history summary prompt
+        invalidate_history_summaries(conn, patient_id)
         conn.commit()
         return {"status": "success"}
     except Exception as e:
@@ -407,15 +1394,21 @@ def clear_consultations():
         cursor.execute("SELECT COUNT(*) FROM consultations")
         count = cursor.fetchone()[0]
         
-        # Delete all records from consultations table
+        # Delete all records from consultations table; referrals are kept but unlinked
+        delete_consultation_details(conn)
+        cursor.execute("UPDATE referrals SET consultation_id = NULL WHERE consultation_id IS NOT NULL")
         cursor.execute("DELETE FROM consultations")
+        ensure_cache_table(conn, "history_summaries")
+        cursor.execute("DELETE FROM history_summaries")
+        
+        cursor.execute("DELETE FROM prescription_files")
         
         # Also remove any prescription PDFs
         import os
         import glob
-        pdf_dir = "data/prescription"
+        pdf_dir = prescription_store.PRESCRIPTION_STORE_DIR
         if os.path.exists(pdf_dir):
-            files = glob.glob(os.path.join(pdf_dir, "*.pdf"))
+            files = glob.glob(os.path.join(pdf_dir, "**", "*.pdf"), recursive=True)
             for f in files:
                 try:
                     os.remove(f)
@@ -522,7 +1515,7 @@ def save_referral(request: ReferralRequest):
             (
                 request.doctor_id,
                 request.patient_id,
-                request.specialist_id,
+                referral_specialist_id(request.specialist_id),
                 request.reason,
                 request.date
             )
@@ -537,6 +1530,127 @@ def save_referral(request: ReferralRequest):
     finally:
         conn.close()
 
+@app.get("/analytics/patients-with-symptom")
+def get_patients_with_symptom(symptom: str, days: int = 7):
+    """Patients who had a symptom in any consultation in the last `days` days"""
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    conn = get_db_connection()
+    try:
+        return {"symptom": symptom, "since": since, "patients": patients_with(conn, "symptom", symptom, since)}
+    finally:
+        conn.close()
+
+@app.get("/analytics/patients-with-test")
+def get_patients_with_test(test: str, days: int = 30):
+    """Patients who were prescribed a test in the last `days` days"""
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    conn = get_db_connection()
+    try:
+        return {"test": test, "since": since, "patients": patients_with(conn, "test", test, since)}
+    finally:
+        conn.close()
+
+@app.get("/analytics/symptom-counts")
+def get_symptom_counts(days: int = 7, limit: int = 20):
+    """Most frequent symptoms in the last `days` days"""
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    conn = get_db_connection()
+    try:
+        return {"since": since, "symptoms": symptom_counts(conn, since, limit)}
+    finally:
+        conn.close()
+
+@app.get("/analytics/patients-with-diagnosis")
+def get_patients_with_diagnosis(diagnosis: str, days: int = 30):
+    """Patients diagnosed with a condition in the last `days` days"""
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    conn = get_db_connection()
+    try:
+        return {"diagnosis": diagnosis, "since": since, "patients": patients_with(conn, "diagnosis", diagnosis, since)}
+    finally:
+        conn.close()
+
+@app.get("/analytics/diagnosis-counts")
+def get_diagnosis_counts(days: int = 30, limit: int = 20):
+    """Most frequent diagnoses in the last `days` days"""
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    conn = get_db_connection()
+    try:
+        return {"since": since, "diagnoses": diagnosis_counts(conn, since, limit)}
+    finally:
+        conn.close()
+
+@app.get("/analytics/triage")
+def get_triage(
+    days: int = 30,
+    min_systolic: Optional[int] = None,
+    min_diastolic: Optional[int] = None,
+    min_temp_c: Optional[float] = None,
+    limit: int = 100
+):
+    """Recent consultations whose vital signs reach the given thresholds, e.g. min_systolic=140"""
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    conn = get_db_connection()
+    try:
+        return {
+            "since": since,
+            "consultations": triage_consultations(conn, since, min_systolic, min_diastolic, min_temp_c, limit)
+        }
+    finally:
+        conn.close()
+
+@app.get("/patient/{patient_id}/vitals-trend")
+def get_vitals_trend(patient_id: str, limit: int = 20):
+    """Numeric temperature and blood pressure of a patient's recent consultations, oldest first"""
+    conn = get_db_connection()
+    try:
+        return {"patient_id": patient_id, "vitals": vitals_trend(conn, patient_id, limit)}
+    finally:
+        conn.close()
+
+@app.get("/metrics")
+def get_metrics():
+    """Runtime counters for the LLM, translation and database layers"""
+    return {
+        "llm": {model_name: limiter.stats() for model_name, limiter in _model_limiters.items()},
+        "prescription_cache": prescription_cache.stats(),
+        "translation": {name: histogram.stats() for name, histogram in _translation_latency.items()},
+        "db_pool": db_pool.stats()
+    }
+
+@app.get("/startup-report")
+def get_startup_report():
+    """Report how long this worker took to import, broken down per module"""
+    return {
+        "boot_seconds": BOOT_SECONDS,
+        "budget_seconds": STARTUP_BUDGET_SECONDS,
+        "within_budget": BOOT_SECONDS <= STARTUP_BUDGET_SECONDS,
+        # Modules imported lazily after boot show up here too, on first use
+        "imports": dict(sorted(STARTUP_TIMINGS.items(), key=lambda item: item[1], reverse=True))
+    }
+
+@app.on_event("startup")
+def migrate_database():
+    if RUN_MIGRATIONS_ON_STARTUP:
+        run_migrations(DATABASE_PATH)
+
+@app.on_event("startup")
+def print_startup_report():
+    report = get_startup_report()
+    status = "within" if report["within_budget"] else "OVER"
+    print(f"api.py imported in {report['boot_seconds']:.3f}s ({status} {STARTUP_BUDGET_SECONDS:.1f}s budget)")
+    for module_name, seconds in report["imports"].items():
+        print(f"  {module_name}: {seconds:.3f}s")
+
+@app.on_event("shutdown")
+async def close_pooled_resources():
+    if _aiohttp_session is not None and not _aiohttp_session.closed:
+        await _aiohttp_session.close()
+    db_pool.close_all()
+
+# Time spent importing this module, measured before any route is served
+BOOT_SECONDS = round(time.perf_counter() - _BOOT_START, 4)
+
 # Run server with: uvicorn api:app --reload
 if __name__ == "__main__":
     import uvicorn
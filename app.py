@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import requests
 import json
+import hashlib
 import sqlite3
 from datetime import datetime
 import os
@@ -10,16 +11,17 @@ from fpdf import FPDF
 import base64
 import re
 from streamlit_modal import Modal
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
 # Import our new function for updating patients.csv
 from db_update_patients import update_patients_csv
-import shutil  # For file operations
-import subprocess  # For running wkhtmltopdf
+from label_bundles import PRESCRIPTION_LABELS, load_label_bundles
+from diagnosis_parser import parse_diagnosis
+from medication_parser import empty_medication, parse_medications, parse_prescription_sections
+from prescription_renderer import (
+    format_medication_summary, format_referral, get_prescription_styles, new_temp_path, prescription_model,
+    render_prescription_html, render_prescription_reportlab, render_prescription_text
+)
+from render_service import RenderError, get_render_service
+from concurrent.futures import ThreadPoolExecutor, wait  # For concurrent translations
 
 # Only configure the page if not already configured
 # if not hasattr(st, '_is_page_config_set'):
@@ -89,6 +91,7 @@ def logout():
     st.session_state.symptoms = []
     st.session_state.chat_history = []
     st.session_state.diagnosis = None
+    st.session_state.diagnosis_result = None
     st.session_state.prescription = None
     st.session_state.final_prescription = False
     # Clear the medications list when logging out
@@ -101,12 +104,14 @@ def start_new_conversation():
     st.session_state.symptoms = []
     st.session_state.chat_history = []
     st.session_state.diagnosis = None
+    st.session_state.diagnosis_result = None
     st.session_state.prescription = None
     st.session_state.final_prescription = False
     st.session_state.consultation_saved = False
     # Clear the PDF paths when starting a new conversation
     st.session_state.view_pdf_path = None
     st.session_state.view_html_path = None
+    st.session_state.prescription_model = None
     # Reset the tests list for new consultations
     st.session_state.tests = []
     # Reset selected_tests to prevent tests from persisting between consultations
@@ -222,6 +227,115 @@ def get_common_tests():
         "Hepatitis Panel"
     ]
 
+# Section headers of the structured diagnosis, in the order the LLM writes them
+DIAGNOSIS_SECTIONS = [
+    ("PATIENT HISTORY SUMMARY:", "Patient History Summary"),
+    ("DIAGNOSIS:", "Diagnosis"),
+    ("REASONS:", "Reasons"),
+    ("TREATMENT PLAN:", "Treatment Plan")
+]
+
+def iter_sse_events(response):
+    """Yield (event, data) pairs from a server-sent event response"""
+    event = None
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            # A blank line ends the current event
+            event = None
+            continue
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            yield event or "token", json.loads(line[len("data:"):].strip())
+
+def stream_generation(endpoint, payload, result_key, render):
+    """
+    Call one of the streaming generation endpoints, re-rendering the partial
+    text as tokens arrive. Returns the final payload (the full text is under
+    result_key), or None if streaming failed so the caller can fall back to the
+    plain endpoint.
+    """
+    placeholder = st.empty()
+    text = ""
+    try:
+        with requests.post(f"{BASE_URL}{endpoint}", json=payload, stream=True) as response:
+            if response.status_code != 200:
+                return None
+            
+            for event, data in iter_sse_events(response):
+                if event == "token":
+                    text += data.get("token", "")
+                    render(placeholder, text)
+                elif event == "done":
+                    placeholder.empty()
+                    return {result_key: text, **data}
+                elif event == "error":
+                    st.warning(f"Streaming failed: {data.get('detail', '')}")
+                    break
+    except Exception as e:
+        st.warning(f"Streaming unavailable: {str(e)}")
+    
+    placeholder.empty()
+    return None
+
+def render_diagnosis_sections(placeholder, text):
+    """Render the DIAGNOSIS/REASONS/TREATMENT PLAN sections written so far"""
+    found = sorted(
+        (text.find(header), header, title)
+        for header, title in DIAGNOSIS_SECTIONS
+        if text.find(header) >= 0
+    )
+    
+    if not found:
+        placeholder.markdown(text)
+        return
+    
+    markdown = []
+    for i, (start, header, title) in enumerate(found):
+        end = found[i + 1][0] if i + 1 < len(found) else len(text)
+        content = text[start + len(header):end].strip()
+        markdown.append(f"#### {title}\n{content}")
+    placeholder.markdown("\n\n".join(markdown))
+
+def render_streamed_text(placeholder, text):
+    placeholder.markdown(text)
+
+def build_history_prompt(patient_history):
+    """Build the prompt that asks for a summary of the patient's previous consultations"""
+    history_prompt = f"""You are a primary healthcare physician reviewing a patient's history. 
+The patient has the following previous consultations:
+
+"""
+    for i, record in enumerate(patient_history):
+        history_prompt += f"\nVisit Date: {record['date']}\n"
+        
+        # Include vital signs if available
+        if record.get('vital_signs'):
+            vs = record['vital_signs']
+            history_prompt += f"Vital Signs: Temperature {vs.get('temperature', 'N/A')}, "
+            history_prompt += f"BP {vs.get('blood_pressure', 'N/A')}\n"
+            
+        # Include pre-existing conditions if available
+        if record.get('pre_conditions'):
+            history_prompt += f"Pre-existing Conditions: {record['pre_conditions']}\n"
+            
+        # Include symptoms
+        if record.get('symptoms'):
+            history_prompt += f"Symptoms: {', '.join(record['symptoms'])}\n"
+            
+        history_prompt += f"Diagnosis: {record['diagnosis']}\n"
+        history_prompt += f"Prescription: {record['prescription']}\n"
+        
+        if i < len(patient_history) - 1:
+            history_prompt += "-" * 40 + "\n"  # Separator between records
+    
+    history_prompt += """
+Based on the patient's history above, create a concise summary of their medical history.
+Highlight any patterns, recurring issues, or relevant information that could be important for
+the current diagnosis. Keep it brief and focused on medically relevant details only.
+"""
+    return history_prompt
+
 def generate_diagnosis(patient_data, symptoms):
     """Generate a diagnosis based on patient data and symptoms without patient history in the main prompt"""
     # Fetch patient history
@@ -267,74 +381,48 @@ TREATMENT PLAN:
 
 Be concise and clinical. Do not include any text outside this structure. Do not include any additional formatting."""
 
-    # Call the API to generate diagnosis
-    response = requests.post(
-        f"{BASE_URL}/generate-diagnosis",
-        json={"prompt": prompt}
-    )
+    # Summarise previous consultations alongside the diagnosis for returning patients
+    history_prompt = build_history_prompt(patient_history) if patient_history else None
+    payload = {
+        "prompt": prompt,
+        "history_prompt": history_prompt,
+        # Lets the API reuse the stored summary while no new consultation has been saved
+        "patient_id": patient_id,
+        "consultation_ids": [record["id"] for record in patient_history if record.get("id") is not None]
+    }
     
-    if response.status_code == 200:
-        diagnosis = response.json()["diagnosis"]
-        
-        # Now, if we have patient history, generate a separate history summary
-        if patient_history:
-            history_prompt = f"""You are a primary healthcare physician reviewing a patient's history. 
-The patient has the following previous consultations:
-
-"""
-            for i, record in enumerate(patient_history):
-                history_prompt += f"\nVisit Date: {record['date']}\n"
-                
-                # Include vital signs if available
-                if record.get('vital_signs'):
-                    vs = record['vital_signs']
-                    history_prompt += f"Vital Signs: Temperature {vs.get('temperature', 'N/A')}, "
-                    history_prompt += f"BP {vs.get('blood_pressure', 'N/A')}\n"
-                    
-                # Include pre-existing conditions if available
-                if record.get('pre_conditions'):
-                    history_prompt += f"Pre-existing Conditions: {record['pre_conditions']}\n"
-                    
-                # Include symptoms
-                if record.get('symptoms'):
-                    history_prompt += f"Symptoms: {', '.join(record['symptoms'])}\n"
-                    
-                history_prompt += f"Diagnosis: {record['diagnosis']}\n"
-                history_prompt += f"Prescription: {record['prescription']}\n"
-                
-                if i < len(patient_history) - 1:
-                    history_prompt += "-" * 40 + "\n"  # Separator between records
-            
-            history_prompt += """
-Based on the patient's history above, create a concise summary of their medical history.
-Highlight any patterns, recurring issues, or relevant information that could be important for
-the current diagnosis. Keep it brief and focused on medically relevant details only.
-"""
-            
-            # Get history summary
-            response = requests.post(
-                f"{BASE_URL}/generate-diagnosis",
-                json={"prompt": history_prompt}
-            )
-            
-            if response.status_code == 200:
-                history_summary = response.json()["diagnosis"]
-                
-                # Replace the placeholder in the diagnosis with the actual history summary
-                if "PATIENT HISTORY SUMMARY:" in diagnosis:
-                    parts = diagnosis.split("PATIENT HISTORY SUMMARY:")
-                    if len(parts) > 1:
-                        # Find the end of the history section
-                        history_end = parts[1].find("DIAGNOSIS:")
-                        if history_end > 0:
-                            # Replace the placeholder with the generated summary
-                            diagnosis = parts[0] + "PATIENT HISTORY SUMMARY:\n" + history_summary.strip() + "\n\n" + parts[1][history_end:]
-        
-        return diagnosis
+    # Stream the diagnosis so the doctor can start reading as soon as it is written.
+    # The API generates the history summary in parallel and splices it in at the end.
+    result = stream_generation("/generate-diagnosis/stream", payload, "diagnosis", render_diagnosis_sections)
+    
+    if result is None:
+        # Call the API to generate diagnosis and history summary together
+        response = requests.post(
+            f"{BASE_URL}/generate-diagnosis-composite",
+            json=payload
+        )
+        if response.status_code == 200:
+            result = response.json()
+    
+    if result and result.get("diagnosis"):
+        # The API splits the diagnosis into sections once; reruns reuse them
+        st.session_state.diagnosis_result = result.get("structured")
+        return result["diagnosis"]
     else:
         st.error("Failed to generate diagnosis")
         return None
 
+def get_diagnosis_result():
+    """
+    Sections of the current diagnosis as returned by the API. Diagnoses from an
+    API without structured output are split here, once per diagnosis.
+    """
+    result = st.session_state.get("diagnosis_result")
+    if result is None and st.session_state.diagnosis:
+        result = parse_diagnosis(st.session_state.diagnosis)
+        st.session_state.diagnosis_result = result
+    return result
+
 def regenerate_diagnosis(original_prompt, doctor_comments):
     # Fetch patient history (it's included in the original_prompt)
     
@@ -357,7 +445,27 @@ Analyse and provide diagnosis with the same format as before, including the PATI
         st.error("Failed to regenerate diagnosis")
         return None
 
+# Table layout requested when the prescription comes back as text
+PRESCRIPTION_TABLE_FORMAT = """
+
+Format your response as a structured table with the following columns:
+- Medication Name
+- Dosage
+- Frequency
+- Duration
+- Side Effects
+- Medication Interactions
+- Pregnancy Safety
+
+Ensure all columns are properly filled with relevant information."""
+
 def generate_prescription(diagnosis, patient_data):
+    """
+    Generate a prescription draft and return its text. The draft streams in as
+    a table; when it is done the API sends its medication rows, which go
+    straight into st.session_state.medications. If streaming fails, the
+    structured (JSON) endpoint is tried, then the plain text one.
+    """
     prompt = f"""Based on the following diagnosis for a patient in Pakistan:
 {diagnosis}
 
@@ -370,22 +478,43 @@ Generate a detailed prescription with appropriate medications available in the P
 Include dosage, frequency, and duration for each medication. For each medication, also include:
 1. Potential interactions with other common medications
 2. Pregnancy safety information (category and recommendations)
-3. Common side effects
-
-Format your response as a structured table with the following columns:
-- Medication Name
-- Dosage
-- Frequency
-- Duration
-- Side Effects
-- Medication Interactions
-- Pregnancy Safety
-
-Ensure all columns are properly filled with relevant information."""
+3. Common side effects"""
 
+    # The diagnosis and patient details let the API reuse drafts for common cases
+    payload = {
+        "prompt": prompt + PRESCRIPTION_TABLE_FORMAT,
+        "diagnosis": diagnosis,
+        "age": patient_data.get('age'),
+        "gender": patient_data.get('gender'),
+        "structured": True
+    }
+    
+    result = stream_generation("/generate-prescription/stream", payload, "prescription", render_streamed_text)
+    if result is None:
+        try:
+            with st.spinner("Generating prescription..."):
+                response = requests.post(
+                    f"{BASE_URL}/generate-prescription",
+                    json={**payload, "prompt": prompt}
+                )
+            if response.status_code == 200:
+                result = response.json()
+        except Exception as e:
+            print(f"Structured prescription failed: {e}")
+    
+    if result and result.get("medications"):
+        st.session_state.medications = result["medications"]
+        return result["prescription"]
+    if result and result.get("prescription"):
+        # No rows could be read from it; the editor parses the text instead
+        st.session_state.pop("medications", None)
+        return result["prescription"]
+    
+    # A text prescription; the editor parses its medications
+    st.session_state.pop("medications", None)
     response = requests.post(
         f"{BASE_URL}/generate-prescription",
-        json={"prompt": prompt}
+        json={**payload, "structured": False}
     )
     
     if response.status_code == 200:
@@ -396,6 +525,23 @@ Ensure all columns are properly filled with relevant information."""
         st.error("Failed to generate prescription")
         return None
 
+def upload_prescription_pdf(pdf_path):
+    """Stream a prescription PDF to the API; returns its SHA-256 or None if the upload failed"""
+    try:
+        with open(pdf_path, "rb") as f:
+            # A file object is sent as a streamed body rather than read into memory
+            response = requests.post(
+                f"{BASE_URL}/prescription-files",
+                data=f,
+                headers={"Content-Type": "application/pdf"}
+            )
+        if response.status_code == 200:
+            return response.json()["sha256"]
+        st.error(f"Failed to upload prescription PDF: {response.text}")
+    except Exception as e:
+        st.error(f"Error uploading prescription PDF: {str(e)}")
+    return None
+
 def save_consultation(doctor_id, patient_id, symptoms, diagnosis, prescription, tests=None):
     try:
         # Make sure patient_data is available
@@ -419,62 +565,28 @@ def save_consultation(doctor_id, patient_id, symptoms, diagnosis, prescription,
             "prescription": prescription,
             "tests": tests if tests else st.session_state.tests,  # Use provided tests or from session state
             "referrals": st.session_state.referrals if hasattr(st.session_state, 'referrals') else [],  # Add referrals from session state
+            # Sections of the diagnosis; the API stores them for querying by diagnosis
+            "diagnosis_details": st.session_state.get("diagnosis_result"),
             "date": datetime.now().isoformat()
         }
         
-        # Save consultation to get the consultation_id first
+        # Upload the PDF to the API's file store first; the consultation refers to it by hash
+        pdf_path = getattr(st.session_state, 'view_pdf_path', None)
+        if pdf_path and os.path.exists(pdf_path):
+            data["prescription_sha256"] = upload_prescription_pdf(pdf_path)
+        
+        # Consultation, referrals and PDF are saved together or not at all
         response = requests.post(
-            f"{BASE_URL}/save-consultation",
+            f"{BASE_URL}/consultations",
             json=data
         )
         
         if response.status_code == 200:
             result = response.json()
-            consultation_id = result.get("consultation_id")
-            
-            # Now save the PDF if we have a PDF path and consultation_id
-            if consultation_id and hasattr(st.session_state, 'view_pdf_path') and st.session_state.view_pdf_path:
-                # Save the PDF to data/prescription directory
-                pdf_dest_path = save_prescription_pdf(
-                    st.session_state.view_pdf_path, 
-                    patient_id, 
-                    consultation_id
-                )
-                
-                # If PDF was saved successfully, update the consultation record
-                if pdf_dest_path:
-                    # Create updated data with prescription_pdf path
-                    updated_data = data.copy()
-                    updated_data["prescription_pdf"] = pdf_dest_path
-                    
-                    # Update via a separate API endpoint or directly in the database
-                    conn = sqlite3.connect("docassist.db")
-                    cursor = conn.cursor()
-                    
-                    try:
-                        cursor.execute(
-                            "UPDATE consultations SET prescription_pdf = ? WHERE id = ?",
-                            (pdf_dest_path, consultation_id)
-                        )
-                        conn.commit()
-                        st.success(f"Prescription PDF path saved to database: {pdf_dest_path}")
-                    except Exception as e:
-                        conn.rollback()
-                        st.error(f"Failed to update prescription PDF path: {str(e)}")
-                    finally:
-                        conn.close()
-            
-            # Also save individual referrals to the referrals table
-            if hasattr(st.session_state, 'referrals') and st.session_state.referrals:
-                for referral in st.session_state.referrals:
-                    save_referral(
-                        doctor_id,
-                        patient_id,
-                        referral.get("specialist_id", 0),
-                        referral.get("reason", "")
-                    )
-                st.success(f"Saved {len(st.session_state.referrals)} referrals to database")
-            
+            if result.get("prescription_pdf"):
+                st.success("Prescription PDF saved with the consultation")
+            if result.get("referral_ids"):
+                st.success(f"Saved {len(result['referral_ids'])} referrals to database")
             return True
         else:
             st.error(f"Failed to save consultation: {response.text}")
@@ -483,321 +595,184 @@ def save_consultation(doctor_id, patient_id, symptoms, diagnosis, prescription,
         st.error(f"Error saving consultation: {str(e)}")
         return False
 
-def create_prescription_pdf(patient_data, diagnosis, prescription, tests=None):
-    import tempfile
-    import os
-    import requests
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.ttfonts import TTFont
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT
+# Upper bound on the time spent translating one prescription. Sections that are
+# not translated in time are printed in English only.
+TRANSLATION_TIMEOUT_SECONDS = 20
+
+# Translation requests in flight at once across all sessions of this process
+TRANSLATION_WORKERS = 8
+
+@st.cache_resource
+def get_translation_pool():
+    """Thread pool shared by all sessions for dispatching translation requests"""
+    return ThreadPoolExecutor(max_workers=TRANSLATION_WORKERS, thread_name_prefix="translate")
+
+def translate_texts(texts, target_language, timeout=TRANSLATION_TIMEOUT_SECONDS):
+    """
+    Translate many strings with a single /translate-batch call. Returns
+    {text: translation}. Raises on failure; runs on worker threads, so it
+    must not call Streamlit.
+    """
+    texts = list(dict.fromkeys(text for text in texts if text and text.strip()))
+    if not texts:
+        return {}
     
-    # Create a temporary file
-    temp_filename = os.path.join(tempfile.gettempdir(), "prescription.pdf")
+    response = requests.post(
+        f"{BASE_URL}/translate-batch",
+        json={"texts": texts, "target_language": target_language.lower()},
+        timeout=timeout
+    )
+    response.raise_for_status()
     
-    # Patient language and translation check
-    patient_language = patient_data.get('language', 'English')
-    needs_translation = patient_language.lower() != 'english'
+    translations = response.json().get("translations", [])
+    return {text: translated for text, translated in zip(texts, translations) if translated}
+
+def translate_sections(sections, target_language, timeout=TRANSLATION_TIMEOUT_SECONDS):
+    """
+    Translate independent prescription sections concurrently, one batch request
+    per section, so the total wait is that of the slowest section. Sections that
+    fail or miss the deadline are left untranslated. Returns {text: translation}.
+    """
+    pool = get_translation_pool()
+    futures = {
+        pool.submit(translate_texts, texts, target_language, timeout): name
+        for name, texts in sections.items() if texts
+    }
     
-    # Register fonts with Unicode support - need to have these font files available
-    try:
-        # Try to register fonts for non-Latin scripts
-        font_paths = {
-            'urdu': '/usr/share/fonts/truetype/noto/NotoNastaliqUrdu-Regular.ttf',
-            'arabic': '/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf',
-            'punjabi': '/usr/share/fonts/truetype/noto/NotoSansGurmukhi-Regular.ttf',
-            'sindhi': '/usr/share/fonts/truetype/noto/NotoNastaliqUrdu-Regular.ttf',  # Uses Urdu script
-            'default': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
-        }
-        
-        # Try alternative paths if the above don't work
-        alt_font_paths = {
-            'urdu': '/usr/share/fonts/truetype/noto/NotoSansUrdu-Regular.ttf',
-            'arabic': '/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf',
-            'punjabi': '/usr/share/fonts/truetype/noto/NotoSansPunjabi-Regular.ttf',
-            'sindhi': '/usr/share/fonts/truetype/noto/NotoSansUrdu-Regular.ttf',
-            'default': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
-        }
-        
-        # Get the appropriate font path based on language
-        font_key = patient_language.lower()
-        font_path = font_paths.get(font_key, font_paths['default'])
-        
-        # Try alternative path if first one fails
-        if not os.path.exists(font_path):
-            font_path = alt_font_paths.get(font_key, alt_font_paths['default'])
-            
-        # If that still fails, use DejaVu as fallback
-        if not os.path.exists(font_path):
-            font_path = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
-            
-        # Register the font if it exists
-        if os.path.exists(font_path):
-            pdfmetrics.registerFont(TTFont('TranslationFont', font_path))
-            st.success(f"Registered font for {patient_language}")
-            
-            # Create a style for translations with the appropriate font
-            translation_style = ParagraphStyle(
-                name='Translation',
-                parent=getSampleStyleSheet()['Normal'],
-                fontName='TranslationFont',
-                textColor=(0.4, 0.4, 0.4),
-                fontSize=10
-            )
-        else:
-            st.warning(f"Could not find appropriate font for {patient_language}")
-            translation_style = ParagraphStyle(
-                name='Translation',
-                parent=getSampleStyleSheet()['Normal'],
-                textColor=(0.4, 0.4, 0.4),
-                fontName='Helvetica-Oblique'
-            )
-    except Exception as e:
-        st.warning(f"Error registering font: {str(e)}")
-        translation_style = ParagraphStyle(
-            name='Translation',
-            parent=getSampleStyleSheet()['Normal'],
-            textColor=(0.4, 0.4, 0.4),
-            fontName='Helvetica-Oblique'
-        )
+    done, not_done = wait(futures, timeout=timeout)
     
-    # Function to translate text
-    def translate_text(text, target_language):
-        if not needs_translation:
-            return None
-            
+    translations = {}
+    failed = []
+    for future in done:
         try:
-            language_code = target_language.lower()
-            response = requests.post(
-                f"{BASE_URL}/translate",
-                json={"text": text, "target_language": language_code}
-            )
-            
-            if response.status_code == 200:
-                translated = response.json().get("translated_text")
-                return translated
-            return None
+            translations.update(future.result())
         except Exception as e:
-            st.error(f"Translation error: {str(e)}")
-            return None
-    
-    # Set up the document
-    doc = SimpleDocTemplate(
-        temp_filename,
-        pagesize=letter,
-        rightMargin=72,
-        leftMargin=72,
-        topMargin=72,
-        bottomMargin=72
-    )
-    
-    # Styles
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(
-        name='Center',
-        parent=styles['Heading2'],
-        alignment=TA_CENTER
-    ))
-    
-    # Add our translation style to styles
-    styles.add(translation_style)
-    
-    # Story (contents)
-    story = []
-    
-    # Add header
-    story.append(Paragraph("Medical Prescription", styles['Center']))
-    
-    # Add translation for header
-    if needs_translation:
-        header_translation = translate_text("Medical Prescription", patient_language)
-        if header_translation:
-            story.append(Paragraph(f"({header_translation})", styles['Translation']))
-    
-    story.append(Spacer(1, 12))
-    
-    # Patient information
-    story.append(Paragraph(f"<b>Patient:</b> {patient_data.get('name', 'N/A')}", styles['Normal']))
-    if needs_translation:
-        patient_label = translate_text("Patient", patient_language)
-        if patient_label:
-            story.append(Paragraph(f"({patient_label}: {patient_data.get('name', 'N/A')})", styles['Translation']))
-    
-    story.append(Paragraph(f"<b>Age:</b> {patient_data.get('age', 'N/A')}", styles['Normal']))
-    if needs_translation:
-        age_translation = translate_text("Age", patient_language)
-        if age_translation:
-            story.append(Paragraph(f"({age_translation}: {patient_data.get('age', 'N/A')})", styles['Translation']))
-    
-    story.append(Paragraph(f"<b>Gender:</b> {patient_data.get('gender', 'N/A')}", styles['Normal']))
-    if needs_translation:
-        gender_label = translate_text("Gender", patient_language)
-        gender_value = translate_text(patient_data.get('gender', 'N/A'), patient_language)
-        if gender_label and gender_value:
-            story.append(Paragraph(f"({gender_label}: {gender_value})", styles['Translation']))
-    
-    story.append(Paragraph(f"<b>Date:</b> {datetime.now().strftime('%Y-%m-%d')}", styles['Normal']))
-    if needs_translation:
-        date_label = translate_text("Date", patient_language)
-        if date_label:
-            story.append(Paragraph(f"({date_label}: {datetime.now().strftime('%Y-%m-%d')})", styles['Translation']))
-    
-    story.append(Spacer(1, 12))
-    
-    # Diagnosis
-    story.append(Paragraph("<b>Diagnosis:</b>", styles['Heading3']))
-    if needs_translation:
-        diagnosis_label = translate_text("Diagnosis", patient_language)
-        if diagnosis_label:
-            story.append(Paragraph(f"({diagnosis_label})", styles['Translation']))
-    
-    story.append(Paragraph(diagnosis.replace('\n', '<br/>'), styles['Normal']))
-    if needs_translation:
-        diagnosis_translation = translate_text(diagnosis, patient_language)
-        if diagnosis_translation:
-            story.append(Paragraph(diagnosis_translation.replace('\n', '<br/>'), styles['Translation']))
-    
-    story.append(Spacer(1, 12))
+            print(f"Translation of {futures[future]} failed: {e}")
+            failed.append(futures[future])
+    for future in not_done:
+        future.cancel()
+        failed.append(futures[future])
+    
+    if failed:
+        st.warning(f"Could not translate {', '.join(sorted(failed))}; these are shown in English only.")
+    return translations
+
+@st.cache_resource
+def get_label_bundles():
+    """Static prescription label translations, loaded once per Streamlit process"""
+    return load_label_bundles()
+
+def get_labels(language):
+    """Pre-translated fixed labels for a language ({} if it has no bundle)"""
+    return get_label_bundles().get(language.lower(), {})
+
+def collect_prescription_texts(patient_data, diagnosis, prescription, tests=None, include_medications=True):
+    """
+    Every free-text string a prescription renderer may translate, grouped into
+    independent sections so they can be translated concurrently. Labels in the
+    language's bundle are left out. Returns {section name: [texts]}.
+    """
+    sections = {
+        "labels": PRESCRIPTION_LABELS + [patient_data.get('gender', 'N/A')],
+        "diagnosis": [diagnosis]
+    }
     
-    # Add referrals section if there are any referrals in session state
     if hasattr(st.session_state, 'referrals') and st.session_state.referrals:
-        story.append(Paragraph("<b>Referrals:</b>", styles['Heading3']))
-        if needs_translation:
-            referrals_label = translate_text("Referrals", patient_language)
-            if referrals_label:
-                story.append(Paragraph(f"({referrals_label})", styles['Translation']))
-        
-        # Add each referral
-        for referral in st.session_state.referrals:
-            specialist = referral.get('specialist', {})
-            specialist_name = specialist.get('name', 'Unknown Specialist')
-            specialist_category = specialist.get('category', 'Unknown Category')
-            reason = referral.get('reason', 'No reason specified')
-            
-            referral_text = f"{specialist_name} ({specialist_category}) - {reason}"
-            story.append(Paragraph(f"• {referral_text}", styles['Normal']))
-            
-            if needs_translation:
-                referral_translation = translate_text(referral_text, patient_language)
-                if referral_translation:
-                    story.append(Paragraph(f"({referral_translation})", styles['Translation']))
-        
-        story.append(Spacer(1, 12))
+        sections["referrals"] = [format_referral(referral) for referral in st.session_state.referrals]
     
-    # Prescription
-    story.append(Paragraph("<b>Prescription:</b>", styles['Heading3']))
-    if needs_translation:
-        prescription_label = translate_text("Prescription", patient_language)
-        if prescription_label:
-            story.append(Paragraph(f"({prescription_label})", styles['Translation']))
-    
-    # Parse prescription
-    if "PRESCRIPTION:" in prescription and "• " in prescription:
-        medications = []
-        additional_instructions = ""
-        
-        lines = prescription.split("\n")
-        reading_meds = False
-        reading_instructions = False
-        
-        for line in lines:
-            if "PRESCRIPTION:" in line:
-                reading_meds = True
-                continue
-                
-            if "ADDITIONAL INSTRUCTIONS:" in line:
-                reading_meds = False
-                reading_instructions = True
-                continue
-                
-            if reading_meds and line.strip() and line.strip().startswith("• "):
-                medications.append(parse_medication_details(line))
-                
-            if reading_instructions and line.strip():
-                additional_instructions += line + "\n"
-        
-        # Create HTML table for medications
-        story.append(Spacer(1, 12))
-        story.append(Paragraph("<b>Medications:</b>", styles['Heading3']))
-        table_data = [["Medication", "Dosage", "Frequency", "Duration", "Side Effects", "Interactions", "Pregnancy Safety"]]
-        for med in medications:
-            table_data.append([
-                med.get('medication', ''),
-                med.get('dosage', ''),
-                med.get('frequency', ''),
-                med.get('duration', ''),
-                med.get('side_effects', ''),
-                med.get('interactions', ''),
-                med.get('pregnancy_safety', '')
-            ])
-        from reportlab.platypus import Table, TableStyle
-        from reportlab.lib import colors
-        table = Table(table_data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ]))
-        story.append(table)
-        
-        if additional_instructions.strip():
-            story.append(Spacer(1, 12))
-            story.append(Paragraph("<b>Additional Instructions:</b>", styles['Heading3']))
-            story.append(Paragraph(additional_instructions.replace('\n', '<br/>'), styles['Normal']))
-            if needs_translation:
-                instr_translation = translate_text(additional_instructions, patient_language)
-                if instr_translation:
-                    story.append(Paragraph(instr_translation.replace('\n', '<br/>'), styles['Translation']))
+    medications, additional_instructions = parse_prescription_sections(prescription)
+    if medications is None:
+        sections["prescription"] = [prescription]
     else:
-        # Raw prescription text
-        story.append(Paragraph(prescription.replace('\n', '<br/>'), styles['Normal']))
-        if needs_translation:
-            prescription_translation = translate_text(prescription, patient_language)
-            if prescription_translation:
-                story.append(Paragraph(prescription_translation.replace('\n', '<br/>'), styles['Translation']))
+        if include_medications:
+            for i, med in enumerate(medications):
+                sections[f"medication {i + 1}"] = [format_medication_summary(med)]
+        sections["additional instructions"] = [additional_instructions]
+    
+    if tests:
+        sections["tests"] = list(tests)
+    
+    labels = get_labels(patient_data.get('language', 'English'))
+    return {
+        name: [text for text in texts if text not in labels]
+        for name, texts in sections.items()
+    }
+
+def get_prescription_model(patient_data, diagnosis, prescription, tests=None):
+    """
+    The translated prescription model for this session. It is built (and
+    translated) once per distinct prescription and reused by the HTML, PDF and
+    text renders.
+    """
+    referrals = st.session_state.referrals if hasattr(st.session_state, 'referrals') and st.session_state.referrals else []
+    date = datetime.now().strftime('%Y-%m-%d')
+    key = hashlib.sha256(json.dumps(
+        [patient_data, diagnosis, prescription, tests, referrals, date], sort_keys=True, default=str
+    ).encode("utf-8")).hexdigest()
+    cached = st.session_state.get("prescription_model")
+    if cached and cached[0] == key:
+        return cached[1]
+    
+    # Translate every section this prescription needs up front, concurrently
+    patient_language = patient_data.get('language', 'English')
+    translations = {}
+    if patient_language.lower() != 'english':
+        translations = translate_sections(
+            collect_prescription_texts(patient_data, diagnosis, prescription, tests),
+            patient_language
+        )
     
-    # Add tests if present
-    if tests and len(tests) > 0:
-        story.append(Spacer(1, 12))
-        story.append(Paragraph("<b>Recommended Medical Tests:</b>", styles['Heading3']))
-        if needs_translation:
-            tests_label = translate_text("Recommended Medical Tests", patient_language)
-            if tests_label:
-                story.append(Paragraph(f"({tests_label})", styles['Translation']))
-                
-        # Add tests as bullet points
-        for test in tests:
-            story.append(Paragraph(f"• {test}", styles['Normal']))
-            if needs_translation:
-                test_translation = translate_text(test, patient_language)
-                if test_translation:
-                    story.append(Paragraph(f"({test_translation})", styles['Translation']))
+    medications, additional_instructions = parse_prescription_sections(prescription)
+    model = prescription_model(
+        patient_data, diagnosis, prescription,
+        medications=medications,
+        additional_instructions=additional_instructions,
+        referrals=referrals,
+        tests=tests,
+        labels=get_labels(patient_language),
+        translations=translations,
+        date=date
+    )
+    st.session_state.prescription_model = (key, model)
+    return model
+
+def render_path(suffix):
+    """
+    Temp file for one render in this session. Every render gets its own file so
+    doctors rendering at the same time never overwrite each other's documents.
+    """
+    path = new_temp_path(suffix)
+    st.session_state.setdefault("render_paths", []).append(path)
+    return path
+
+def discard_previous_renders():
+    """Delete the temp files of this session's earlier renders"""
+    for path in st.session_state.get("render_paths", []):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    st.session_state.render_paths = []
+
+def create_prescription_pdf(patient_data, diagnosis, prescription, tests=None):
+    # Create a temporary file
+    temp_filename = render_path(".pdf")
     
-    story.append(Spacer(1, 24))
+    model = get_prescription_model(patient_data, diagnosis, prescription, tests)
     
-    # Language notice
-    if needs_translation:
-        notice = f"This prescription includes English and {patient_language} text."
-    else:
-        notice = "This prescription is in English only."
-        
-    story.append(Paragraph(notice, styles['Italic']))
+    # Fonts are registered and styles built once per language, then reused
+    styles = get_prescription_styles(model['language'])
+    if model['needs_translation'] and styles['Translation'].fontName == 'Helvetica-Oblique':
+        st.warning(f"Could not find appropriate font for {model['language']}")
     
     # Build the PDF document
     try:
-        doc.build(story)
+        render_prescription_reportlab(model, temp_filename, styles)
         st.success("PDF generated successfully")
     except Exception as e:
         st.error(f"PDF generation error: {str(e)}")
         # Fallback to simple PDF without translations
         try:
-            from fpdf import FPDF
             pdf = FPDF()
             pdf.add_page()
             pdf.set_font('Arial', '', 12)
@@ -854,329 +829,15 @@ def create_prescription_pdf_legacy(patient_data, diagnosis, prescription, tests=
 
 def create_prescription_html(patient_data, diagnosis, prescription, tests=None):
     """Generate an HTML version of the prescription with proper RTL support"""
-    import os
-    import tempfile
-    import base64
-    
     # Create a temporary file
-    temp_filename = os.path.join(tempfile.gettempdir(), "prescription.html")
+    temp_filename = render_path(".html")
     
-    # Patient language and translation check
-    patient_language = patient_data.get('language', 'English')
-    needs_translation = patient_language.lower() != 'english'
-    
-    # Check if language is RTL
-    rtl_languages = ['urdu', 'arabic', 'persian', 'sindhi']
-    is_rtl = patient_language.lower() in rtl_languages
-    
-    # Function to translate text
-    def translate_text(text, target_language):
-        if not needs_translation:
-            return None
-            
-        try:
-            language_code = target_language.lower()
-            response = requests.post(
-                f"{BASE_URL}/translate",
-                json={"text": text, "target_language": language_code}
-            )
-            
-            if response.status_code == 200:
-                return response.json().get("translated_text")
-            return None
-        except Exception as e:
-            st.error(f"Translation error: {str(e)}")
-            return None
-    
-    # Function to convert newlines to <br> tags
-    def nl2br(text):
-        if text:
-            return text.replace("\n", "<br>")
-        return ""
-    
-    # Load QR code image and convert to base64 for embedding in HTML
-    try:
-        with open("Muawin_WA.png", "rb") as qr_file:
-            qr_base64 = base64.b64encode(qr_file.read()).decode('utf-8')
-        qr_img_html = f'<img src="data:image/png;base64,{qr_base64}" style="float:right; width:100px; height:100px; margin-left:15px;">'
-    except Exception as e:
-        st.warning(f"QR code image not found: {e}")
-        qr_img_html = ""
-    
-    # Build HTML content
-    html = []
-    html.append("<!DOCTYPE html>")
-    html.append("<html>")
-    html.append("<head>")
-    html.append("    <meta charset='UTF-8'>")
-    html.append("    <title>Medical Prescription</title>")
-    html.append("    <style>")
-    html.append("        body { font-family: Arial, sans-serif; margin: 20px; }")
-    html.append("        .rtl { direction: rtl; text-align: right; }")
-    html.append("        .ltr { direction: ltr; text-align: left; }")
-    html.append("        .translation { color: #555; font-style: italic; margin: 5px 0 15px 0; }")
-    html.append("        h1 { text-align: center; }")
-    html.append("        .section { margin-top: 20px; }")
-    html.append("        .header { font-weight: bold; margin-top: 15px; }")
-    html.append("        .content { margin-left: 20px; }")
-    html.append("        @media print {")
-    html.append("            .no-print { display: none; }")
-    html.append("            body { margin: 1cm; }")
-    html.append("        }")
-    html.append("        .header-container { display: flex; justify-content: space-between; align-items: center; }")
-    html.append("        .qr-code { width: 100px; height: 100px; }")
-    html.append("    </style>")
-    html.append("</head>")
-    html.append("<body>")
-    
-    # Header with QR code
-    html.append("    <div class='header-container'>")
-    html.append(f"        <h1 style='margin-right: auto;'>Medical Prescription</h1>{qr_img_html}")
-    html.append("    </div>")
-    
-    # Header translation
-    if needs_translation:
-        header_translation = translate_text("Medical Prescription", patient_language)
-        if header_translation:
-            direction_class = "rtl" if is_rtl else "ltr"
-            html.append(f"    <div class='translation {direction_class}'>{header_translation}</div>")
-    
-    # Patient information
-    html.append("    <div class='section'>")
-    html.append(f"        <div><strong>Patient:</strong> {patient_data.get('name', 'N/A')}</div>")
-    
-    # Patient translation
-    if needs_translation:
-        patient_label = translate_text("Patient", patient_language)
-        if patient_label:
-            direction_class = "rtl" if is_rtl else "ltr"
-            html.append(f"        <div class='translation {direction_class}'>{patient_label}: {patient_data.get('name', 'N/A')}</div>")
-    
-    # Age information
-    html.append(f"        <div><strong>Age:</strong> {patient_data.get('age', 'N/A')}</div>")
-    if needs_translation:
-        age_label = translate_text("Age", patient_language)
-        if age_label:
-            direction_class = "rtl" if is_rtl else "ltr"
-            html.append(f"        <div class='translation {direction_class}'>{age_label}: {patient_data.get('age', 'N/A')}</div>")
-    
-    # Gender information
-    html.append(f"        <div><strong>Gender:</strong> {patient_data.get('gender', 'N/A')}</div>")
-    if needs_translation:
-        gender_label = translate_text("Gender", patient_language)
-        gender_value = translate_text(patient_data.get('gender', 'N/A'), patient_language)
-        if gender_label and gender_value:
-            direction_class = "rtl" if is_rtl else "ltr"
-            html.append(f"        <div class='translation {direction_class}'>{gender_label}: {gender_value}</div>")
-    
-    # Date information
-    current_date = datetime.now().strftime('%Y-%m-%d')
-    html.append(f"        <div><strong>Date:</strong> {current_date}</div>")
-    if needs_translation:
-        date_label = translate_text("Date", patient_language)
-        if date_label:
-            direction_class = "rtl" if is_rtl else "ltr"
-            html.append(f"        <div class='translation {direction_class}'>{date_label}: {current_date}</div>")
-    
-    html.append("    </div>")
-    
-    # Diagnosis section
-    html.append("    <div class='section'>")
-    html.append("        <div class='header'>Diagnosis:</div>")
-    if needs_translation:
-        diagnosis_label = translate_text("Diagnosis", patient_language)
-        if diagnosis_label:
-            direction_class = "rtl" if is_rtl else "ltr"
-            html.append(f"        <div class='translation {direction_class}'>{diagnosis_label}</div>")
-    
-    # Format diagnosis with line breaks
-    html.append(f"        <div class='content'>{nl2br(diagnosis)}</div>")
-    if needs_translation:
-        diagnosis_translation = translate_text(diagnosis, patient_language)
-        if diagnosis_translation:
-            direction_class = "rtl" if is_rtl else "ltr"
-            html.append(f"        <div class='translation content {direction_class}'>{nl2br(diagnosis_translation)}</div>")
-    
-    html.append("    </div>")
-    
-    # Add referrals section if there are any referrals in session state
-    if hasattr(st.session_state, 'referrals') and st.session_state.referrals:
-        html.append("    <div class='section'>")
-        html.append("        <div class='header'>Referrals:</div>")
-        if needs_translation:
-            referrals_label = translate_text("Referrals", patient_language)
-            if referrals_label:
-                direction_class = "rtl" if is_rtl else "ltr"
-                html.append(f"        <div class='translation {direction_class}'>{referrals_label}</div>")
-        
-        html.append("        <div class='content'>")
-        html.append("            <ul>")
-        
-        # Add each referral
-        for referral in st.session_state.referrals:
-            specialist = referral.get('specialist', {})
-            specialist_name = specialist.get('name', 'Unknown Specialist')
-            specialist_category = specialist.get('category', 'Unknown Category')
-            reason = referral.get('reason', 'No reason specified')
-            
-            referral_text = f"{specialist_name} ({specialist_category}) - {reason}"
-            html.append(f"                <li>{referral_text}</li>")
-            
-            if needs_translation:
-                referral_translation = translate_text(referral_text, patient_language)
-                if referral_translation:
-                    direction_class = "rtl" if is_rtl else "ltr"
-                    html.append(f"                <div class='translation {direction_class}'>({referral_translation})</div>")
-        
-        html.append("            </ul>")
-        html.append("        </div>")
-        html.append("    </div>")
-    
-    # Prescription section
-    html.append("    <div class='section'>")
-    html.append("        <div class='header'>Prescription:</div>")
-    if needs_translation:
-        prescription_label = translate_text("Prescription", patient_language)
-        if prescription_label:
-            direction_class = "rtl" if is_rtl else "ltr"
-            html.append(f"        <div class='translation {direction_class}'>{prescription_label}</div>")
-    
-    # Parse prescription
-    if "PRESCRIPTION:" in prescription and "• " in prescription:
-        medications = []
-        additional_instructions = ""
-        
-        lines = prescription.split("\n")
-        reading_meds = False
-        reading_instructions = False
-        
-        for line in lines:
-            if "PRESCRIPTION:" in line:
-                reading_meds = True
-                continue
-                
-            if "ADDITIONAL INSTRUCTIONS:" in line:
-                reading_meds = False
-                reading_instructions = True
-                continue
-                
-            if reading_meds and line.strip() and line.strip().startswith("• "):
-                medications.append(parse_medication_details(line))
-                
-            if reading_instructions and line.strip():
-                additional_instructions += line + "\n"
-        
-        # Create HTML table for medications
-        html.append("        <div class='content'>")
-        html.append("            <table style='width: 100%; border-collapse: collapse; margin: 15px 0;'>")
-        html.append("                <thead>")
-        html.append("                    <tr style='background-color: #f2f2f2;'>")
-        html.append("                        <th style='border: 1px solid #ddd; padding: 8px; text-align: left;'>Medication</th>")
-        html.append("                        <th style='border: 1px solid #ddd; padding: 8px; text-align: left;'>Dosage</th>")
-        html.append("                        <th style='border: 1px solid #ddd; padding: 8px; text-align: left;'>Frequency</th>")
-        html.append("                        <th style='border: 1px solid #ddd; padding: 8px; text-align: left;'>Duration</th>")
-        html.append("                        <th style='border: 1px solid #ddd; padding: 8px; text-align: left;'>Side Effects</th>")
-        html.append("                        <th style='border: 1px solid #ddd; padding: 8px; text-align: left;'>Interactions</th>")
-        html.append("                        <th style='border: 1px solid #ddd; padding: 8px; text-align: left;'>Pregnancy Safety</th>")
-        html.append("                    </tr>")
-        html.append("                </thead>")
-        html.append("                <tbody>")
-        
-        # Add each medication as a row
-        for med in medications:
-            html.append("                    <tr>")
-            html.append(f"                        <td style='border: 1px solid #ddd; padding: 8px;'>{med.get('medication', '')}</td>")
-            html.append(f"                        <td style='border: 1px solid #ddd; padding: 8px;'>{med.get('dosage', '')}</td>")
-            html.append(f"                        <td style='border: 1px solid #ddd; padding: 8px;'>{med.get('frequency', '')}</td>")
-            html.append(f"                        <td style='border: 1px solid #ddd; padding: 8px;'>{med.get('duration', '')}</td>")
-            html.append(f"                        <td style='border: 1px solid #ddd; padding: 8px;'>{med.get('side_effects', '')}</td>")
-            html.append(f"                        <td style='border: 1px solid #ddd; padding: 8px;'>{med.get('interactions', '')}</td>")
-            html.append(f"                        <td style='border: 1px solid #ddd; padding: 8px;'>{med.get('pregnancy_safety', '')}</td>")
-            html.append("                    </tr>")
-            
-            # If translation needed, add a row for translation
-            if needs_translation:
-                med_str = f"{med.get('medication', '')}"
-                if med.get('dosage'): med_str += f" - {med.get('dosage')}"
-                if med.get('frequency'): med_str += f" - {med.get('frequency')}"
-                if med.get('duration'): med_str += f" - {med.get('duration')}"
-                if med.get('side_effects'): med_str += f" (Side effects: {med.get('side_effects')})"
-                if med.get('interactions'): med_str += f" (Interactions: {med.get('interactions')})"
-                if med.get('pregnancy_safety'): med_str += f" (Pregnancy safety: {med.get('pregnancy_safety')})"
-                
-                med_translation = translate_text(med_str, patient_language)
-                if med_translation:
-                    direction_class = "rtl" if is_rtl else "ltr"
-                    html.append(f"                    <tr class='{direction_class}' style='background-color: #f9f9f9;'>")
-                    html.append(f"                        <td colspan='7' style='border: 1px solid #ddd; padding: 8px; font-style: italic; color: #555;'>{med_translation}</td>")
-                    html.append("                    </tr>")
-        
-        html.append("                </tbody>")
-        html.append("            </table>")
-        html.append("        </div>")
-        
-        # Add additional instructions
-        if additional_instructions.strip():
-            html.append("        <div class='header'>Additional Instructions:</div>")
-            if needs_translation:
-                instr_label = translate_text("Additional Instructions", patient_language)
-                if instr_label:
-                    direction_class = "rtl" if is_rtl else "ltr"
-                    html.append(f"        <div class='translation {direction_class}'>{instr_label}</div>")
-            
-            html.append(f"        <div class='content'>{nl2br(additional_instructions)}</div>")
-            if needs_translation:
-                instr_translation = translate_text(additional_instructions, patient_language)
-                if instr_translation:
-                    direction_class = "rtl" if is_rtl else "ltr"
-                    html.append(f"        <div class='translation content {direction_class}'>{nl2br(instr_translation)}</div>")
-    else:
-        # Raw prescription text
-        html.append(f"        <div class='content'>{nl2br(prescription)}</div>")
-        if needs_translation:
-            prescription_translation = translate_text(prescription, patient_language)
-            if prescription_translation:
-                direction_class = "rtl" if is_rtl else "ltr"
-                html.append(f"        <div class='translation content {direction_class}'>{nl2br(prescription_translation)}</div>")
-    
-    html.append("    </div>")
-    
-    # Add tests section if tests are present
-    if tests and len(tests) > 0:
-        html.append("    <div class='section'>")
-        html.append("        <div class='header'>Recommended Medical Tests:</div>")
-        if needs_translation:
-            tests_label = translate_text("Recommended Medical Tests", patient_language)
-            if tests_label:
-                direction_class = "rtl" if is_rtl else "ltr"
-                html.append(f"        <div class='translation {direction_class}'>{tests_label}</div>")
-        
-        html.append("        <div class='content'>")
-        html.append("            <ul>")
-        for test in tests:
-            html.append(f"                <li>{test}</li>")
-            if needs_translation:
-                test_translation = translate_text(test, patient_language)
-                if test_translation:
-                    direction_class = "rtl" if is_rtl else "ltr"
-                    html.append(f"                <div class='translation {direction_class}'>({test_translation})</div>")
-        html.append("            </ul>")
-        html.append("        </div>")
-        html.append("    </div>")
-    
-    # Print button
-    html.append("    <div class='no-print' style='margin-top: 30px; text-align: center;'>")
-    html.append("        <button onclick='window.print()'>Print Prescription</button>")
-    html.append("    </div>")
-    
-    # Close HTML
-    html.append("</body>")
-    html.append("</html>")
+    model = get_prescription_model(patient_data, diagnosis, prescription, tests)
     
     # Write to file
     try:
         with open(temp_filename, "w", encoding="utf-8") as f:
-            f.write("\n".join(html))
+            f.write(render_prescription_html(model))
         
         return temp_filename
     except Exception as e:
@@ -1185,11 +846,8 @@ def create_prescription_html(patient_data, diagnosis, prescription, tests=None):
 
 def create_prescription(patient_data, diagnosis, prescription):
     """Generate both HTML and PDF prescriptions using the HTML-first approach"""
-    import os
-    import tempfile
-    import subprocess
-    
     st.write("Generating prescription documents...")
+    discard_previous_renders()
     
     # Get tests from session state
     tests = st.session_state.tests if hasattr(st.session_state, 'tests') and st.session_state.tests else None
@@ -1202,40 +860,25 @@ def create_prescription(patient_data, diagnosis, prescription):
         return None, None
     
     # Now convert HTML to PDF using wkhtmltopdf (much better RTL support than ReportLab)
-    pdf_path = os.path.join(tempfile.gettempdir(), "prescription.pdf")
+    # One worker pool per process, shared by every session of this Streamlit server
+    render_service = get_render_service()
+    if not render_service.available:
+        st.warning("wkhtmltopdf not found. Installing it would improve PDF generation with RTL languages.")
+        # Fall back to ReportLab method
+        return create_prescription_pdf_legacy(patient_data, diagnosis, prescription, tests), html_path
     
     try:
-        # Check if wkhtmltopdf is installed
-        result = subprocess.run(['which', 'wkhtmltopdf'], capture_output=True, text=True)
-        wkhtmltopdf_path = result.stdout.strip()
-        
-        if not wkhtmltopdf_path:
-            st.warning("wkhtmltopdf not found. Installing it would improve PDF generation with RTL languages.")
-            # Fall back to ReportLab method
-            return create_prescription_pdf_legacy(patient_data, diagnosis, prescription, tests), html_path
-        
-        # Convert HTML to PDF using wkhtmltopdf
-        cmd = [
-            wkhtmltopdf_path,
-            '--encoding', 'UTF-8',
-            '--margin-top', '20',
-            '--margin-right', '20',
-            '--margin-bottom', '20',
-            '--margin-left', '20',
-            html_path,
-            pdf_path
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode == 0:
-            st.success("PDF generated successfully from HTML")
-            return pdf_path, html_path
-        else:
-            st.warning(f"HTML to PDF conversion failed: {result.stderr}")
-            # Fall back to ReportLab method
-            return create_prescription_pdf_legacy(patient_data, diagnosis, prescription, tests), html_path
-            
+        with open(html_path, encoding="utf-8") as f:
+            pdf_bytes = render_service.render(f.read())
+        pdf_path = render_path(".pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(pdf_bytes)
+        st.success("PDF generated successfully from HTML")
+        return pdf_path, html_path
+    except RenderError as e:
+        st.warning(f"HTML to PDF conversion failed: {str(e)}")
+        # Fall back to ReportLab method
+        return create_prescription_pdf_legacy(patient_data, diagnosis, prescription, tests), html_path
     except Exception as e:
         st.error(f"Error converting HTML to PDF: {str(e)}")
         # Fall back to ReportLab method
@@ -1243,7 +886,7 @@ def create_prescription(patient_data, diagnosis, prescription):
 
 def create_modal_buttons(pdf_path, html_path, patient_name):
     """Create download button and in-page viewer instead of modal popup"""
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     
     # Store the path in session state
     st.session_state.view_pdf_path = pdf_path
@@ -1274,6 +917,17 @@ def create_modal_buttons(pdf_path, html_path, patient_name):
                 mime="text/html"
             )
     
+    with col3:
+        # Plain text comes from the same translated model as the HTML and PDF
+        cached_model = st.session_state.get("prescription_model")
+        if cached_model:
+            st.download_button(
+                label="💾 Download Text Version",
+                data=render_prescription_text(cached_model[1]),
+                file_name=f"prescription_{patient_name.replace(' ', '_')}.txt",
+                mime="text/plain"
+            )
+    
     # Display HTML version directly as it has better browser compatibility
     if html_path:
         with open(html_path, "r", encoding="utf-8") as f:
@@ -1306,129 +960,6 @@ def create_modal_buttons(pdf_path, html_path, patient_name):
     3. Use the print function in your browser/viewer
     """)
 
-def parse_medication_details(med_line):
-    """Parse medication details from either bullet point format or markdown table row"""
-    # Initialize medication parts
-    med = {
-        "medication": "",
-        "dosage": "",
-        "frequency": "",
-        "duration": "",
-        "side_effects": "",
-        "interactions": "",
-        "pregnancy_safety": ""
-    }
-    
-    # Check if this is a markdown table row (starts with |)
-    if med_line.startswith("|"):
-        # This is a markdown table row, parse it accordingly
-        columns = [col.strip() for col in med_line.split("|")]
-        # Remove empty entries (from the beginning and end of the split)
-        columns = [col for col in columns if col]
-        
-        # Map columns to medication fields based on position
-        # Standard column order: Name, Dosage, Frequency, Duration, Side Effects, Interactions, Pregnancy
-        if len(columns) >= 1:
-            med["medication"] = columns[0]
-        if len(columns) >= 2:
-            med["dosage"] = columns[1]
-        if len(columns) >= 3:
-            med["frequency"] = columns[2]
-        if len(columns) >= 4:
-            med["duration"] = columns[3]
-        if len(columns) >= 5:
-            med["side_effects"] = columns[4]
-        if len(columns) >= 6:
-            med["interactions"] = columns[5]
-        if len(columns) >= 7:
-            med["pregnancy_safety"] = columns[6]
-        
-        print(f"Parsed table row: {med}")
-        return med
-    
-    # If not a table row, proceed with the original parsing logic
-    # Remove bullet point if present
-    if med_line.startswith("• "):
-        med_line = med_line[2:].strip()
-    
-    # First, try to find labeled sections for specialized fields (more reliable)
-    labeled_fields = {
-        "Side Effects:": "side_effects",
-        "Side effects:": "side_effects",
-        "Medication Interactions:": "interactions", 
-        "Drug Interactions:": "interactions",
-        "Interactions:": "interactions",
-        "Pregnancy Safety:": "pregnancy_safety",
-        "Pregnancy safety:": "pregnancy_safety",
-        "Pregnancy Category:": "pregnancy_safety",
-        "Pregnancy:": "pregnancy_safety"
-    }
-    
-    # Handle each specialized field separately
-    remaining_line = med_line
-    for label, field in labeled_fields.items():
-        if label in remaining_line:
-            parts = remaining_line.split(label, 1)
-            before_text = parts[0].strip()
-            after_text = parts[1].strip()
-            
-            # Find the next label if any
-            next_label_pos = len(after_text)
-            next_label = None
-            for next_label_candidate in labeled_fields.keys():
-                if next_label_candidate in after_text:
-                    pos = after_text.find(next_label_candidate)
-                    if 0 <= pos < next_label_pos:
-                        next_label_pos = pos
-                        next_label = next_label_candidate
-            
-            if next_label:
-                # Extract content up to the next label
-                med[field] = after_text[:next_label_pos].strip()
-                # Keep the rest (including the next label) for further processing
-                remaining_line = before_text + " " + after_text[next_label_pos:]
-            else:
-                # This is the last labeled section
-                med[field] = after_text.strip()
-                remaining_line = before_text
-    
-    # Now parse the remaining line for the basic medication information
-    # Simple case: "Medication - Dosage - Frequency - Duration" format
-    parts = [p.strip() for p in remaining_line.split(" - ")]
-    
-    if len(parts) >= 1:
-        med["medication"] = parts[0].strip()
-    if len(parts) >= 2:
-        med["dosage"] = parts[1].strip()
-    if len(parts) >= 3:
-        med["frequency"] = parts[2].strip()
-    if len(parts) >= 4:
-        med["duration"] = parts[3].strip()
-    
-    # Check for side effects in parentheses if not already found
-    if not med["side_effects"]:
-        sidx = remaining_line.find("(")
-        if sidx > 0:
-            eidx = remaining_line.find(")", sidx)
-            if eidx > sidx:
-                possible_side_effects = remaining_line[sidx+1:eidx].strip()
-                # Only use if it looks like side effects
-                if len(possible_side_effects) > 5 and "side" in possible_side_effects.lower():
-                    med["side_effects"] = possible_side_effects
-    
-    # Final clean up - remove parentheses and extra formatting
-    for field in med:
-        if med[field]:
-            # Remove unnecessary parentheses and extra spaces
-            med[field] = med[field].replace("(", "").replace(")", "").strip()
-            # If the field accidentally starts with a field label, remove it
-            for label in labeled_fields:
-                if med[field].startswith(label):
-                    med[field] = med[field][len(label):].strip()
-    
-    print(f"Parsed text line: {med_line} -> {med}")
-    return med
-
 def update_patient_conditions(patient_id, pre_conditions):
     """Update patient's pre-existing conditions in the database"""
     try:
@@ -1456,47 +987,6 @@ def update_patient_conditions(patient_id, pre_conditions):
         st.error(f"Error updating patient data: {str(e)}")
         return False
 
-def save_prescription_pdf(pdf_path, patient_id, consultation_id):
-    """
-    Save a prescription PDF to the data/prescription directory with format
-    PATIENTID_CONSULTATIONID.pdf
-    
-    Args:
-        pdf_path: Path to the temporary PDF file
-        patient_id: ID of the patient
-        consultation_id: ID of the consultation
-        
-    Returns:
-        Path to the saved PDF file or None if failed
-    """
-    import os
-    import shutil
-    
-    # Create data/prescription directory if it doesn't exist
-    prescription_dir = "data/prescription"
-    if not os.path.exists(prescription_dir):
-        try:
-            os.makedirs(prescription_dir)
-        except Exception as e:
-            st.error(f"Failed to create prescription directory: {str(e)}")
-            return None
-    
-    # Create the filename: PATIENTID_CONSULTATIONID.pdf
-    filename = f"{patient_id}_{consultation_id}.pdf"
-    dest_path = os.path.join(prescription_dir, filename)
-    
-    # Get absolute path for external applications
-    abs_dest_path = os.path.abspath(dest_path)
-    
-    try:
-        # Copy the file from temporary location to destination
-        shutil.copyfile(pdf_path, dest_path)
-        st.success(f"Prescription PDF saved to {dest_path}")
-        return abs_dest_path
-    except Exception as e:
-        st.error(f"Failed to save prescription PDF: {str(e)}")
-        return None
-
 def clear_consultation_data():
     """Clear all consultation records from database for demo purposes"""
     if st.session_state.authenticated:
@@ -1784,26 +1274,16 @@ def display_main_interface():
         
         # Display the full diagnosis text
         diagnosis_text = st.session_state.diagnosis
+        diagnosis_result = get_diagnosis_result()
 
-        # Check if there's a patient history summary section
-        if "PATIENT HISTORY SUMMARY:" in diagnosis_text:
-            history_start = diagnosis_text.find("PATIENT HISTORY SUMMARY:") + len("PATIENT HISTORY SUMMARY:")
-            history_end = diagnosis_text.find("DIAGNOSIS:")
+        # Show the patient history summary on its own to avoid duplication
+        if diagnosis_result.get("history_summary") and "DIAGNOSIS:" in diagnosis_text:
+            st.subheader("Patient History Summary")
+            st.write(diagnosis_result["history_summary"])
             
-            if history_end > history_start:
-                history_summary = diagnosis_text[history_start:history_end].strip()
-                st.subheader("Patient History Summary")
-                st.write(history_summary)
-                
-                # Remove history summary from the diagnosis display to avoid duplication
-                diagnosis_display = diagnosis_text[history_end:]
-                st.subheader("Current Diagnosis")
-                st.write(diagnosis_display)
-            else:
-                # Fall back to displaying the full text if parsing fails
-                st.write(diagnosis_text)
+            st.subheader("Current Diagnosis")
+            st.write(diagnosis_text[diagnosis_text.find("DIAGNOSIS:"):])
         else:
-            # If no history section, display the diagnosis as before
             st.write(diagnosis_text)
         
         # Check if there's a raw prescription in the session state that we need to confirm
@@ -1815,29 +1295,8 @@ def display_main_interface():
                 st.experimental_rerun()
             return
         
-        # Extract possible diagnoses from the text
-        import re
-        possible_diagnoses = []
-        
-        # Extract diagnoses from the structured format
-        if "DIAGNOSIS:" in diagnosis_text:
-            # Get the text between "DIAGNOSIS:" and "REASONS:"
-            start_idx = diagnosis_text.find("DIAGNOSIS:") + len("DIAGNOSIS:")
-            end_idx = diagnosis_text.find("REASONS:")
-            if end_idx == -1:  # If REASONS is not found
-                end_idx = len(diagnosis_text)
-            
-            # Extract the diagnosis section
-            diagnosis_section = diagnosis_text[start_idx:end_idx].strip()
-            
-            # Parse numbered list (1. Diagnosis)
-            numbered_pattern = r'(\d+)\.?\s+(.+?)(?=\n\d+\.|\Z)'
-            matches = re.finditer(numbered_pattern, diagnosis_section, re.MULTILINE|re.DOTALL)
-            
-            for match in matches:
-                diagnosis_text = match.group(2).strip()
-                if diagnosis_text:
-                    possible_diagnoses.append(diagnosis_text)
+        # Possible diagnoses, as split out by the API
+        possible_diagnoses = list(diagnosis_result.get("diagnoses") or [])
                     
         # Add option for "Other" if any diagnoses were found
         if possible_diagnoses:
@@ -1868,8 +1327,13 @@ def display_main_interface():
                 if not final_diagnosis.strip():
                     final_diagnosis = diagnosis_text
                     
-                # Update the diagnosis
+                # Update the diagnosis, keeping the generated sections with the doctor's choice
                 st.session_state.diagnosis = final_diagnosis
+                st.session_state.diagnosis_result = dict(
+                    diagnosis_result,
+                    selected=[d for d in selected_diagnoses if d != "Other (write below)"],
+                    notes=additional_notes or None
+                )
                 
                 # Generate prescription and set it directly in the session state
                 raw_prescription = generate_prescription(final_diagnosis, patient_data)
@@ -1913,118 +1377,10 @@ def display_main_interface():
         
         st.subheader("Generated Prescription")
         
-        # Extract medication info from prescription text
-        import re
-        import pandas as pd
-        
-        # Initialize an empty list to store medications
-        medications = []
-        
-        # Check if prescription contains a markdown/ascii table
-        if "|" in prescription and "-|-" in prescription:
-            # This is a markdown table format - parse it directly
-            lines = prescription.strip().split('\n')
-            table_start = False
-            header_line = -1
-            
-            # Find the header line
-            for i, line in enumerate(lines):
-                if line.strip().startswith("|") and "-|-" in lines[i+1] if i+1 < len(lines) else False:
-                    header_line = i
-                    break
-            
-            if header_line >= 0:
-                # Get the header column names
-                header = [col.strip() for col in lines[header_line].strip().split("|")]
-                header = [col for col in header if col]  # Remove empty strings
-                
-                # Map header columns to medication fields
-                field_positions = {
-                    "medication": -1,
-                    "dosage": -1, 
-                    "frequency": -1,
-                    "duration": -1,
-                    "side_effects": -1,
-                    "interactions": -1,
-                    "pregnancy_safety": -1
-                }
-                
-                # Map positions based on header names
-                for i, col in enumerate(header):
-                    col_lower = col.lower()
-                    if ("medication" in col_lower and "name" in col_lower) or "medication name" in col_lower:
-                        field_positions["medication"] = i
-                    elif "medication" in col_lower and "interaction" in col_lower:
-                        field_positions["interactions"] = i
-                    elif "dosage" in col_lower or "dose" in col_lower:
-                        field_positions["dosage"] = i
-                    elif "frequency" in col_lower:
-                        field_positions["frequency"] = i
-                    elif "duration" in col_lower:
-                        field_positions["duration"] = i
-                    elif "side" in col_lower and "effect" in col_lower:
-                        field_positions["side_effects"] = i
-                    elif "interaction" in col_lower:
-                        field_positions["interactions"] = i
-                    elif "pregnancy" in col_lower:
-                        field_positions["pregnancy_safety"] = i
-                
-                # Process data rows
-                for i in range(header_line + 2, len(lines)):  # Skip header and separator
-                    line = lines[i].strip()
-                    if not line or not line.startswith("|"):
-                        continue
-                        
-                    columns = [col.strip() for col in line.split("|")]
-                    columns = [col for col in columns if col]  # Remove empty strings
-                    
-                    if len(columns) < len(header):
-                        continue  # Skip incomplete rows
-                        
-                    med = {
-                        "medication": "",
-                        "dosage": "",
-                        "frequency": "",
-                        "duration": "",
-                        "side_effects": "",
-                        "interactions": "",
-                        "pregnancy_safety": ""
-                    }
-                    
-                    # Fill in the medication fields based on mapped positions
-                    for field, pos in field_positions.items():
-                        if pos >= 0 and pos < len(columns):
-                            med[field] = columns[pos]
-                    
-                    if med["medication"].strip():  # Only add non-empty medications
-                        medications.append(med)
-        else:
-            # Try parsing it as bullet points or other format
-            lines = re.split(r'\n+', prescription)
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                
-                # Check if this is a medication line (usually starts with bullet, number, etc.)
-                if line.startswith("• ") or re.match(r'^\d+\.', line) or ":" not in line[:15]:
-                    medications.append(parse_medication_details(line))
-        
-        # If no medications were extracted, add an empty row
-        if not medications:
-            medications.append({
-                "medication": "",
-                "dosage": "",
-                "frequency": "",
-                "duration": "",
-                "side_effects": "",
-                "interactions": "",
-                "pregnancy_safety": ""
-            })
-        
-        # Create session state for medications if it doesn't exist
+        # Structured prescriptions arrive with their medications already set;
+        # text ones are parsed once here rather than on every rerun
         if "medications" not in st.session_state:
-            st.session_state.medications = medications
+            st.session_state.medications = parse_medications(prescription) or [empty_medication()]
         
         # Display the editable prescription table
         st.write("### Edit Prescription")
@@ -2115,15 +1471,7 @@ def display_main_interface():
         
         # Button to add a new medication row
         if st.button("+ Add Medication"):
-            st.session_state.medications.append({
-                "medication": "",
-                "dosage": "",
-                "frequency": "",
-                "duration": "",
-                "side_effects": "",
-                "interactions": "",
-                "pregnancy_safety": ""
-            })
+            st.session_state.medications.append(empty_medication())
             st.experimental_rerun()
         
         # Additional instructions text area
@@ -2332,29 +1680,9 @@ def display_main_interface():
         st.subheader("Prescription")
         
         # Parse prescription into table format
-        medications = []
-        additional_instructions = ""
-        
-        if "PRESCRIPTION:" in prescription and "• " in prescription:
-            lines = prescription.split("\n")
-            reading_meds = False
-            reading_instructions = False
-            
-            for line in lines:
-                if "PRESCRIPTION:" in line:
-                    reading_meds = True
-                    continue
-                    
-                if "ADDITIONAL INSTRUCTIONS:" in line:
-                    reading_meds = False
-                    reading_instructions = True
-                    continue
-                    
-                if reading_meds and line.strip() and line.strip().startswith("• "):
-                    medications.append(parse_medication_details(line))
-                    
-                if reading_instructions and line.strip():
-                    additional_instructions += line + "\n"
+        medications, additional_instructions = parse_prescription_sections(prescription)
+        medications = medications or []
+        additional_instructions = additional_instructions or ""
         
         # Display medications in a table
         if medications:
@@ -0,0 +1,157 @@
+"""
+Render N prescriptions at once the way app.py does and check that every render
+produced its own, correct document: each concurrent result must match a
+sequential render of the same input, and all N documents must differ.
+
+Formats: "reportlab" is the PDF the app builds when wkhtmltopdf is missing or
+fails, "html" is the HTML prescription, and "wkhtmltopdf" is that HTML turned
+into a PDF by RenderService (skipped if wkhtmltopdf is not installed). Every
+document goes to its own file from new_temp_path, as render_path does.
+
+    python bench_concurrent_render.py --renders 32 --workers 8 --mode process
+"""
+import argparse
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from reportlab import rl_config
+
+from prescription_renderer import new_temp_path, prescription_model, render_prescription_html, render_prescription_reportlab
+from render_service import RenderService
+
+# Leave the creation date and random document ID out of ReportLab's output
+rl_config.invariant = 1
+
+# wkhtmltopdf stamps the creation time into the document; ignore it when comparing
+_CREATION_DATE = re.compile(rb"/CreationDate \(D:[^)]*\)")
+
+def sample_model(i):
+    """The model the app would build for the i-th patient"""
+    patient = {"name": f"Patient {i:04d}", "age": 20 + i % 60, "gender": "Male" if i % 2 else "Female",
+               "language": "English"}
+    diagnosis = f"• Condition number {i}"
+    prescription = "\n".join(
+        f"• Medicine {i}-{n} - {100 * (n + 1)}mg - Twice a day - {n + 3} days" for n in range(4)
+    )
+    medications = [
+        {"medication": f"Medicine {i}-{n}", "dosage": f"{100 * (n + 1)}mg", "frequency": "Twice a day",
+         "duration": f"{n + 3} days", "side_effects": "", "interactions": "", "pregnancy_safety": ""}
+        for n in range(4)
+    ]
+    return prescription_model(patient, diagnosis, prescription, medications=medications,
+                              tests=[f"Test {i}"], date="2025-04-11")
+
+def render_reportlab(i):
+    path = new_temp_path(".pdf")
+    render_prescription_reportlab(sample_model(i), path)
+    return path
+
+def render_html(i):
+    path = new_temp_path(".html")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_prescription_html(sample_model(i)))
+    return path
+
+RENDERERS = {"reportlab": render_reportlab, "html": render_html}
+
+def render_to_file(fmt, i, keep=True):
+    """One render to a file of its own; returns (i, path, document bytes)"""
+    path = RENDERERS[fmt](i)
+    with open(path, "rb") as f:
+        document = f.read()
+    if not keep:
+        os.remove(path)
+    return i, path, document
+
+def render_wkhtmltopdf(service, html_path):
+    """The HTML file as a PDF from the render service, written to a file of its own"""
+    with open(html_path, encoding="utf-8") as f:
+        pdf = service.render(f.read())
+    path = new_temp_path(".pdf")
+    with open(path, "wb") as f:
+        f.write(pdf)
+    return path, pdf
+
+def fingerprint(document):
+    return hashlib.sha256(_CREATION_DATE.sub(b"", document)).hexdigest()
+
+def check(fmt, label, expected, results, renders):
+    """Assert every render got its own file and the right, distinct document; results are (i, path, document)"""
+    paths = {path for _, path, _ in results}
+    mismatched = [i for i, _, document in results if fingerprint(document) != expected[i]]
+    distinct = {fingerprint(document) for _, _, document in results}
+    for path in paths:
+        os.remove(path)
+    assert len(paths) == renders, f"{fmt}: renders shared a temp file"
+    assert not mismatched, f"{fmt}: concurrent renders differ from sequential ones: {mismatched}"
+    assert len(distinct) == renders, f"{fmt}: some renders produced the same document"
+    print(f"  OK ({label}): {renders} distinct, correct documents in {len(paths)} separate files")
+
+def bench_format(fmt, args):
+    start = time.perf_counter()
+    expected = {i: fingerprint(render_to_file(fmt, i, keep=False)[2]) for i in range(args.renders)}
+    sequential = time.perf_counter() - start
+
+    executor_class = ProcessPoolExecutor if args.mode == "process" else ThreadPoolExecutor
+    start = time.perf_counter()
+    with executor_class(max_workers=args.workers) as executor:
+        results = list(executor.map(render_to_file, [fmt] * args.renders, range(args.renders)))
+    concurrent = time.perf_counter() - start
+
+    print(f"{fmt}: sequential {args.renders / sequential:.1f}/s, "
+          f"concurrent ({args.mode} x{args.workers}) {args.renders / concurrent:.1f}/s")
+    check(fmt, f"{args.mode} x{args.workers}", expected, results, args.renders)
+
+def bench_wkhtmltopdf(args):
+    service = RenderService(workers=args.workers)
+    if not service.available:
+        print("wkhtmltopdf: not installed, skipped")
+        return
+    html_paths = [render_to_file("html", i)[1] for i in range(args.renders)]
+    try:
+        sequential_service = RenderService(workers=1, binary=service.binary)
+        start = time.perf_counter()
+        expected = {}
+        for i, html_path in enumerate(html_paths):
+            path, pdf = render_wkhtmltopdf(sequential_service, html_path)
+            expected[i] = fingerprint(pdf)
+            os.remove(path)
+        sequential = time.perf_counter() - start
+        sequential_service.shutdown()
+
+        # Every session submits at once; the service's workers take them in turn
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.renders) as sessions:
+            rendered = list(sessions.map(lambda html_path: render_wkhtmltopdf(service, html_path), html_paths))
+        concurrent = time.perf_counter() - start
+        service.shutdown()
+    finally:
+        for path in html_paths:
+            os.remove(path)
+
+    print(f"wkhtmltopdf: sequential {args.renders / sequential:.1f}/s, "
+          f"RenderService x{args.workers} {args.renders / concurrent:.1f}/s")
+    results = [(i, path, pdf) for i, (path, pdf) in enumerate(rendered)]
+    check("wkhtmltopdf", f"RenderService x{args.workers}", expected, results, args.renders)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--renders", type=int, default=32, help="Number of prescriptions to render")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent renders")
+    parser.add_argument("--mode", choices=["thread", "process"], default="process",
+                        help="Threads share one interpreter; processes render in parallel")
+    parser.add_argument("--format", choices=[*RENDERERS, "wkhtmltopdf"], action="append",
+                        help="Formats to render (default: all)")
+    args = parser.parse_args()
+
+    for fmt in args.format or [*RENDERERS, "wkhtmltopdf"]:
+        if fmt == "wkhtmltopdf":
+            bench_wkhtmltopdf(args)
+        else:
+            bench_format(fmt, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Benchmark the /patient-history and referral lookups against a synthetic database,
+before and after the index migration, and check with EXPLAIN QUERY PLAN that the
+lookups are index seeks rather than table scans.
+
+    python bench_history_query.py --rows 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from consultation_details import CHILD_TABLES, DIAGNOSIS_TABLE, HISTORY_QUERY, load_consultation_details
+from db_migrations import create_indexes
+
+REFERRALS_QUERY = """
+    SELECT id, specialist_id, reason, referral_date, status
+    FROM referrals
+    WHERE patient_id = ?
+    ORDER BY referral_date
+"""
+
+SCHEMA = [
+    """
+    CREATE TABLE consultations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        doctor_id INTEGER,
+        patient_id TEXT,
+        symptoms TEXT,
+        vital_signs TEXT,
+        diagnosis TEXT,
+        prescription TEXT,
+        consultation_date TEXT, prescription_pdf TEXT, tests TEXT, referrals TEXT
+    )
+    """,
+    """
+    CREATE TABLE referrals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        doctor_id INTEGER,
+        patient_id TEXT,
+        specialist_id INTEGER,
+        reason TEXT,
+        referral_date TEXT,
+        status TEXT DEFAULT 'Pending'
+    )
+    """,
+    *CHILD_TABLES.values(),
+    DIAGNOSIS_TABLE
+]
+
+def populate(conn, rows, patients, batch_size=50000):
+    rng = random.Random(42)
+    start_date = datetime(2020, 1, 1)
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+    def consultation_rows():
+        for i in range(rows):
+            yield (
+                1,
+                f"P{rng.randrange(patients):06d}",
+                '["Fever", "Cough"]',
+                '{"temperature": "38.2"}',
+                "Viral upper respiratory infection",
+                "Paracetamol 500mg twice daily for 3 days",
+                (start_date + timedelta(minutes=rng.randrange(3_000_000))).isoformat()
+            )
+
+    def detail_rows():
+        # Consultation ids are assigned 1..rows in insertion order
+        for consultation_id in range(1, rows + 1):
+            yield ("consultation_symptoms", (consultation_id, 0, "Fever", None, None))
+            yield ("consultation_symptoms", (consultation_id, 1, "Cough", None, None))
+            yield ("consultation_diagnoses", (consultation_id, 0, "Viral upper respiratory infection", None, None))
+            yield ("consultation_vitals", (consultation_id, "temperature", "38.2"))
+
+    def referral_rows():
+        for i in range(rows // 10):
+            yield (
+                1,
+                f"P{rng.randrange(patients):06d}",
+                rng.randrange(1, 20),
+                "Specialist opinion",
+                (start_date + timedelta(minutes=rng.randrange(3_000_000))).isoformat()
+            )
+
+    for insert, source in (
+        ("INSERT INTO consultations (doctor_id, patient_id, symptoms, vital_signs, diagnosis, prescription, consultation_date) "
+         "VALUES (?, ?, ?, ?, ?, ?, ?)", consultation_rows()),
+        ("INSERT INTO referrals (doctor_id, patient_id, specialist_id, reason, referral_date) "
+         "VALUES (?, ?, ?, ?, ?)", referral_rows())
+    ):
+        batch = []
+        for row in source:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                conn.executemany(insert, batch)
+                batch.clear()
+        if batch:
+            conn.executemany(insert, batch)
+
+    batches = {}
+    for table, row in detail_rows():
+        batch = batches.setdefault(table, [])
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' for _ in row)})", batch)
+            batch.clear()
+    for table, batch in batches.items():
+        if batch:
+            conn.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' for _ in batch[0])})", batch)
+    conn.commit()
+
+def history_lookup(conn, patient_id, limit):
+    """What /patient-history runs: the recent consultations, then their detail rows"""
+    rows = conn.execute(HISTORY_QUERY, (patient_id, limit)).fetchall()
+    return load_consultation_details(conn, [row[0] for row in rows])
+
+def query_plan(conn, query, params):
+    return [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()]
+
+def time_queries(conn, query, params_list):
+    start = time.perf_counter()
+    for params in params_list:
+        conn.execute(query, params).fetchall()
+    return (time.perf_counter() - start) / len(params_list)
+
+def time_history_lookups(conn, params_list):
+    start = time.perf_counter()
+    for params in params_list:
+        history_lookup(conn, *params)
+    return (time.perf_counter() - start) / len(params_list)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of consultations to generate")
+    parser.add_argument("--patients", type=int, default=20_000, help="Number of distinct patients")
+    parser.add_argument("--lookups", type=int, default=200, help="History lookups to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        conn = sqlite3.connect(os.path.join(tmp_dir, "bench.db"))
+        start = time.perf_counter()
+        populate(conn, args.rows, args.patients)
+        print(f"Generated {args.rows} consultations in {time.perf_counter() - start:.1f}s")
+
+        rng = random.Random(7)
+        patient_ids = [f"P{rng.randrange(args.patients):06d}" for _ in range(args.lookups)]
+        history_params = [(patient_id, 3) for patient_id in patient_ids]
+        referral_params = [(patient_id,) for patient_id in patient_ids]
+
+        # Without indexes every lookup scans the whole table, so time only a few
+        scan_lookups = max(1, args.lookups // 20)
+        history_before = time_history_lookups(conn, history_params[:scan_lookups])
+        referrals_before = time_queries(conn, REFERRALS_QUERY, referral_params[:scan_lookups])
+
+        start = time.perf_counter()
+        create_indexes(conn)
+        conn.commit()
+        print(f"Created indexes in {time.perf_counter() - start:.1f}s")
+
+        history_after = time_history_lookups(conn, history_params)
+        referrals_after = time_queries(conn, REFERRALS_QUERY, referral_params)
+
+        history_plan = query_plan(conn, HISTORY_QUERY, history_params[0])
+        referrals_plan = query_plan(conn, REFERRALS_QUERY, referral_params[0])
+        conn.close()
+
+    print(f"History lookup:  {history_before * 1000:9.3f} ms -> {history_after * 1000:7.3f} ms")
+    print(f"Referral lookup: {referrals_before * 1000:9.3f} ms -> {referrals_after * 1000:7.3f} ms")
+    print("History plan:  ", "; ".join(history_plan))
+    print("Referrals plan:", "; ".join(referrals_plan))
+
+    # A seek on the index with no separate sort step is O(log n) in the table size
+    for plan, index in ((history_plan, "idx_consultations_patient_date"), (referrals_plan, "idx_referrals_patient_date")):
+        assert any(f"USING INDEX {index}" in step for step in plan), f"{index} not used: {plan}"
+        assert not any("TEMP B-TREE" in step for step in plan), f"Query still sorts its results: {plan}"
+    print("OK: history and referral lookups are index seeks")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+Speed and field-level accuracy of medication_parser.parse_medication_details
+against the parser it replaced, on data/medication_corpus.json (the saved
+prescriptions of docassist.db plus the formats the app writes). The expected
+fields are built by build_medication_corpus.py without either parser. The old parser
+printed a debug line per call; its output goes to os.devnull here, so the
+printing is still part of its time. Exits non-zero if the current parser gets
+any field wrong that the old one got right.
+
+    python bench_medication_parser.py --repeat 200 --mismatches
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+
+from medication_parser import MEDICATION_FIELDS, parse_medication_details
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "medication_corpus.json")
+
+def legacy_parse_medication_details(med_line):
+    """medication_parser.parse_medication_details as it was, debug prints included"""
+    # Initialize medication parts
+    med = {
+        "medication": "",
+        "dosage": "",
+        "frequency": "",
+        "duration": "",
+        "side_effects": "",
+        "interactions": "",
+        "pregnancy_safety": ""
+    }
+    
+    # Check if this is a markdown table row (starts with |)
+    if med_line.startswith("|"):
+        # This is a markdown table row, parse it accordingly
+        columns = [col.strip() for col in med_line.split("|")]
+        # Remove empty entries (from the beginning and end of the split)
+        columns = [col for col in columns if col]
+        
+        # Map columns to medication fields based on position
+        # Standard column order: Name, Dosage, Frequency, Duration, Side Effects, Interactions, Pregnancy
+        if len(columns) >= 1:
+            med["medication"] = columns[0]
+        if len(columns) >= 2:
+            med["dosage"] = columns[1]
+        if len(columns) >= 3:
+            med["frequency"] = columns[2]
+        if len(columns) >= 4:
+            med["duration"] = columns[3]
+        if len(columns) >= 5:
+            med["side_effects"] = columns[4]
+        if len(columns) >= 6:
+            med["interactions"] = columns[5]
+        if len(columns) >= 7:
+            med["pregnancy_safety"] = columns[6]
+        
+        print(f"Parsed table row: {med}")
+        return med
+    
+    # If not a table row, proceed with the original parsing logic
+    # Remove bullet point if present
+    if med_line.startswith("• "):
+        med_line = med_line[2:].strip()
+    
+    # First, try to find labeled sections for specialized fields (more reliable)
+    labeled_fields = {
+        "Side Effects:": "side_effects",
+        "Side effects:": "side_effects",
+        "Medication Interactions:": "interactions", 
+        "Drug Interactions:": "interactions",
+        "Interactions:": "interactions",
+        "Pregnancy Safety:": "pregnancy_safety",
+        "Pregnancy safety:": "pregnancy_safety",
+        "Pregnancy Category:": "pregnancy_safety",
+        "Pregnancy:": "pregnancy_safety"
+    }
+    
+    # Handle each specialized field separately
+    remaining_line = med_line
+    for label, field in labeled_fields.items():
+        if label in remaining_line:
+            parts = remaining_line.split(label, 1)
+            before_text = parts[0].strip()
+            after_text = parts[1].strip()
+            
+            # Find the next label if any
+            next_label_pos = len(after_text)
+            next_label = None
+            for next_label_candidate in labeled_fields.keys():
+                if next_label_candidate in after_text:
+                    pos = after_text.find(next_label_candidate)
+                    if 0 <= pos < next_label_pos:
+                        next_label_pos = pos
+                        next_label = next_label_candidate
+            
+            if next_label:
+                # Extract content up to the next label
+                med[field] = after_text[:next_label_pos].strip()
+                # Keep the rest (including the next label) for further processing
+                remaining_line = before_text + " " + after_text[next_label_pos:]
+            else:
+                # This is the last labeled section
+                med[field] = after_text.strip()
+                remaining_line = before_text
+    
+    # Now parse the remaining line for the basic medication information
+    # Simple case: "Medication - Dosage - Frequency - Duration" format
+    parts = [p.strip() for p in remaining_line.split(" - ")]
+    
+    if len(parts) >= 1:
+        med["medication"] = parts[0].strip()
+    if len(parts) >= 2:
+        med["dosage"] = parts[1].strip()
+    if len(parts) >= 3:
+        med["frequency"] = parts[2].strip()
+    if len(parts) >= 4:
+        med["duration"] = parts[3].strip()
+    
+    # Check for side effects in parentheses if not already found
+    if not med["side_effects"]:
+        sidx = remaining_line.find("(")
+        if sidx > 0:
+            eidx = remaining_line.find(")", sidx)
+            if eidx > sidx:
+                possible_side_effects = remaining_line[sidx+1:eidx].strip()
+                # Only use if it looks like side effects
+                if len(possible_side_effects) > 5 and "side" in possible_side_effects.lower():
+                    med["side_effects"] = possible_side_effects
+    
+    # Final clean up - remove parentheses and extra formatting
+    for field in med:
+        if med[field]:
+            # Remove unnecessary parentheses and extra spaces
+            med[field] = med[field].replace("(", "").replace(")", "").strip()
+            # If the field accidentally starts with a field label, remove it
+            for label in labeled_fields:
+                if med[field].startswith(label):
+                    med[field] = med[field][len(label):].strip()
+    
+    print(f"Parsed text line: {med_line} -> {med}")
+    return med
+
+PARSERS = {
+    "legacy": legacy_parse_medication_details,
+    "current": parse_medication_details
+}
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["cases"]
+
+def time_parser(parse, lines, repeat):
+    """Best time over `repeat` runs through the lines, in seconds per line"""
+    best = float("inf")
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for line in lines:
+                parse(line)
+            best = min(best, time.perf_counter() - start)
+    return best / len(lines)
+
+def score_parser(parse, cases):
+    """(fields right per field, rows right per source, {case index: wrong fields})"""
+    fields, rows, wrong = Counter(), Counter(), {}
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = [parse(case["line"]) for case in cases]
+    for i, (case, med) in enumerate(zip(cases, results)):
+        missed = [field for field in MEDICATION_FIELDS if med.get(field, "") != case["expected"][field]]
+        fields.update(field for field in MEDICATION_FIELDS if field not in missed)
+        if missed:
+            wrong[i] = (missed, med)
+        else:
+            rows[case["source"]] += 1
+    return fields, rows, wrong
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--repeat", type=int, default=100, help="Timed runs through the corpus per parser")
+    parser.add_argument("--mismatches", action="store_true", help="Show the lines the current parser gets wrong")
+    args = parser.parse_args()
+
+    cases = load_corpus(args.corpus)
+    lines = [case["line"] for case in cases]
+    sources = Counter(case["source"] for case in cases)
+    print(f"{len(cases)} lines ({', '.join(f'{n} {source}' for source, n in sources.items())}), "
+          f"best of {args.repeat} runs")
+
+    scores = {}
+    for name, parse in PARSERS.items():
+        seconds = time_parser(parse, lines, args.repeat)
+        scores[name] = score_parser(parse, cases)
+        fields, rows, _ = scores[name]
+        print(f"  {name:<8} {seconds * 1e6:7.2f} us/line   "
+              f"rows right {sum(rows.values())}/{len(cases)} "
+              f"({', '.join(f'{source} {rows[source]}/{n}' for source, n in sources.items())})")
+
+    print("\n  field accuracy      " + "".join(f"{name:>10}" for name in PARSERS))
+    for field in MEDICATION_FIELDS:
+        print(f"  {field:<20}" + "".join(f"{scores[name][0][field] / len(cases):10.1%}" for name in PARSERS))
+
+    legacy_wrong, current_wrong = scores["legacy"][2], scores["current"][2]
+    regressions = [
+        (i, field) for i, (missed, _) in current_wrong.items()
+        for field in missed if field not in legacy_wrong.get(i, ([], None))[0]
+    ]
+    if args.mismatches:
+        for i, (missed, med) in sorted(current_wrong.items()):
+            print(f"\n  {lines[i]}")
+            for field in missed:
+                print(f"    {field}: got {med[field]!r}, expected {cases[i]['expected'][field]!r}")
+    if regressions:
+        print(f"\n{len(regressions)} fields the legacy parser got right are now wrong:")
+        for i, field in regressions:
+            print(f"  {field}: {lines[i]}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
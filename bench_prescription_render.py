@@ -0,0 +1,125 @@
+"""
+Per-document render time with and without the cached rendering contexts in
+prescription_renderer. "uncached" does what every render used to do: register
+the translation font and rebuild the stylesheet. Both ReportLab variants build
+the app's document (prescription_story) from the same model.
+The template variants time the HTML and text templates alone, from a model
+built once. Each variant runs in a fresh process, so the first render is a true
+cold start (with the on-disk font and template caches left by earlier runs).
+
+    python bench_prescription_render.py --renders 50 --language Urdu
+"""
+import argparse
+import functools
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+from label_bundles import PRESCRIPTION_LABELS
+from prescription_renderer import (
+    DEJAVU_FONT_PATH, format_medication_summary, get_prescription_styles, prescription_model,
+    render_prescription_html, render_prescription_reportlab, render_prescription_text, translation_font_path
+)
+
+PATIENT = {"name": "Patient 0001", "age": 42, "gender": "Female", "date": "2025-04-11"}
+DIAGNOSIS = "• Acute pharyngitis\n• Mild dehydration"
+PRESCRIPTION = "\n".join(
+    f"• Medicine {n} - {100 * (n + 1)}mg - Twice a day - {n + 3} days" for n in range(4)
+)
+TESTS = ["Complete Blood Count", "Throat Swab Culture"]
+INSTRUCTIONS = "Drink plenty of fluids\nRest for three days\n"
+
+@functools.lru_cache(maxsize=None)
+def sample_model(language):
+    """A model like the app builds, with a stand-in translation for every string"""
+    medications = [
+        {"medication": f"Medicine {n}", "dosage": f"{100 * (n + 1)}mg", "frequency": "Twice a day",
+         "duration": f"{n + 3} days", "side_effects": "Nausea", "interactions": "None", "pregnancy_safety": "Safe"}
+        for n in range(4)
+    ]
+    texts = [DIAGNOSIS, INSTRUCTIONS, PATIENT["gender"], *TESTS, *PRESCRIPTION_LABELS,
+             *(format_medication_summary(med) for med in medications)]
+    return prescription_model(
+        dict(PATIENT, language=language), DIAGNOSIS, PRESCRIPTION,
+        medications=medications,
+        additional_instructions=INSTRUCTIONS,
+        tests=TESTS,
+        translations={text: f"[{language}] {text}" for text in texts}
+    )
+
+def uncached_styles(language):
+    """The stylesheet as every render used to build it, font registration included"""
+    font_path = translation_font_path.__wrapped__(language)
+    translation_font = f"TranslationFont-{os.path.basename(font_path)}"
+    pdfmetrics.registerFont(TTFont(translation_font, font_path))
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='Center', parent=styles['Heading2'], alignment=TA_CENTER))
+    styles.add(ParagraphStyle(
+        name='Translation',
+        parent=getSampleStyleSheet()['Normal'],
+        fontName=translation_font,
+        textColor=(0.4, 0.4, 0.4),
+        fontSize=10
+    ))
+    return styles
+
+def reportlab_pdf(language, styles):
+    """The app's bilingual prescription PDF, built with the given stylesheet"""
+    buffer = io.BytesIO()
+    render_prescription_reportlab(sample_model(language), buffer, styles)
+    return buffer.getvalue()
+
+VARIANTS = {
+    "reportlab-uncached": lambda language: reportlab_pdf(language, uncached_styles(language)),
+    "reportlab-cached": lambda language: reportlab_pdf(language, get_prescription_styles(language)),
+    "html-template": lambda language: render_prescription_html(sample_model(language)),
+    "text-template": lambda language: render_prescription_text(sample_model(language))
+}
+
+def run_variant(name, renders, language):
+    """Time renders of one variant in this process; returns the timings in seconds"""
+    render = VARIANTS[name]
+    # The model is an input to every variant, not part of its cost
+    sample_model(language)
+    timings = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        document = render(language)
+        timings.append(time.perf_counter() - start)
+        assert document, f"{name} did not produce a document"
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--renders", type=int, default=50, help="Renders per variant")
+    parser.add_argument("--language", default="Urdu", help="Patient language for the translation font")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.renders, args.language)))
+        return
+
+    print(f"{args.renders} renders per variant, language {args.language}, "
+          f"font {os.path.basename(translation_font_path(args.language) or DEJAVU_FONT_PATH)}")
+    for name in VARIANTS:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--variant", name,
+             "--renders", str(args.renders), "--language", args.language],
+            capture_output=True, text=True, check=True
+        ).stdout
+        timings = json.loads(output.strip().splitlines()[-1])
+        warm = sorted(timings[1:]) or timings
+        print(f"  {name:<20} cold {timings[0] * 1000:8.1f} ms   "
+              f"warm median {warm[len(warm) // 2] * 1000:7.1f} ms   mean {sum(warm) / len(warm) * 1000:7.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import json
+import os
+import sqlite3
+
+from label_bundles import LABEL_BUNDLE_DIR, LABEL_BUNDLE_VERSION, PRESCRIPTION_LABELS, bundle_path, read_bundle
+
+# Languages to build besides the ones patients already use
+EXTRA_LANGUAGES = ["Arabic"]
+
+def get_patient_languages(db_path="docassist.db"):
+    """Return the distinct languages in patients.language"""
+    if not os.path.exists(db_path):
+        return []
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT DISTINCT language FROM patients WHERE language IS NOT NULL").fetchall()
+        return [row[0] for row in rows if row[0].strip()]
+    finally:
+        conn.close()
+
+def build_bundle(language, translator, refresh=False):
+    """
+    Write the label bundle for one language. Labels already in the existing
+    bundle are kept (they may have been corrected by hand) unless refresh is set.
+    """
+    path = bundle_path(language)
+    existing = {} if refresh else (read_bundle(path) if os.path.exists(path) else None) or {}
+    
+    labels = {}
+    for label in PRESCRIPTION_LABELS:
+        if label in existing:
+            labels[label] = existing[label]
+        else:
+            labels[label] = translator.translate(label, dest=language.lower()).text
+            print(f"  {label} -> {labels[label]}")
+    
+    os.makedirs(LABEL_BUNDLE_DIR, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"version": LABEL_BUNDLE_VERSION, "language": language.lower(), "labels": labels},
+            f,
+            ensure_ascii=False,
+            indent=2
+        )
+        f.write("\n")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the static prescription label bundles")
+    parser.add_argument("languages", nargs="*", help="Languages to build (default: all patient languages)")
+    parser.add_argument("--refresh", action="store_true", help="Re-translate labels already in the bundles")
+    parser.add_argument("--db", default="docassist.db", help="Database to read patient languages from")
+    args = parser.parse_args()
+    
+    languages = args.languages or get_patient_languages(args.db) + EXTRA_LANGUAGES
+    languages = [language for language in dict.fromkeys(languages) if language.lower() != "english"]
+    
+    from googletrans import Translator
+    translator = Translator()
+    
+    for language in languages:
+        print(f"Building {language} labels...")
+        path = build_bundle(language, translator, refresh=args.refresh)
+        print(f"Wrote {path}")
+    
+    print(f"Label bundles (version {LABEL_BUNDLE_VERSION}) complete.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Build data/medication_corpus.json, the labelled lines bench_medication_parser.py
+scores the parsers against.
+
+The expected fields never come from medication_parser. Saved prescription lines
+are split by REFERENCE_LINE, a strict full-line pattern for the one format the
+bundled prescriptions use; a line that does not match it exactly is left out
+rather than guessed at. Every line it takes has exactly four " - "-separated
+fields before "(Side effects: ...)" (checked below), so the split is
+unambiguous. The finalized lines are written from those fields the way app.py
+writes a finalized prescription. The handwritten cases were labelled by hand.
+
+    python build_medication_corpus.py --db docassist.db
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+
+from bench_medication_parser import CORPUS_PATH
+from medication_parser import MEDICATION_FIELDS
+
+# "• [n. ]Name - Dosage - Frequency - Duration (Side effects: ...)", the whole line
+REFERENCE_LINE = re.compile(r"^• (?:\d+\. )?(.+?) - (.+?) - (.+?) - (.+?) \(Side effects: ([^()]*)\)$")
+
+DESCRIPTION = (
+    "Medication lines with the fields expected from each, built by build_medication_corpus.py. "
+    "'consultation' lines are the saved prescriptions of the bundled docassist.db, one per distinct line, "
+    "split by a strict full-line pattern rather than by either parser; 'finalized' lines are the same rows "
+    "in the format the app writes when a prescription is finalized; 'handwritten' lines cover the labels, "
+    "table rows and notes the saved prescriptions do not use, and were labelled by hand."
+)
+
+def expected(*values):
+    return dict(zip(MEDICATION_FIELDS, values))
+
+HANDWRITTEN = [
+    ("• Amoxicillin - 500mg - Three times daily - 7 days Side effects: Diarrhea, rash Interactions: Warfarin, methotrexate Pregnancy Safety: Category B",
+     expected("Amoxicillin", "500mg", "Three times daily", "7 days", "Diarrhea, rash", "Warfarin, methotrexate", "Category B")),
+    ("• Ibuprofen - 400mg - Every 8 hours - 5 days Side effects: Stomach upset Medication Interactions: Aspirin, lisinopril Pregnancy Safety: Avoid in third trimester",
+     expected("Ibuprofen", "400mg", "Every 8 hours", "5 days", "Stomach upset", "Aspirin, lisinopril", "Avoid in third trimester")),
+    ("• Metformin - 500mg - Twice daily with meals - Long term Drug Interactions: Contrast dye Pregnancy Category: B",
+     expected("Metformin", "500mg", "Twice daily with meals", "Long term", "", "Contrast dye", "B")),
+    ("• Cetirizine - 10mg - Once daily - 2 weeks (Side effects: Drowsiness) (Interactions: Alcohol) (Pregnancy safety: Generally safe)",
+     expected("Cetirizine", "10mg", "Once daily", "2 weeks", "Drowsiness", "Alcohol", "Generally safe")),
+    ("• Omeprazole - 20mg - Once daily before breakfast - 4 weeks Pregnancy: Use if needed Side effects: Headache",
+     expected("Omeprazole", "20mg", "Once daily before breakfast", "4 weeks", "Headache", "", "Use if needed")),
+    ("• Salbutamol inhaler (Ventolin) - 2 puffs - As needed - 1 month (side effects may include tremor)",
+     expected("Salbutamol inhaler (Ventolin)", "2 puffs", "As needed", "1 month", "side effects may include tremor", "", "")),
+    ("| Azithromycin | 500mg | Once daily | 3 days | Nausea | Antacids | Category B |",
+     expected("Azithromycin", "500mg", "Once daily", "3 days", "Nausea", "Antacids", "Category B")),
+    ("| Paracetamol | 500mg | Every 6 hours | 3 days | Rare | | Safe |",
+     expected("Paracetamol", "500mg", "Every 6 hours", "3 days", "Rare", "", "Safe")),
+]
+
+def reference_fields(line):
+    """The fields of a saved prescription line by REFERENCE_LINE, or None if it is not in that format"""
+    match = REFERENCE_LINE.match(line)
+    if not match:
+        return None
+    # Another " - " before the side effects would make the split ambiguous
+    assert line.split(" (Side effects: ")[0].count(" - ") == 3, f"Ambiguous line: {line}"
+    return expected(*match.groups(), "", "")
+
+def finalized_line(med):
+    """A medication row as app.py writes it into a finalized prescription"""
+    line = f"• {med['medication']}"
+    for field in ("dosage", "frequency", "duration"):
+        if med[field]:
+            line += f" - {med[field]}"
+    if med["side_effects"]:
+        line += f" Side effects: {med['side_effects']}"
+    if med["interactions"]:
+        line += f" Interactions: {med['interactions']}"
+    if med["pregnancy_safety"]:
+        line += f" Pregnancy Safety: {med['pregnancy_safety']}"
+    return line
+
+def build_cases(db_path):
+    """(cases, lines left out) from the saved prescriptions and the handwritten cases"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        prescriptions = [row[0] or "" for row in conn.execute("SELECT prescription FROM consultations ORDER BY id")]
+    finally:
+        conn.close()
+
+    consultation, left_out, seen = [], [], set()
+    for prescription in prescriptions:
+        for line in prescription.splitlines():
+            if not line.strip() or line in seen:
+                continue
+            seen.add(line)
+            fields = reference_fields(line)
+            if fields is None:
+                left_out.append(line)
+            else:
+                consultation.append({"source": "consultation", "line": line, "expected": fields})
+
+    finalized = [
+        {"source": "finalized", "line": finalized_line(case["expected"]), "expected": dict(case["expected"])}
+        for case in consultation
+    ]
+    handwritten = [{"source": "handwritten", "line": line, "expected": fields} for line, fields in HANDWRITTEN]
+    return consultation + finalized + handwritten, left_out
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the labelled medication line corpus")
+    parser.add_argument("--db", default="docassist.db", help="Database to read saved prescriptions from")
+    parser.add_argument("--output", default=CORPUS_PATH)
+    args = parser.parse_args()
+
+    cases, left_out = build_cases(args.db)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"description": DESCRIPTION, "fields": MEDICATION_FIELDS, "cases": cases}, f, ensure_ascii=False, indent=2)
+
+    print(f"Wrote {len(cases)} cases to {args.output}")
+    if left_out:
+        print(f"{len(left_out)} distinct lines not in the reference format were left out:")
+        for line in left_out:
+            print(f"  {line}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Normalized storage for the per-consultation lists that used to live only in
+JSON text columns: symptoms, tests and vital signs each get a child table keyed
+by consultation id. The JSON columns are still written for older readers.
+Diagnoses, parsed from the diagnosis text, get a table of their own.
+
+patient_id and consultation_date are copied onto the symptom, test and diagnosis
+rows so "patients with <symptom> in the last N days" is answered from one index
+range.
+"""
+import json
+
+CHILD_TABLES = {
+    "consultation_symptoms": """
+        CREATE TABLE IF NOT EXISTS consultation_symptoms (
+            consultation_id INTEGER NOT NULL REFERENCES consultations (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            symptom TEXT NOT NULL COLLATE NOCASE,
+            patient_id TEXT,
+            consultation_date TEXT,
+            PRIMARY KEY (consultation_id, position)
+        )
+    """,
+    "consultation_tests": """
+        CREATE TABLE IF NOT EXISTS consultation_tests (
+            consultation_id INTEGER NOT NULL REFERENCES consultations (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            test TEXT NOT NULL COLLATE NOCASE,
+            patient_id TEXT,
+            consultation_date TEXT,
+            PRIMARY KEY (consultation_id, position)
+        )
+    """,
+    "consultation_vitals": """
+        CREATE TABLE IF NOT EXISTS consultation_vitals (
+            consultation_id INTEGER NOT NULL REFERENCES consultations (id) ON DELETE CASCADE,
+            name TEXT NOT NULL,
+            value TEXT,
+            PRIMARY KEY (consultation_id, name)
+        )
+    """
+}
+
+CHILD_INDEXES = [
+    ("idx_consultation_symptoms_symptom_date", "consultation_symptoms", "symptom, consultation_date, patient_id"),
+    ("idx_consultation_tests_test_date", "consultation_tests", "test, consultation_date, patient_id")
+]
+
+# Created by a later migration than CHILD_TABLES, so kept apart from them
+DIAGNOSIS_TABLE = """
+    CREATE TABLE IF NOT EXISTS consultation_diagnoses (
+        consultation_id INTEGER NOT NULL REFERENCES consultations (id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        diagnosis TEXT NOT NULL COLLATE NOCASE,
+        patient_id TEXT,
+        consultation_date TEXT,
+        PRIMARY KEY (consultation_id, position)
+    )
+"""
+
+DIAGNOSIS_INDEX = (
+    "idx_consultation_diagnoses_diagnosis_date", "consultation_diagnoses", "diagnosis, consultation_date, patient_id"
+)
+
+# A patient's most recent consultations, for /patient-history; their symptoms,
+# tests, diagnoses and vital signs come from load_consultation_details
+HISTORY_QUERY = """
+    SELECT id, diagnosis, prescription, consultation_date
+    FROM consultations
+    WHERE patient_id = ?
+    ORDER BY consultation_date DESC
+    LIMIT ?
+"""
+
+def load_json_column(value, default):
+    """Parse one of the legacy JSON text columns, tolerating empty or malformed values"""
+    if not value:
+        return default
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        return default
+    return parsed if isinstance(parsed, type(default)) else default
+
+def detail_rows(consultation_id, patient_id, consultation_date, symptoms, vital_signs, tests):
+    """Child table rows for one consultation: (symptom rows, test rows, vital rows)"""
+    symptom_rows = [
+        (consultation_id, position, symptom, patient_id, consultation_date)
+        for position, symptom in enumerate(symptoms or []) if symptom
+    ]
+    test_rows = [
+        (consultation_id, position, test, patient_id, consultation_date)
+        for position, test in enumerate(tests or []) if test
+    ]
+    vital_rows = [
+        (consultation_id, name, None if value is None else str(value))
+        for name, value in (vital_signs or {}).items()
+    ]
+    return symptom_rows, test_rows, vital_rows
+
+def insert_details(conn, rows):
+    """Write the output of detail_rows (or several of them concatenated) in three statements"""
+    symptom_rows, test_rows, vital_rows = rows
+    conn.executemany(
+        "INSERT OR REPLACE INTO consultation_symptoms (consultation_id, position, symptom, patient_id, consultation_date) "
+        "VALUES (?, ?, ?, ?, ?)",
+        symptom_rows
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO consultation_tests (consultation_id, position, test, patient_id, consultation_date) "
+        "VALUES (?, ?, ?, ?, ?)",
+        test_rows
+    )
+    conn.executemany(
+        "INSERT OR REPLACE INTO consultation_vitals (consultation_id, name, value) VALUES (?, ?, ?)",
+        vital_rows
+    )
+
+def diagnosis_rows(consultation_id, patient_id, consultation_date, diagnoses):
+    return [
+        (consultation_id, position, diagnosis, patient_id, consultation_date)
+        for position, diagnosis in enumerate(diagnoses or []) if diagnosis
+    ]
+
+def insert_diagnoses(conn, rows):
+    """Write the output of diagnosis_rows (or several of them concatenated)"""
+    conn.executemany(
+        "INSERT OR REPLACE INTO consultation_diagnoses (consultation_id, position, diagnosis, patient_id, consultation_date) "
+        "VALUES (?, ?, ?, ?, ?)",
+        rows
+    )
+
+def save_consultation_details(conn, consultation_id, patient_id, consultation_date, symptoms, vital_signs, tests):
+    """Store the symptoms, vital signs and tests of a new consultation in the caller's transaction"""
+    insert_details(conn, detail_rows(consultation_id, patient_id, consultation_date, symptoms, vital_signs, tests))
+
+def delete_consultation_details(conn):
+    for table in [*CHILD_TABLES, "consultation_diagnoses"]:
+        conn.execute(f"DELETE FROM {table}")
+
+def load_consultation_details(conn, consultation_ids):
+    """Return {consultation_id: {"symptoms": [...], "tests": [...], "diagnoses": [...], "vital_signs": {...}}}"""
+    details = {
+        consultation_id: {"symptoms": [], "tests": [], "diagnoses": [], "vital_signs": {}}
+        for consultation_id in consultation_ids
+    }
+    if not details:
+        return details
+    placeholders = ", ".join("?" for _ in details)
+    ids = list(details)
+
+    for consultation_id, symptom in conn.execute(
+        f"SELECT consultation_id, symptom FROM consultation_symptoms "
+        f"WHERE consultation_id IN ({placeholders}) ORDER BY consultation_id, position",
+        ids
+    ).fetchall():
+        details[consultation_id]["symptoms"].append(symptom)
+    for consultation_id, test in conn.execute(
+        f"SELECT consultation_id, test FROM consultation_tests "
+        f"WHERE consultation_id IN ({placeholders}) ORDER BY consultation_id, position",
+        ids
+    ).fetchall():
+        details[consultation_id]["tests"].append(test)
+    for consultation_id, diagnosis in conn.execute(
+        f"SELECT consultation_id, diagnosis FROM consultation_diagnoses "
+        f"WHERE consultation_id IN ({placeholders}) ORDER BY consultation_id, position",
+        ids
+    ).fetchall():
+        details[consultation_id]["diagnoses"].append(diagnosis)
+    for consultation_id, name, value in conn.execute(
+        f"SELECT consultation_id, name, value FROM consultation_vitals WHERE consultation_id IN ({placeholders})",
+        ids
+    ).fetchall():
+        details[consultation_id]["vital_signs"][name] = value
+    return details
+
+def patients_with(conn, kind, name, since):
+    """
+    Patients with a symptom, test or diagnosis (kind is "symptom", "test" or
+    "diagnosis") in consultations dated on or after since, most recently seen first.
+    """
+    table = {"symptom": "consultation_symptoms", "test": "consultation_tests", "diagnosis": "consultation_diagnoses"}[kind]
+    rows = conn.execute(
+        f"""
+        SELECT d.patient_id, p.name, COUNT(DISTINCT d.consultation_id) AS consultations,
+               MAX(d.consultation_date) AS last_seen
+        FROM {table} d
+        LEFT JOIN patients p ON p.id = d.patient_id
+        WHERE d.{kind} = ? AND d.consultation_date >= ?
+        GROUP BY d.patient_id
+        ORDER BY last_seen DESC
+        """,
+        (name, since)
+    ).fetchall()
+    return [
+        {"patient_id": row[0], "name": row[1], "consultations": row[2], "last_seen": row[3]}
+        for row in rows
+    ]
+
+def symptom_counts(conn, since, limit=20):
+    """Most frequent symptoms in consultations dated on or after since"""
+    rows = conn.execute(
+        """
+        SELECT symptom, COUNT(*) AS consultations, COUNT(DISTINCT patient_id) AS patients
+        FROM consultation_symptoms
+        WHERE consultation_date >= ?
+        GROUP BY symptom COLLATE NOCASE
+        ORDER BY consultations DESC
+        LIMIT ?
+        """,
+        (since, limit)
+    ).fetchall()
+    return [{"symptom": row[0], "consultations": row[1], "patients": row[2]} for row in rows]
+
+def diagnosis_counts(conn, since, limit=20):
+    """Most frequent diagnoses in consultations dated on or after since"""
+    rows = conn.execute(
+        """
+        SELECT diagnosis, COUNT(*) AS consultations, COUNT(DISTINCT patient_id) AS patients
+        FROM consultation_diagnoses
+        WHERE consultation_date >= ?
+        GROUP BY diagnosis COLLATE NOCASE
+        ORDER BY consultations DESC
+        LIMIT ?
+        """,
+        (since, limit)
+    ).fetchall()
+    return [{"diagnosis": row[0], "consultations": row[1], "patients": row[2]} for row in rows]
+
+def triage_consultations(conn, since, min_systolic=None, min_diastolic=None, min_temp_c=None, limit=100):
+    """
+    Consultations dated on or after since whose numeric vital signs reach every
+    given threshold, highest readings first. Each threshold is a range on its
+    (vital, consultation_date) index.
+    """
+    conditions = ["c.consultation_date >= ?"]
+    params = [since]
+    for column, threshold in (("systolic", min_systolic), ("diastolic", min_diastolic), ("temp_c", min_temp_c)):
+        if threshold is not None:
+            conditions.append(f"c.{column} >= ?")
+            params.append(threshold)
+    rows = conn.execute(
+        f"""
+        SELECT c.id, c.patient_id, p.name, c.consultation_date, c.temp_c, c.systolic, c.diastolic
+        FROM consultations c
+        LEFT JOIN patients p ON p.id = c.patient_id
+        WHERE {" AND ".join(conditions)}
+        ORDER BY c.systolic DESC, c.temp_c DESC
+        LIMIT ?
+        """,
+        params + [limit]
+    ).fetchall()
+    return [
+        {
+            "consultation_id": row[0], "patient_id": row[1], "name": row[2], "date": row[3],
+            "temp_c": row[4], "systolic": row[5], "diastolic": row[6]
+        }
+        for row in rows
+    ]
+
+def vitals_trend(conn, patient_id, limit=20):
+    """A patient's numeric vital signs per consultation, oldest first"""
+    rows = conn.execute(
+        """
+        SELECT id, consultation_date, temp_c, systolic, diastolic
+        FROM consultations
+        WHERE patient_id = ?
+        ORDER BY consultation_date DESC
+        LIMIT ?
+        """,
+        (patient_id, limit)
+    ).fetchall()
+    return [
+        {"consultation_id": row[0], "date": row[1], "temp_c": row[2], "systolic": row[3], "diastolic": row[4]}
+        for row in reversed(rows)
+    ]
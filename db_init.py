@@ -2,11 +2,13 @@ import sqlite3
 import os
 import pandas as pd
 
+from db_migrations import DATABASE_PATH, run_migrations
+
 def main():
     # Check if database exists, if not create it
-    if not os.path.exists("muawin.db"):
+    if not os.path.exists(DATABASE_PATH):
         # Connect to database (this creates the file if it doesn't exist)
-        conn = sqlite3.connect("muawin.db")
+        conn = sqlite3.connect(DATABASE_PATH)
         cursor = conn.cursor()
         
         # Create tables
@@ -122,6 +124,8 @@ def main():
     else:
         print("Database already exists. Skipping initialization.")
     
+    # Bring new and existing databases up to the current schema
+    run_migrations(DATABASE_PATH)
     return True
 
 if __name__ == "__main__":
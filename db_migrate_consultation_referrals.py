@@ -1,33 +1,13 @@
-import sqlite3
-import os
-import sys
+from db_migrations import run_migrations
 
 def migrate_consultation_referrals():
     """
-    Add referrals column to the consultations table if it doesn't exist.
-    This is needed to store JSON data about referrals in the consultations table.
+    Add referrals column to the consultations table if it doesn't exist
+    (db_migrations.py step 7).
     """
-    conn = sqlite3.connect("docassist.db")
-    cursor = conn.cursor()
-    
-    # Check if column exists
-    cursor.execute("PRAGMA table_info(consultations)")
-    columns = [col[1] for col in cursor.fetchall()]
-    
-    # Add referrals column if it doesn't exist
-    if "referrals" not in columns:
-        try:
-            cursor.execute("ALTER TABLE consultations ADD COLUMN referrals TEXT")
-            print("Added referrals column to consultations table")
-            conn.commit()
-        except sqlite3.OperationalError as e:
-            print(f"Error adding referrals column: {e}")
-    else:
-        print("referrals column already exists in consultations table")
-    
-    conn.close()
+    run_migrations()
     return True
 
 if __name__ == "__main__":
     migrate_consultation_referrals()
-    print("Migration complete")
\ No newline at end of file
+    print("Migration complete")
@@ -0,0 +1,10 @@
+from db_migrations import run_migrations
+
+def migrate_indexes():
+    """Add the secondary indexes to the existing database (db_migrations.py step 11)"""
+    run_migrations()
+    return True
+
+if __name__ == "__main__":
+    migrate_indexes()
+    print("Migration complete")
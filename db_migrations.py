@@ -0,0 +1,660 @@
+"""
+Versioned schema migrations for docassist.db.
+
+Every step runs in its own transaction and is recorded in the schema_version
+table when it commits, so an interrupted upgrade resumes at the first step that
+did not finish. Steps also check the live schema before changing it, so a
+database that was upgraded by hand with the old db_* scripts only gets its
+versions recorded.
+
+    python db_migrations.py            # apply pending steps
+    python db_migrations.py --status   # list applied and pending steps
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from consultation_details import (
+    CHILD_INDEXES, CHILD_TABLES, DIAGNOSIS_INDEX, DIAGNOSIS_TABLE, detail_rows, diagnosis_rows, insert_details,
+    insert_diagnoses, load_json_column
+)
+from diagnosis_parser import confirmed_diagnoses, parse_diagnosis
+from prescription_store import PRESCRIPTION_STORE_DIR, record_file, store_bytes
+from vital_signs import numeric_vitals, numeric_vitals_from_dict
+
+DATABASE_PATH = "docassist.db"
+
+# Rows copied per statement when a table has to be rebuilt
+REBUILD_BATCH_SIZE = 50000
+
+# Seconds a runner waits for another one holding the write lock
+MIGRATION_BUSY_TIMEOUT_SECONDS = float(os.environ.get("MIGRATION_BUSY_TIMEOUT_SECONDS", "600"))
+
+# ALTER TABLE ... DROP COLUMN needs SQLite 3.35.0 or newer
+SUPPORTS_DROP_COLUMN = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Cache tables used by the API; api.ensure_cache_table also creates them lazily
+CACHE_TABLES = {
+    "history_summaries": """
+        CREATE TABLE IF NOT EXISTS history_summaries (
+            patient_id TEXT NOT NULL,
+            consultation_hash TEXT NOT NULL,
+            summary TEXT NOT NULL,
+            created_at TEXT,
+            PRIMARY KEY (patient_id, consultation_hash)
+        )
+    """,
+    "translation_memory": """
+        CREATE TABLE IF NOT EXISTS translation_memory (
+            text TEXT NOT NULL,
+            language TEXT NOT NULL,
+            translated_text TEXT NOT NULL,
+            created_at TEXT,
+            PRIMARY KEY (text, language)
+        )
+    """,
+}
+
+# Numeric vital sign columns on consultations and patients, parsed from the text values
+NUMERIC_VITAL_COLUMNS = [("temp_c", "REAL"), ("systolic", "INTEGER"), ("diastolic", "INTEGER")]
+
+# Range indexes for triage filters such as "systolic > 140 in the last 30 days"
+VITAL_INDEXES = [
+    ("idx_consultations_systolic_date", "consultations", "systolic, consultation_date"),
+    ("idx_consultations_diastolic_date", "consultations", "diastolic, consultation_date"),
+    ("idx_consultations_temp_c_date", "consultations", "temp_c, consultation_date"),
+    ("idx_patients_systolic", "patients", "systolic"),
+    ("idx_patients_temp_c", "patients", "temp_c")
+]
+
+# Secondary indexes for the hot lookups: (name, table, column list)
+INDEXES = [
+    # /patient-history: WHERE patient_id = ? ORDER BY consultation_date DESC LIMIT ?
+    ("idx_consultations_patient_date", "consultations", "patient_id, consultation_date DESC"),
+    # Referrals of a patient, oldest first
+    ("idx_referrals_patient_date", "referrals", "patient_id, referral_date")
+]
+
+SAMPLE_SPECIALISTS = [
+    # Cardiologists
+    ("Dr. Ahmed Khan", "Cardiology", "Aga Khan University Hospital", "+92-21-111-911-911", "Mon, Wed, Fri: 9AM-1PM"),
+    ("Dr. Saima Zubair", "Cardiology", "National Institute of Cardiovascular Diseases", "+92-21-9920-1271", "Tue, Thu: 10AM-2PM"),
+
+    # Neurologists
+    ("Dr. Farhan Ali", "Neurology", "Liaquat National Hospital", "+92-21-3412-7600", "Mon, Wed: 5PM-8PM"),
+    ("Dr. Nadia Memon", "Neurology", "Shifa International Hospital", "+92-51-8464-646", "Mon-Fri: 9AM-12PM"),
+
+    # Orthopedics
+    ("Dr. Adeel Iqbal", "Orthopedics", "South City Hospital", "+92-21-3520-0935", "Tue, Thu, Sat: 6PM-9PM"),
+    ("Dr. Zainab Raza", "Orthopedics", "Indus Hospital", "+92-21-3511-2709", "Mon, Wed, Fri: 2PM-5PM"),
+
+    # Dermatologists
+    ("Dr. Sadia Aslam", "Dermatology", "Patel Hospital", "+92-21-3453-0941", "Tue, Thu: 3PM-6PM"),
+    ("Dr. Kamal Hassan", "Dermatology", "Dr. Ziauddin Hospital", "+92-21-3538-3892", "Mon, Wed, Fri: 4PM-7PM"),
+
+    # Psychiatrists
+    ("Dr. Faisal Mahmood", "Psychiatry", "Institute of Behavioral Sciences", "+92-42-3578-5643", "Mon-Fri: 10AM-1PM"),
+    ("Dr. Ayesha Malik", "Psychiatry", "Karachi Psychiatric Hospital", "+92-21-3661-1290", "Tue, Thu, Sat: 11AM-3PM"),
+
+    # Ophthalmologists
+    ("Dr. Sohail Ahmed", "Ophthalmology", "Al-Shifa Trust Eye Hospital", "+92-51-5487-820", "Mon, Wed, Fri: 9AM-12PM"),
+    ("Dr. Rabia Zuberi", "Ophthalmology", "LRBT Free Eye Hospital", "+92-21-3666-1056", "Tue, Thu: 2PM-5PM"),
+
+    # ENT Specialists
+    ("Dr. Taimur Shah", "ENT", "National ENT Center", "+92-51-2876-534", "Mon-Fri: 5PM-8PM"),
+    ("Dr. Hina Qureshi", "ENT", "Liaquat National Hospital", "+92-21-3412-7600", "Sat-Sun: 10AM-2PM"),
+
+    # Pulmonologists
+    ("Dr. Bilal Javed", "Pulmonology", "Ojha Institute of Chest Diseases", "+92-21-9920-4776", "Mon, Wed, Fri: 10AM-1PM"),
+    ("Dr. Sana Khan", "Pulmonology", "National Institute of Diseases of Chest", "+92-42-9921-3471", "Tue, Thu: 3PM-6PM"),
+
+    # Gynecologists
+    ("Dr. Sameera Abid", "Gynecology", "Lady Dufferin Hospital", "+92-21-3276-1355", "Mon-Fri: 9AM-1PM"),
+    ("Dr. Humera Syed", "Gynecology", "Civil Hospital", "+92-21-9921-5960", "Mon, Wed, Fri: 2PM-5PM"),
+
+    # Pediatricians
+    ("Dr. Amjad Ali", "Pediatrics", "National Institute of Child Health", "+92-21-9920-4932", "Mon-Fri: 8AM-12PM"),
+    ("Dr. Fatima Jaffar", "Pediatrics", "Children's Hospital", "+92-42-9923-0402", "Tue, Thu, Sat: 10AM-2PM")
+]
+
+# Schema helpers
+
+def table_exists(conn, table):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone()
+    return row is not None
+
+def table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def add_column(conn, table, column, definition):
+    """Add a column unless it is already there. Returns True if it was added."""
+    if column in table_columns(conn, table):
+        return False
+    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    print(f"  Added {column} column to {table} table")
+    return True
+
+def rebuild_table_without(conn, table, removed, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Rebuild a table without some of its columns, for SQLite versions without
+    DROP COLUMN. Rows are copied in rowid order in batches so progress can be
+    reported on large tables. Indexes that do not use a dropped column are
+    recreated. Must run inside the caller's transaction.
+    """
+    columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    keep = [column for column in columns if column[1] not in removed]
+    primary_key_columns = [column[1] for column in sorted(keep, key=lambda column: column[5]) if column[5]]
+    autoincrement = table_exists(conn, "sqlite_sequence") and conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name=? AND sql LIKE '%AUTOINCREMENT%'", (table,)
+    ).fetchone() is not None
+
+    definitions = []
+    for _, name, column_type, not_null, default, primary_key in keep:
+        definition = f"{name} {column_type}".strip()
+        if primary_key and len(primary_key_columns) == 1:
+            definition += " PRIMARY KEY" + (" AUTOINCREMENT" if autoincrement else "")
+        if not_null:
+            definition += " NOT NULL"
+        if default is not None:
+            definition += f" DEFAULT {default}"
+        definitions.append(definition)
+    if len(primary_key_columns) > 1:
+        definitions.append(f"PRIMARY KEY ({', '.join(primary_key_columns)})")
+    for foreign_key in conn.execute(f"PRAGMA foreign_key_list({table})").fetchall():
+        referenced_table, from_column, to_column = foreign_key[2], foreign_key[3], foreign_key[4]
+        if from_column not in removed:
+            definitions.append(f"FOREIGN KEY ({from_column}) REFERENCES {referenced_table} ({to_column})")
+
+    indexes = [
+        sql for (sql,) in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL", (table,)
+        ).fetchall()
+        if not any(column in sql for column in removed)
+    ]
+
+    new_table = f"{table}_new"
+    column_list = ", ".join(column[1] for column in keep)
+    conn.execute(f"DROP TABLE IF EXISTS {new_table}")
+    conn.execute(f"CREATE TABLE {new_table} (\n    " + ",\n    ".join(definitions) + "\n)")
+
+    total = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    copied = 0
+    last_rowid = -sys.maxsize
+    while True:
+        # Walk the rowid b-tree instead of using OFFSET so every batch is a range seek
+        upper = conn.execute(
+            f"SELECT MAX(rowid) FROM (SELECT rowid FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?)",
+            (last_rowid, batch_size)
+        ).fetchone()[0]
+        if upper is None:
+            break
+        cursor = conn.execute(
+            f"INSERT INTO {new_table} ({column_list}) SELECT {column_list} FROM {table} WHERE rowid > ? AND rowid <= ?",
+            (last_rowid, upper)
+        )
+        copied += cursor.rowcount
+        last_rowid = upper
+        print(f"  Copied {copied}/{total} rows of {table}")
+
+    conn.execute(f"DROP TABLE {table}")
+    conn.execute(f"ALTER TABLE {new_table} RENAME TO {table}")
+    for sql in indexes:
+        conn.execute(sql)
+
+def drop_columns(conn, table, columns):
+    """Drop the given columns if present, in place where SQLite supports it"""
+    present = [column for column in columns if column in table_columns(conn, table)]
+    if not present:
+        return False
+    if SUPPORTS_DROP_COLUMN:
+        try:
+            for column in present:
+                conn.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+            print(f"  Dropped {', '.join(present)} from {table} table")
+            return True
+        except sqlite3.OperationalError as e:
+            # Indexed or constrained columns cannot be dropped in place
+            print(f"  DROP COLUMN not possible ({e}), rebuilding {table}")
+    rebuild_table_without(conn, table, present)
+    print(f"  Rebuilt {table} table without {', '.join(present)}")
+    return True
+
+def create_indexes(conn):
+    """
+    Create the INDEXES whose table exists. Safe to run repeatedly.
+    Returns the names of the indexes that were created.
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()}
+    existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'").fetchall()}
+
+    created = []
+    for name, table, columns in INDEXES:
+        if table not in tables:
+            print(f"  Table {table} not found, skipping {name}")
+            continue
+        if name in existing:
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        created.append(name)
+    # Give the query planner row counts for the new indexes
+    if created:
+        conn.execute("ANALYZE")
+        print(f"  Created indexes: {', '.join(created)}")
+    return created
+
+# Migration steps, formerly db_migrate.py, db_update.py, db_update_prescriptions.py,
+# db_add_tests.py, db_migrate_consultation_referrals.py, db_migrate_specialists.py,
+# db_migrate_referrals.py and db_migrate_indexes.py
+
+def add_consultation_vital_signs(conn):
+    add_column(conn, "consultations", "vital_signs", "TEXT")
+
+def add_patient_pre_conditions(conn):
+    add_column(conn, "patients", "pre_conditions", "TEXT")
+
+def move_pre_conditions_to_patients(conn):
+    """Copy each patient's latest consultation pre_conditions to the patient, then drop the column"""
+    if "pre_conditions" not in table_columns(conn, "consultations"):
+        return
+    cursor = conn.execute(
+        """
+        UPDATE patients SET pre_conditions = (
+            SELECT c.pre_conditions FROM consultations c
+            WHERE c.patient_id = patients.id AND c.pre_conditions IS NOT NULL AND c.pre_conditions != ''
+            ORDER BY c.consultation_date DESC
+            LIMIT 1
+        )
+        WHERE EXISTS (
+            SELECT 1 FROM consultations c
+            WHERE c.patient_id = patients.id AND c.pre_conditions IS NOT NULL AND c.pre_conditions != ''
+        )
+        """
+    )
+    print(f"  Moved pre-existing conditions of {cursor.rowcount} patients")
+    drop_columns(conn, "consultations", ["pre_conditions"])
+
+def add_patient_language(conn):
+    if add_column(conn, "patients", "language", "TEXT DEFAULT 'English'"):
+        # Languages of the sample patients created by db_init.py
+        conn.execute("""
+        UPDATE patients SET language = CASE
+            WHEN id = 'P001' THEN 'Urdu'
+            WHEN id = 'P002' THEN 'English'
+            WHEN id = 'P003' THEN 'Urdu'
+            WHEN id = 'P004' THEN 'Punjabi'
+            WHEN id = 'P005' THEN 'Sindhi'
+            ELSE 'English'
+        END
+        """)
+
+def add_consultation_prescription_pdf(conn):
+    add_column(conn, "consultations", "prescription_pdf", "TEXT")
+    os.makedirs(os.path.join("data", "prescription"), exist_ok=True)
+
+def add_consultation_tests(conn):
+    add_column(conn, "consultations", "tests", "TEXT")
+
+def add_consultation_referrals(conn):
+    add_column(conn, "consultations", "referrals", "TEXT")
+
+def create_specialists_table(conn):
+    if table_exists(conn, "specialists"):
+        return
+    conn.execute('''
+    CREATE TABLE specialists (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        category TEXT NOT NULL,
+        hospital TEXT,
+        contact TEXT,
+        availability TEXT
+    )
+    ''')
+    conn.executemany(
+        "INSERT INTO specialists (name, category, hospital, contact, availability) VALUES (?, ?, ?, ?, ?)",
+        SAMPLE_SPECIALISTS
+    )
+    print("  Created specialists table with sample data")
+
+def create_referrals_table(conn):
+    if table_exists(conn, "referrals"):
+        return
+    conn.execute('''
+    CREATE TABLE referrals (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        doctor_id INTEGER,
+        patient_id TEXT,
+        specialist_id INTEGER,
+        reason TEXT,
+        referral_date TEXT,
+        status TEXT DEFAULT 'Pending',
+        FOREIGN KEY (doctor_id) REFERENCES doctors (id),
+        FOREIGN KEY (patient_id) REFERENCES patients (id),
+        FOREIGN KEY (specialist_id) REFERENCES specialists (id)
+    )
+    ''')
+    print("  Created referrals table")
+
+def create_cache_tables(conn):
+    for statement in CACHE_TABLES.values():
+        conn.execute(statement)
+
+def create_consultation_detail_tables(conn):
+    for statement in CHILD_TABLES.values():
+        conn.execute(statement)
+    for name, table, columns in CHILD_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+def backfill_consultation_details(conn, batch_size=REBUILD_BATCH_SIZE):
+    """Fill the consultation detail tables from the JSON symptoms, vital_signs and tests columns"""
+    total = conn.execute("SELECT COUNT(*) FROM consultations").fetchone()[0]
+    done = 0
+    last_id = -sys.maxsize
+    while True:
+        batch = conn.execute(
+            """
+            SELECT id, patient_id, consultation_date, symptoms, vital_signs, tests
+            FROM consultations WHERE id > ? ORDER BY id LIMIT ?
+            """,
+            (last_id, batch_size)
+        ).fetchall()
+        if not batch:
+            break
+        rows = ([], [], [])
+        for consultation_id, patient_id, consultation_date, symptoms, vital_signs, tests in batch:
+            for collected, new in zip(rows, detail_rows(
+                consultation_id, patient_id, consultation_date,
+                load_json_column(symptoms, []), load_json_column(vital_signs, {}), load_json_column(tests, [])
+            )):
+                collected.extend(new)
+        insert_details(conn, rows)
+        done += len(batch)
+        last_id = batch[-1][0]
+        print(f"  Backfilled {done}/{total} consultations")
+    if total:
+        conn.execute("ANALYZE")
+
+def add_numeric_vital_columns(conn):
+    for table in ("consultations", "patients"):
+        for column, definition in NUMERIC_VITAL_COLUMNS:
+            add_column(conn, table, column, definition)
+    for name, table, columns in VITAL_INDEXES:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+def backfill_numeric_vitals(conn, batch_size=REBUILD_BATCH_SIZE):
+    """Parse the text vital signs of existing consultations and patients into the numeric columns"""
+    total = conn.execute("SELECT COUNT(*) FROM consultations").fetchone()[0]
+    done = 0
+    last_id = -sys.maxsize
+    while True:
+        batch = conn.execute(
+            "SELECT id, vital_signs FROM consultations WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not batch:
+            break
+        conn.executemany(
+            "UPDATE consultations SET temp_c = ?, systolic = ?, diastolic = ? WHERE id = ?",
+            [
+                numeric_vitals_from_dict(load_json_column(vital_signs, {})) + (consultation_id,)
+                for consultation_id, vital_signs in batch
+            ]
+        )
+        done += len(batch)
+        last_id = batch[-1][0]
+        print(f"  Parsed vital signs of {done}/{total} consultations")
+
+    patients = conn.execute("SELECT id, temperature, blood_pressure FROM patients").fetchall()
+    conn.executemany(
+        "UPDATE patients SET temp_c = ?, systolic = ?, diastolic = ? WHERE id = ?",
+        [numeric_vitals(temperature, blood_pressure) + (patient_id,) for patient_id, temperature, blood_pressure in patients]
+    )
+    print(f"  Parsed vital signs of {len(patients)} patients")
+    if total or patients:
+        conn.execute("ANALYZE")
+
+def link_referrals_to_consultations(conn):
+    add_column(conn, "referrals", "consultation_id", "INTEGER REFERENCES consultations (id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_referrals_consultation ON referrals (consultation_id)")
+
+def create_prescription_files_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS prescription_files (
+        sha256 TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        created_at TEXT
+    )
+    """)
+    add_column(conn, "consultations", "prescription_sha256", "TEXT REFERENCES prescription_files (sha256)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_consultations_prescription_sha256 ON consultations (prescription_sha256)")
+
+# The app saved PDFs here (data/prescription/<patient>_<n>.pdf) before the store existed
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def resolve_prescription_pdf(pdf_path):
+    """
+    Local path of a PDF the app recorded, or None. Relative paths are tried
+    against the working directory and the app directory; absolute paths saved on
+    another machine are looked up by file name in data/prescription.
+    """
+    candidates = [pdf_path] if os.path.isabs(pdf_path) else [pdf_path, os.path.join(APP_DIR, pdf_path)]
+    name = os.path.basename(pdf_path)
+    candidates += [os.path.join(PRESCRIPTION_STORE_DIR, name), os.path.join(APP_DIR, PRESCRIPTION_STORE_DIR, name)]
+    return next((path for path in candidates if os.path.isfile(path)), None)
+
+def import_prescription_files(conn):
+    """Move PDFs saved at file paths by the app into the content-addressed store"""
+    rows = conn.execute(
+        "SELECT id, prescription_pdf FROM consultations "
+        "WHERE prescription_sha256 IS NULL AND prescription_pdf IS NOT NULL"
+    ).fetchall()
+    imported = 0
+    unresolved = []
+    for consultation_id, recorded_path in rows:
+        pdf_path = resolve_prescription_pdf(recorded_path)
+        if pdf_path is None:
+            unresolved.append((consultation_id, recorded_path))
+            continue
+        with open(pdf_path, "rb") as f:
+            try:
+                sha256, size, _ = store_bytes(f.read())
+            except Exception as e:
+                print(f"  Skipped {pdf_path}: {e}")
+                continue
+        record_file(conn, sha256, size)
+        conn.execute(
+            "UPDATE consultations SET prescription_sha256 = ?, prescription_pdf = ? WHERE id = ?",
+            (sha256, f"/prescription-files/{sha256}", consultation_id)
+        )
+        imported += 1
+    print(f"  Imported {imported} of {len(rows)} prescription PDFs")
+    if unresolved:
+        print(f"  {len(unresolved)} PDFs not found; these consultations keep their recorded path:")
+        for consultation_id, recorded_path in unresolved:
+            print(f"    consultation {consultation_id}: {recorded_path}")
+
+def create_consultation_diagnoses(conn):
+    add_column(conn, "consultations", "diagnosis_json", "TEXT")
+    conn.execute(DIAGNOSIS_TABLE)
+    name, table, columns = DIAGNOSIS_INDEX
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+
+def backfill_consultation_diagnoses(conn, batch_size=REBUILD_BATCH_SIZE):
+    """Parse the diagnosis text of existing consultations into diagnosis_json and consultation_diagnoses"""
+    total = conn.execute("SELECT COUNT(*) FROM consultations WHERE diagnosis_json IS NULL").fetchone()[0]
+    done = 0
+    last_id = -sys.maxsize
+    while True:
+        batch = conn.execute(
+            """
+            SELECT id, patient_id, consultation_date, diagnosis
+            FROM consultations WHERE id > ? AND diagnosis_json IS NULL ORDER BY id LIMIT ?
+            """,
+            (last_id, batch_size)
+        ).fetchall()
+        if not batch:
+            break
+        updates = []
+        rows = []
+        for consultation_id, patient_id, consultation_date, diagnosis in batch:
+            parsed = parse_diagnosis(diagnosis)
+            updates.append((json.dumps(parsed), consultation_id))
+            rows.extend(diagnosis_rows(consultation_id, patient_id, consultation_date, confirmed_diagnoses(parsed)))
+        conn.executemany("UPDATE consultations SET diagnosis_json = ? WHERE id = ?", updates)
+        insert_diagnoses(conn, rows)
+        done += len(batch)
+        last_id = batch[-1][0]
+        print(f"  Parsed diagnoses of {done}/{total} consultations")
+    if total:
+        conn.execute("ANALYZE")
+
+def rebuild_consultation_diagnoses(conn, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Rebuild consultation_diagnoses from diagnosis_json with only the diagnoses
+    the doctor selected. Step 20 used to record the whole generated differential
+    of consultations where nothing was selected.
+    """
+    conn.execute("DELETE FROM consultation_diagnoses")
+    last_id = -sys.maxsize
+    while True:
+        batch = conn.execute(
+            """
+            SELECT id, patient_id, consultation_date, diagnosis_json
+            FROM consultations WHERE id > ? AND diagnosis_json IS NOT NULL ORDER BY id LIMIT ?
+            """,
+            (last_id, batch_size)
+        ).fetchall()
+        if not batch:
+            break
+        rows = []
+        for consultation_id, patient_id, consultation_date, diagnosis_json in batch:
+            parsed = json.loads(diagnosis_json)
+            rows.extend(diagnosis_rows(consultation_id, patient_id, consultation_date, confirmed_diagnoses(parsed)))
+        insert_diagnoses(conn, rows)
+        last_id = batch[-1][0]
+    count = conn.execute("SELECT COUNT(*) FROM consultation_diagnoses").fetchone()[0]
+    print(f"  Kept {count} selected diagnoses")
+
+# Ordered steps: (version, description, function). Append only; never renumber.
+MIGRATIONS = [
+    (1, "Add consultations.vital_signs", add_consultation_vital_signs),
+    (2, "Add patients.pre_conditions", add_patient_pre_conditions),
+    (3, "Move pre-existing conditions from consultations to patients", move_pre_conditions_to_patients),
+    (4, "Add patients.language", add_patient_language),
+    (5, "Add consultations.prescription_pdf", add_consultation_prescription_pdf),
+    (6, "Add consultations.tests", add_consultation_tests),
+    (7, "Add consultations.referrals", add_consultation_referrals),
+    (8, "Create specialists table", create_specialists_table),
+    (9, "Create referrals table", create_referrals_table),
+    (10, "Create history summary and translation memory tables", create_cache_tables),
+    (11, "Index consultations and referrals by patient and date", create_indexes),
+    (12, "Create consultation symptom, test and vital sign tables", create_consultation_detail_tables),
+    (13, "Backfill consultation details from the JSON columns", backfill_consultation_details),
+    (14, "Add numeric vital sign columns and range indexes", add_numeric_vital_columns),
+    (15, "Backfill numeric vital signs from the text values", backfill_numeric_vitals),
+    (16, "Link referrals to the consultation they were made in", link_referrals_to_consultations),
+    (17, "Create content-addressed prescription file table", create_prescription_files_table),
+    (18, "Import existing prescription PDFs into the file store", import_prescription_files),
+    (19, "Add consultations.diagnosis_json and the consultation diagnoses table", create_consultation_diagnoses),
+    (20, "Backfill structured diagnoses from the diagnosis text", backfill_consultation_diagnoses),
+    (21, "Keep only the doctor's selected diagnoses in consultation_diagnoses", rebuild_consultation_diagnoses),
+    # Step 18 only found PDFs at their recorded path; this retries the rest by file name
+    (22, "Import prescription PDFs recorded at paths from another machine", import_prescription_files)
+]
+
+def connect(database=DATABASE_PATH):
+    # Autocommit mode, so each step controls its own transaction. The long busy
+    # timeout lets a second runner wait out a batched rebuild or backfill.
+    conn = sqlite3.connect(database, isolation_level=None, timeout=MIGRATION_BUSY_TIMEOUT_SECONDS)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TEXT,
+        seconds REAL
+    )
+    """)
+    return conn
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute("SELECT version FROM schema_version").fetchall()}
+
+def run_migrations(database=DATABASE_PATH, target=None):
+    """
+    Apply the pending MIGRATIONS in order, up to and including target.
+    Returns the versions applied. Stops at the first failing step, leaving the
+    database at the last step that committed.
+    """
+    if not os.path.exists(database):
+        print("Database file not found. Please run db_init.py first.")
+        return []
+
+    conn = connect(database)
+    applied = []
+    try:
+        done = applied_versions(conn)
+        for version, description, step in MIGRATIONS:
+            if version in done or (target is not None and version > target):
+                continue
+            start = time.perf_counter()
+            # IMMEDIATE takes the write lock up front so a step never fails halfway on a busy lock
+            conn.execute("BEGIN IMMEDIATE")
+            # Another runner may have applied the step while this one waited for the lock
+            if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                conn.execute("ROLLBACK")
+                continue
+            print(f"Migration {version}: {description}")
+            try:
+                step(conn)
+                seconds = time.perf_counter() - start
+                conn.execute(
+                    "INSERT INTO schema_version (version, description, applied_at, seconds) VALUES (?, ?, ?, ?)",
+                    (version, description, datetime.now().isoformat(), seconds)
+                )
+                conn.execute("COMMIT")
+            except Exception as e:
+                conn.execute("ROLLBACK")
+                print(f"Migration {version} failed, rolled back: {e}")
+                raise
+            print(f"Migration {version} done in {seconds:.3f}s")
+            applied.append(version)
+    finally:
+        conn.close()
+
+    if not applied:
+        print("Database schema is up to date")
+    return applied
+
+def print_status(database=DATABASE_PATH):
+    conn = connect(database)
+    rows = {
+        row[0]: row for row in
+        conn.execute("SELECT version, description, applied_at, seconds FROM schema_version").fetchall()
+    }
+    conn.close()
+    for version, description, _ in MIGRATIONS:
+        if version in rows:
+            status = f"applied {rows[version][2]} in {rows[version][3]:.3f}s"
+        else:
+            status = "pending"
+        print(f"{version:3d}  {description} ({status})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("--db", default=DATABASE_PATH, help="SQLite database to migrate")
+    parser.add_argument("--target", type=int, help="Stop after this version")
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations")
+    args = parser.parse_args()
+
+    if args.status:
+        print_status(args.db)
+    else:
+        try:
+            run_migrations(args.db, args.target)
+        except Exception:
+            sys.exit(1)
+        print("Migration complete")
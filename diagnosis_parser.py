@@ -0,0 +1,86 @@
+"""
+Splitting a diagnosis into its sections.
+
+The diagnosis prompt asks for PATIENT HISTORY SUMMARY, a numbered DIAGNOSIS
+list, and REASONS and TREATMENT PLAN bullets. parse_diagnosis turns that text,
+or the "Selected Diagnoses:" text the app saves once the doctor has confirmed,
+into lists. The API parses each diagnosis once and returns the result with the
+text, so clients never split it themselves.
+"""
+import re
+
+# (heading, key) of the sections a diagnosis can contain
+SECTIONS = [
+    ("PATIENT HISTORY SUMMARY", "history_summary"),
+    ("DIAGNOSIS", "diagnoses"),
+    ("REASONS", "reasons"),
+    ("TREATMENT PLAN", "treatment_plan"),
+    # Written by the app when the doctor confirms
+    ("Selected Diagnoses", "selected"),
+    ("Additional Notes", "notes")
+]
+
+# Sections kept as free text; the others are lists
+TEXT_SECTIONS = {"history_summary", "notes"}
+
+_HEADINGS = {heading: key for heading, key in SECTIONS}
+
+# A heading on a line of its own, optionally in markdown bold or as a markdown heading
+_SECTION = re.compile(
+    r"^[ \t#*]*(" + "|".join(re.escape(heading) for heading, _ in SECTIONS) + r")[ \t]*:[ \t*]*",
+    re.MULTILINE
+)
+
+# "1.", "2)", "-", "•" or "*" at the start of a list item
+_ITEM_MARKER = re.compile(r"^\s*(?:\d+[.)]|[-•*])\s+")
+
+# The prompt's stand-in for the history summary, left when no summary was spliced in
+_PLACEHOLDER = re.compile(r"^\[.*\]$", re.DOTALL)
+
+def empty_diagnosis():
+    return {key: None if key in TEXT_SECTIONS else [] for _, key in SECTIONS}
+
+def split_items(text):
+    """List items of a section; lines without a marker continue the previous item"""
+    items = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        marker = _ITEM_MARKER.match(line)
+        if marker or not items:
+            items.append(line[marker.end():].strip() if marker else line.strip())
+        else:
+            items[-1] += " " + line.strip()
+    return [item for item in items if item]
+
+def parse_diagnosis(text):
+    """
+    {"history_summary": str or None, "diagnoses": [...], "reasons": [...],
+    "treatment_plan": [...], "selected": [...], "notes": str or None}
+    from a diagnosis. Text before the first heading is ignored unless there is
+    no heading at all, in which case it is kept as notes.
+    """
+    result = empty_diagnosis()
+    if not text:
+        return result
+    matches = list(_SECTION.finditer(text))
+    if not matches:
+        result["notes"] = text.strip() or None
+        return result
+    for i, match in enumerate(matches):
+        key = _HEADINGS[match.group(1)]
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        content = text[match.end():end].strip()
+        if key in TEXT_SECTIONS:
+            if content and not _PLACEHOLDER.match(content):
+                result[key] = content
+        else:
+            result[key].extend(split_items(content))
+    return result
+
+def confirmed_diagnoses(result):
+    """
+    The diagnoses a consultation is recorded under: only those the doctor
+    selected. The generated list is a differential, not a diagnosis anyone made.
+    """
+    return result.get("selected") or []
@@ -3,6 +3,8 @@ import sqlite3
 import pandas as pd
 import streamlit as st
 
+from db_migrations import run_migrations
+
 def init_db():
     """Initialize the database"""
     # Placeholder for database initialization logic
@@ -17,6 +19,8 @@ def ensure_db_initialized():
         conn = sqlite3.connect("docassist.db")
     else:
         print("Database already exists.")
+        # The API no longer migrates on startup, so bring the schema up to date here
+        run_migrations()
 
 if __name__ == "__main__":
     ensure_db_initialized()
\ No newline at end of file
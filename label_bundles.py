@@ -0,0 +1,55 @@
+import json
+import os
+
+# Bump when the label set or bundle format changes; bundles of another version are ignored
+LABEL_BUNDLE_VERSION = 1
+
+# Directory holding one <language>.json bundle per supported patient language
+LABEL_BUNDLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "labels")
+
+# Fixed strings printed on every prescription
+PRESCRIPTION_LABELS = [
+    "Medical Prescription",
+    "Patient",
+    "Age",
+    "Gender",
+    "Date",
+    "Diagnosis",
+    "Referrals",
+    "Prescription",
+    "Medications",
+    "Additional Instructions",
+    "Recommended Medical Tests",
+    "Male",
+    "Female"
+]
+
+def bundle_path(language, bundle_dir=LABEL_BUNDLE_DIR):
+    return os.path.join(bundle_dir, f"{language.lower()}.json")
+
+def read_bundle(path):
+    """Read one bundle file. Returns its labels, or None if missing or of another version"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            bundle = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read label bundle {path}: {e}")
+        return None
+    
+    if bundle.get("version") != LABEL_BUNDLE_VERSION:
+        print(f"Ignoring label bundle {path}: version {bundle.get('version')}, expected {LABEL_BUNDLE_VERSION}")
+        return None
+    return bundle.get("labels", {})
+
+def load_label_bundles(bundle_dir=LABEL_BUNDLE_DIR):
+    """Load every label bundle. Returns {language: {label: translation}}"""
+    bundles = {}
+    if not os.path.isdir(bundle_dir):
+        return bundles
+    
+    for filename in sorted(os.listdir(bundle_dir)):
+        if filename.endswith(".json"):
+            labels = read_bundle(os.path.join(bundle_dir, filename))
+            if labels is not None:
+                bundles[filename[:-len(".json")]] = labels
+    return bundles
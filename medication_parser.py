@@ -0,0 +1,298 @@
+"""
+Turning generated prescriptions into medication rows.
+
+/generate-prescription can return medications as JSON (structured mode), which
+load_structured_medications validates. Text responses - a markdown table or one
+medication per line - go through parse_medications, and finalized prescriptions
+("PRESCRIPTION:" bullets) through parse_prescription_sections.
+"""
+import json
+import re
+
+# Keys of a medication row, in display order
+MEDICATION_FIELDS = [
+    "medication",
+    "dosage",
+    "frequency",
+    "duration",
+    "side_effects",
+    "interactions",
+    "pregnancy_safety"
+]
+
+MEDICATION_HEADINGS = {
+    "medication": "Medication Name",
+    "dosage": "Dosage",
+    "frequency": "Frequency",
+    "duration": "Duration",
+    "side_effects": "Side Effects",
+    "interactions": "Medication Interactions",
+    "pregnancy_safety": "Pregnancy Safety"
+}
+
+# Other keys models use for the same fields in JSON output
+FIELD_ALIASES = {
+    "name": "medication",
+    "medication_name": "medication",
+    "drug": "medication",
+    "dose": "dosage",
+    "medication_interactions": "interactions",
+    "drug_interactions": "interactions",
+    "pregnancy": "pregnancy_safety",
+    "pregnancy_category": "pregnancy_safety"
+}
+
+_JSON_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+
+def empty_medication():
+    return {field: "" for field in MEDICATION_FIELDS}
+
+def load_structured_medications(text):
+    """
+    Medication rows from a JSON response: an array of objects, or an object
+    with a "medications" array. Keys are normalized to MEDICATION_FIELDS and
+    values to strings; rows without a medication name are dropped. Raises
+    ValueError if the text is not JSON of that shape.
+    """
+    text = _JSON_FENCE.sub("", text.strip())
+    if not text.startswith(("[", "{")):
+        # Tolerate prose around the JSON
+        start = min((i for i in (text.find("["), text.find("{")) if i >= 0), default=-1)
+        if start < 0:
+            raise ValueError("No JSON in response")
+        text = text[start:]
+    data, _ = json.JSONDecoder().raw_decode(text)
+    if isinstance(data, dict):
+        data = data.get("medications")
+    if not isinstance(data, list):
+        raise ValueError("Expected a list of medications")
+
+    medications = []
+    for item in data:
+        if not isinstance(item, dict):
+            continue
+        med = empty_medication()
+        for key, value in item.items():
+            field = key.strip().lower().replace(" ", "_")
+            field = FIELD_ALIASES.get(field, field)
+            if field in med and value is not None:
+                med[field] = ", ".join(map(str, value)) if isinstance(value, list) else str(value).strip()
+        if med["medication"]:
+            medications.append(med)
+    return medications
+
+def medications_to_markdown(medications):
+    """The medications as a markdown table, the format text responses use"""
+    def cell(value):
+        return str(value).replace("|", "/").replace("\n", " ")
+    lines = [
+        "| " + " | ".join(MEDICATION_HEADINGS[field] for field in MEDICATION_FIELDS) + " |",
+        "|" + "|".join("---" for _ in MEDICATION_FIELDS) + "|"
+    ]
+    for med in medications:
+        lines.append("| " + " | ".join(cell(med.get(field, "")) for field in MEDICATION_FIELDS) + " |")
+    return "\n".join(lines)
+
+def parse_medication_table(prescription):
+    """
+    Medication rows from a markdown table, matching columns to fields by their
+    headings. Returns None if the text has no table.
+    """
+    if not ("|" in prescription and "-|-" in prescription):
+        return None
+    lines = prescription.strip().split('\n')
+    header_line = -1
+    
+    # Find the header line
+    for i, line in enumerate(lines):
+        if line.strip().startswith("|") and "-|-" in lines[i+1] if i+1 < len(lines) else False:
+            header_line = i
+            break
+    
+    if header_line < 0:
+        return None
+    
+    # Get the header column names
+    header = [col.strip() for col in lines[header_line].strip().split("|")]
+    header = [col for col in header if col]  # Remove empty strings
+    
+    # Map header columns to medication fields
+    field_positions = {field: -1 for field in MEDICATION_FIELDS}
+    
+    # Map positions based on header names
+    for i, col in enumerate(header):
+        col_lower = col.lower()
+        if ("medication" in col_lower and "name" in col_lower) or "medication name" in col_lower:
+            field_positions["medication"] = i
+        elif "medication" in col_lower and "interaction" in col_lower:
+            field_positions["interactions"] = i
+        elif "dosage" in col_lower or "dose" in col_lower:
+            field_positions["dosage"] = i
+        elif "frequency" in col_lower:
+            field_positions["frequency"] = i
+        elif "duration" in col_lower:
+            field_positions["duration"] = i
+        elif "side" in col_lower and "effect" in col_lower:
+            field_positions["side_effects"] = i
+        elif "interaction" in col_lower:
+            field_positions["interactions"] = i
+        elif "pregnancy" in col_lower:
+            field_positions["pregnancy_safety"] = i
+    
+    medications = []
+    # Process data rows
+    for i in range(header_line + 2, len(lines)):  # Skip header and separator
+        line = lines[i].strip()
+        if not line or not line.startswith("|"):
+            continue
+            
+        columns = [col.strip() for col in line.split("|")]
+        columns = [col for col in columns if col]  # Remove empty strings
+        
+        if len(columns) < len(header):
+            continue  # Skip incomplete rows
+            
+        med = empty_medication()
+        
+        # Fill in the medication fields based on mapped positions
+        for field, pos in field_positions.items():
+            if pos >= 0 and pos < len(columns):
+                med[field] = columns[pos]
+        
+        if med["medication"].strip():  # Only add non-empty medications
+            medications.append(med)
+    return medications
+
+def parse_medications(prescription):
+    """Medication rows from a generated text prescription: a markdown table, or one medication per line"""
+    medications = parse_medication_table(prescription)
+    if medications is not None:
+        return medications
+    
+    # Try parsing it as bullet points or other format
+    medications = []
+    for line in re.split(r'\n+', prescription):
+        line = line.strip()
+        if not line:
+            continue
+        
+        # Check if this is a medication line (usually starts with bullet, number, etc.)
+        if line.startswith("• ") or re.match(r'^\d+\.', line) or ":" not in line[:15]:
+            medications.append(parse_medication_details(line))
+    return medications
+
+def parse_prescription_sections(prescription):
+    """
+    Split a finalized prescription into its medication rows and additional
+    instructions. Returns (None, None) if it is not in the finalized format.
+    """
+    if not ("PRESCRIPTION:" in prescription and "• " in prescription):
+        return None, None
+    
+    medications = []
+    additional_instructions = ""
+    
+    lines = prescription.split("\n")
+    reading_meds = False
+    reading_instructions = False
+    
+    for line in lines:
+        if "PRESCRIPTION:" in line:
+            reading_meds = True
+            continue
+            
+        if "ADDITIONAL INSTRUCTIONS:" in line:
+            reading_meds = False
+            reading_instructions = True
+            continue
+            
+        if reading_meds and line.strip() and line.strip().startswith("• "):
+            medications.append(parse_medication_details(line))
+            
+        if reading_instructions and line.strip():
+            additional_instructions += line + "\n"
+    
+    return medications, additional_instructions
+
+# Labels of the fields that follow "Name - Dosage - Frequency - Duration", in
+# lower case. Longer labels come first so "Drug Interactions:" is not read as
+# "Interactions:".
+FIELD_LABELS = {
+    "medication interactions": "interactions",
+    "pregnancy category": "pregnancy_safety",
+    "drug interactions": "interactions",
+    "pregnancy safety": "pregnancy_safety",
+    "side effects": "side_effects",
+    "side-effects": "side_effects",
+    "interactions": "interactions",
+    "pregnancy": "pregnancy_safety"
+}
+
+_LABELS = tuple(FIELD_LABELS)
+_LONGEST_LABEL = max(map(len, FIELD_LABELS))
+
+# Bullet and list number in front of the medication name
+_LINE_MARKER = re.compile(r"^\s*(?:[•*]\s*)?(?:\d+[.)]\s+)?")
+
+# Side effects given in parentheses without a label
+_SIDE_EFFECT_NOTE = re.compile(r"\s*\(([^()]*\bside\b[^()]*)\)\s*$", re.IGNORECASE)
+
+def find_field_labels(line):
+    """
+    (start, end, field, parenthesized) of each field label in a line, end being
+    just past its colon. Every label ends in a colon, so the line is scanned
+    once for colons and only the text in front of each is compared with
+    FIELD_LABELS.
+    """
+    labels = []
+    colon = line.find(":")
+    while colon >= 0:
+        window_start = max(0, colon - _LONGEST_LABEL - 2)
+        before = line[window_start:colon].rstrip().lower()
+        if before.endswith(_LABELS):
+            label = next(label for label in _LABELS if before.endswith(label))
+            start = window_start + len(before) - len(label)
+            if start == 0 or not line[start - 1].isalnum():
+                while start > 0 and line[start - 1] == " ":
+                    start -= 1
+                parenthesized = start > 0 and line[start - 1] == "("
+                labels.append((start - parenthesized, colon + 1, FIELD_LABELS[label], parenthesized))
+        colon = line.find(":", colon + 1)
+    return labels
+
+def parse_medication_details(med_line):
+    """
+    One medication row from a line of a prescription: a markdown table row
+    (columns in MEDICATION_FIELDS order), or "Name - Dosage - Frequency -
+    Duration" followed by labeled side effects, interactions and pregnancy
+    safety (see find_field_labels).
+    """
+    med = empty_medication()
+    
+    if med_line.lstrip().startswith("|"):
+        cells = [cell.strip() for cell in med_line.strip().strip("|").split("|")]
+        med.update(zip(MEDICATION_FIELDS, cells))
+        return med
+    
+    # Everything before the first label is the basic medication information;
+    # each label's value runs to the next label
+    labels = find_field_labels(med_line)
+    head = med_line[:labels[0][0]] if labels else med_line
+    for i, (_, end, field, parenthesized) in enumerate(labels):
+        value = med_line[end:labels[i + 1][0] if i + 1 < len(labels) else len(med_line)].strip()
+        if parenthesized and value.endswith(")"):
+            value = value[:-1].rstrip()
+        med[field] = value
+    
+    if not med["side_effects"] and "(" in head:
+        note = _SIDE_EFFECT_NOTE.search(head)
+        if note:
+            med["side_effects"] = note.group(1).strip()
+            head = head[:note.start()]
+    
+    parts = [part.strip() for part in head[_LINE_MARKER.match(head).end():].split(" - ")]
+    if len(parts) > 4:
+        # A duration containing " - " was split too
+        parts[3:] = [" - ".join(parts[3:])]
+    med.update(zip(["medication", "dosage", "frequency", "duration"], parts))
+    return med
@@ -0,0 +1,366 @@
+"""
+Prescription rendering shared by the app and the benchmarks.
+
+Renderers never write to a shared path, so any number of renders can run at the
+same time. Callers that need a file (download buttons, wkhtmltopdf) take one from
+new_temp_path, which gives every render its own name.
+
+Everything a render needs that does not depend on the prescription is built once
+per process and reused: ReportLab fonts are registered once and stylesheets are
+cached per language.
+
+A prescription is first turned into a model (prescription_model): plain dicts
+and strings with every translation already looked up. The HTML and text
+documents are Jinja2 templates in templates/, compiled once and rendered from
+the model in a single pass, so one model serves every output format.
+"""
+import base64
+import functools
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from markupsafe import Markup, escape
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+DEJAVU_FONT_PATH = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+# Fonts for the translated text, tried in order; DejaVu covers everything else
+TRANSLATION_FONT_PATHS = {
+    'urdu': ['/usr/share/fonts/truetype/noto/NotoNastaliqUrdu-Regular.ttf',
+             '/usr/share/fonts/truetype/noto/NotoSansUrdu-Regular.ttf'],
+    'arabic': ['/usr/share/fonts/truetype/noto/NotoNaskhArabic-Regular.ttf',
+               '/usr/share/fonts/truetype/noto/NotoSansArabic-Regular.ttf'],
+    'punjabi': ['/usr/share/fonts/truetype/noto/NotoSansGurmukhi-Regular.ttf',
+                '/usr/share/fonts/truetype/noto/NotoSansPunjabi-Regular.ttf'],
+    # Sindhi uses the Urdu script
+    'sindhi': ['/usr/share/fonts/truetype/noto/NotoNastaliqUrdu-Regular.ttf',
+               '/usr/share/fonts/truetype/noto/NotoSansUrdu-Regular.ttf']
+}
+
+RTL_LANGUAGES = {'urdu', 'arabic', 'persian', 'sindhi'}
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+# Compiled templates are kept here so a new process does not re-parse them
+JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "docassist-jinja"))
+
+QR_CODE_PATH = "Muawin_WA.png"
+
+# (model key, column heading) of the medication table, in display order
+MEDICATION_COLUMNS = [
+    ("medication", "Medication"),
+    ("dosage", "Dosage"),
+    ("frequency", "Frequency"),
+    ("duration", "Duration"),
+    ("side_effects", "Side Effects"),
+    ("interactions", "Interactions"),
+    ("pregnancy_safety", "Pregnancy Safety")
+]
+
+MEDICATION_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+_font_lock = threading.Lock()
+
+def new_temp_path(suffix=".pdf"):
+    """Reserve a uniquely named temp file for one render and return its path"""
+    fd, path = tempfile.mkstemp(prefix="prescription_", suffix=suffix)
+    os.close(fd)
+    return path
+
+@functools.lru_cache(maxsize=None)
+def translation_font_path(language):
+    """First installed font file for a language, or None"""
+    for path in TRANSLATION_FONT_PATHS.get(language.lower(), []) + [DEJAVU_FONT_PATH]:
+        if os.path.exists(path):
+            return path
+    return None
+
+@functools.lru_cache(maxsize=None)
+def get_translation_font(language):
+    """
+    Name of the ReportLab font for text in a language, registered on first use
+    and reused for the life of the process. None if no font file is installed.
+    """
+    path = translation_font_path(language)
+    if path is None:
+        return None
+    # One font name per file: a shared name would let a render in another
+    # language swap the font out from under this one
+    name = f"TranslationFont-{os.path.basename(path)}"
+    with _font_lock:
+        if name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(name, path))
+    return name
+
+@functools.lru_cache(maxsize=None)
+def get_prescription_styles(language):
+    """
+    Stylesheet for prescriptions in a language: ReportLab's sample styles plus
+    'Center' for the title and 'Translation' in the language's font, aligned for
+    its writing direction. Shared between renders, so callers must not modify it.
+    """
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(
+        name='Center',
+        parent=styles['Heading2'],
+        alignment=TA_CENTER
+    ))
+    try:
+        font_name = get_translation_font(language)
+    except Exception as e:
+        print(f"Error registering font for {language}: {str(e)}")
+        font_name = None
+    styles.add(ParagraphStyle(
+        name='Translation',
+        parent=styles['Normal'],
+        fontName=font_name or 'Helvetica-Oblique',
+        textColor=(0.4, 0.4, 0.4),
+        fontSize=10 if font_name else styles['Normal'].fontSize,
+        alignment=TA_RIGHT if language.lower() in RTL_LANGUAGES else TA_LEFT
+    ))
+    return styles
+
+def format_referral(referral):
+    """One-line description of a specialist referral"""
+    specialist = referral.get('specialist', {})
+    specialist_name = specialist.get('name', 'Unknown Specialist')
+    specialist_category = specialist.get('category', 'Unknown Category')
+    reason = referral.get('reason', 'No reason specified')
+    return f"{specialist_name} ({specialist_category}) - {reason}"
+
+def format_medication_summary(med):
+    """One-line description of a medication row, used for its translation"""
+    med_str = f"{med.get('medication', '')}"
+    if med.get('dosage'): med_str += f" - {med.get('dosage')}"
+    if med.get('frequency'): med_str += f" - {med.get('frequency')}"
+    if med.get('duration'): med_str += f" - {med.get('duration')}"
+    if med.get('side_effects'): med_str += f" (Side effects: {med.get('side_effects')})"
+    if med.get('interactions'): med_str += f" (Interactions: {med.get('interactions')})"
+    if med.get('pregnancy_safety'): med_str += f" (Pregnancy safety: {med.get('pregnancy_safety')})"
+    return med_str
+
+def prescription_model(patient_data, diagnosis, prescription, medications=None, additional_instructions="",
+                       referrals=None, tests=None, labels=None, translations=None, date=None):
+    """
+    Everything a prescription document shows, with translations resolved, as
+    plain dicts and strings. medications is the parsed medication table (None
+    prints the prescription as text), referrals are referral dicts, and labels
+    and translations map English text to the patient's language.
+    """
+    language = patient_data.get('language', 'English')
+    needs_translation = language.lower() != 'english'
+    labels = labels or {}
+    translations = translations or {}
+    date = date or datetime.now().strftime('%Y-%m-%d')
+
+    def translate(text):
+        if not needs_translation or not text:
+            return None
+        return labels.get(text) or translations.get(text)
+
+    def section(heading, text=None):
+        return {
+            "heading": heading,
+            "heading_translation": translate(heading),
+            "text": text,
+            "translation": translate(text)
+        }
+
+    def items(texts):
+        return [{"text": text, "translation": translate(text)} for text in texts]
+
+    patient = []
+    for label, value in (("Patient", patient_data.get('name', 'N/A')), ("Age", patient_data.get('age', 'N/A'))):
+        label_translation = translate(label)
+        patient.append({
+            "label": label,
+            "value": value,
+            "translation": f"{label_translation}: {value}" if label_translation else None
+        })
+    gender = patient_data.get('gender', 'N/A')
+    gender_label, gender_value = translate("Gender"), translate(gender)
+    patient.append({
+        "label": "Gender",
+        "value": gender,
+        "translation": f"{gender_label}: {gender_value}" if gender_label and gender_value else None
+    })
+    date_label = translate("Date")
+    patient.append({"label": "Date", "value": date, "translation": f"{date_label}: {date}" if date_label else None})
+
+    model = {
+        "language": language,
+        "needs_translation": needs_translation,
+        "direction": "rtl" if language.lower() in RTL_LANGUAGES else "ltr",
+        "date": date,
+        "title": {"text": "Medical Prescription", "translation": translate("Medical Prescription")},
+        "patient": patient,
+        "diagnosis": section("Diagnosis", diagnosis),
+        "referrals": None,
+        "prescription": section("Prescription", prescription),
+        "medication_columns": [{"key": key, "label": label} for key, label in MEDICATION_COLUMNS],
+        "medications": None,
+        "instructions": None,
+        "tests": None,
+        "notice": (f"This prescription includes English and {language} text." if needs_translation
+                   else "This prescription is in English only.")
+    }
+    if referrals:
+        model["referrals"] = dict(section("Referrals"), items=items(format_referral(r) for r in referrals))
+    if medications is not None:
+        model["medications"] = []
+        for med in medications:
+            summary = format_medication_summary(med)
+            row = {key: med.get(key, '') for key, _ in MEDICATION_COLUMNS}
+            model["medications"].append(dict(row, summary=summary, translation=translate(summary)))
+        if additional_instructions and additional_instructions.strip():
+            model["instructions"] = section("Additional Instructions", additional_instructions)
+    if tests:
+        model["tests"] = dict(section("Recommended Medical Tests"), items=items(tests))
+    return model
+
+def nl2br(text):
+    """Escape text for HTML and turn its newlines into <br> tags"""
+    if not text:
+        return ""
+    return escape(text).replace("\n", Markup("<br>"))
+
+@functools.lru_cache(maxsize=None)
+def get_template_environment():
+    """Jinja2 environment for templates/, with compiled templates cached on disk"""
+    os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        bytecode_cache=FileSystemBytecodeCache(JINJA_CACHE_DIR),
+        autoescape=select_autoescape(["html"]),
+        auto_reload=False,
+        keep_trailing_newline=True
+    )
+    env.filters["nl2br"] = nl2br
+    return env
+
+@functools.lru_cache(maxsize=None)
+def qr_code_data_uri(path=QR_CODE_PATH):
+    """The clinic's QR code as a data: URI for embedding in HTML, or None if missing"""
+    try:
+        with open(path, "rb") as f:
+            return "data:image/png;base64," + base64.b64encode(f.read()).decode("utf-8")
+    except OSError as e:
+        print(f"QR code image not found: {e}")
+        return None
+
+def render_prescription_html(model):
+    """The prescription as an HTML document (RTL-aware, printable)"""
+    template = get_template_environment().get_template("prescription.html")
+    return template.render(model=model, qr_code=qr_code_data_uri())
+
+def render_prescription_text(model):
+    """The prescription as plain text"""
+    return get_template_environment().get_template("prescription.txt").render(model=model)
+
+def prescription_story(model, styles):
+    """ReportLab flowables for a prescription model, in the given stylesheet"""
+    story = []
+
+    def add_translation(text, template="({})"):
+        if text:
+            story.append(Paragraph(template.format(text.replace('\n', '<br/>')), styles['Translation']))
+
+    def add_heading(section):
+        story.append(Paragraph(f"<b>{section['heading']}:</b>", styles['Heading3']))
+        add_translation(section['heading_translation'])
+
+    # Header
+    story.append(Paragraph(model['title']['text'], styles['Center']))
+    add_translation(model['title']['translation'])
+    story.append(Spacer(1, 12))
+
+    # Patient information
+    for field in model['patient']:
+        story.append(Paragraph(f"<b>{field['label']}:</b> {field['value']}", styles['Normal']))
+        add_translation(field['translation'])
+    story.append(Spacer(1, 12))
+
+    # Diagnosis
+    add_heading(model['diagnosis'])
+    story.append(Paragraph(model['diagnosis']['text'].replace('\n', '<br/>'), styles['Normal']))
+    add_translation(model['diagnosis']['translation'], "{}")
+    story.append(Spacer(1, 12))
+
+    # Referrals
+    if model['referrals']:
+        add_heading(model['referrals'])
+        for item in model['referrals']['items']:
+            story.append(Paragraph(f"• {item['text']}", styles['Normal']))
+            add_translation(item['translation'])
+        story.append(Spacer(1, 12))
+
+    # Prescription
+    add_heading(model['prescription'])
+    if model['medications'] is not None:
+        # Table of medications
+        story.append(Spacer(1, 12))
+        story.append(Paragraph("<b>Medications:</b>", styles['Heading3']))
+        table_data = [[column['label'] for column in model['medication_columns']]]
+        for med in model['medications']:
+            table_data.append([med[column['key']] for column in model['medication_columns']])
+        table = Table(table_data)
+        table.setStyle(MEDICATION_TABLE_STYLE)
+        story.append(table)
+
+        if model['instructions']:
+            story.append(Spacer(1, 12))
+            story.append(Paragraph(f"<b>{model['instructions']['heading']}:</b>", styles['Heading3']))
+            story.append(Paragraph(model['instructions']['text'].replace('\n', '<br/>'), styles['Normal']))
+            add_translation(model['instructions']['translation'], "{}")
+    else:
+        # Raw prescription text
+        story.append(Paragraph(model['prescription']['text'].replace('\n', '<br/>'), styles['Normal']))
+        add_translation(model['prescription']['translation'], "{}")
+
+    # Tests
+    if model['tests']:
+        story.append(Spacer(1, 12))
+        add_heading(model['tests'])
+        for item in model['tests']['items']:
+            story.append(Paragraph(f"• {item['text']}", styles['Normal']))
+            add_translation(item['translation'])
+
+    story.append(Spacer(1, 24))
+
+    # Language notice
+    story.append(Paragraph(model['notice'], styles['Italic']))
+    return story
+
+def render_prescription_reportlab(model, output, styles=None):
+    """
+    Write the prescription PDF to output (a path or a binary file) with
+    ReportLab, using the cached stylesheet for the model's language unless
+    styles is given.
+    """
+    styles = styles or get_prescription_styles(model['language'])
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=letter,
+        rightMargin=72,
+        leftMargin=72,
+        topMargin=72,
+        bottomMargin=72
+    )
+    doc.build(prescription_story(model, styles))
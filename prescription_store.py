@@ -0,0 +1,144 @@
+"""
+Content-addressed storage for prescription PDFs, owned by the API.
+
+Each file is stored once under its SHA-256 (data/prescription/ab/abcdef....pdf),
+so re-saving the same PDF costs nothing and the database only needs the hash.
+Size and hash are recorded in the prescription_files table.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime
+
+PRESCRIPTION_STORE_DIR = os.path.join("data", "prescription")
+
+# Uploads larger than this are rejected
+MAX_PRESCRIPTION_BYTES = 20 * 1024 * 1024
+
+# Bytes read per chunk when serving a file
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+PDF_MAGIC = b"%PDF-"
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+class UploadTooLarge(Exception):
+    pass
+
+class NotAPdf(Exception):
+    pass
+
+def is_sha256(value):
+    return bool(value and _SHA256.match(value))
+
+def store_path(sha256, store_dir=PRESCRIPTION_STORE_DIR):
+    # Two-character fan-out keeps directories small
+    return os.path.join(store_dir, sha256[:2], f"{sha256}.pdf")
+
+class PrescriptionUpload:
+    """
+    Incremental writer for one upload: feed chunks to write(), then call finish()
+    to move the file to its content address, or discard() to throw it away.
+    """
+
+    def __init__(self, store_dir=PRESCRIPTION_STORE_DIR, max_bytes=MAX_PRESCRIPTION_BYTES):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        # First bytes of the upload, kept until the whole PDF magic has arrived
+        self._head = b""
+        os.makedirs(store_dir, exist_ok=True)
+        # Same filesystem as the final location, so finish() is an atomic rename
+        fd, self._partial_path = tempfile.mkstemp(suffix=".part", dir=store_dir)
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        if len(self._head) < len(PDF_MAGIC):
+            # The magic can be split over several short chunks
+            self._head += chunk[:len(PDF_MAGIC) - len(self._head)]
+            if not PDF_MAGIC.startswith(self._head):
+                raise NotAPdf("Upload is not a PDF file")
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def finish(self):
+        """Returns (sha256, size, path). An identical file already stored is reused."""
+        self._file.close()
+        if self.size < len(PDF_MAGIC):
+            os.remove(self._partial_path)
+            raise NotAPdf("Upload is not a PDF file")
+        sha256 = self._hash.hexdigest()
+        path = store_path(sha256, self.store_dir)
+        if os.path.exists(path):
+            os.remove(self._partial_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._partial_path, path)
+        return sha256, self.size, path
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self._partial_path):
+            os.remove(self._partial_path)
+
+def store_bytes(data, store_dir=PRESCRIPTION_STORE_DIR):
+    """Store a PDF held in memory; returns (sha256, size, path)"""
+    upload = PrescriptionUpload(store_dir)
+    try:
+        upload.write(data)
+        return upload.finish()
+    except Exception:
+        upload.discard()
+        raise
+
+def record_file(conn, sha256, size):
+    """Register a stored file in the caller's transaction"""
+    conn.execute(
+        "INSERT OR IGNORE INTO prescription_files (sha256, size, created_at) VALUES (?, ?, ?)",
+        (sha256, size, datetime.now().isoformat())
+    )
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single-range "bytes=" header, or ValueError if
+    the range cannot be satisfied. None for no range, and for ranges this store
+    does not support (multiple ranges, other units), which RFC 9110 lets a
+    server ignore by sending the whole file.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError(f"Unsatisfiable range: {header}")
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(f"Unsatisfiable range: {header}")
+    return start, end
+
+def iter_file(path, start, end, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Yield bytes start..end (inclusive) of a file"""
+    remaining = end - start + 1
+    with open(path, "rb") as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -0,0 +1,208 @@
+"""
+HTML-to-PDF rendering service built on wkhtmltopdf.
+
+wkhtmltopdf has no persistent or server mode, so every document is still one
+process. The service keeps everything around that process warm: the binary is
+located once, HTML goes in over stdin and the PDF comes back over stdout (no
+temp files), and a fixed pool of worker threads takes jobs from a queue so
+concurrent sessions render in parallel, one process per core, instead of
+either serializing or oversubscribing the machine.
+
+    python render_service.py prescription.html --repeat 20
+"""
+import argparse
+import functools
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import Future
+
+# Renders allowed at once; wkhtmltopdf is single-threaded, so one per core
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", str(os.cpu_count() or 2)))
+
+# Seconds before a wkhtmltopdf process is killed
+RENDER_TIMEOUT_SECONDS = float(os.environ.get("RENDER_TIMEOUT_SECONDS", "60"))
+
+DEFAULT_OPTIONS = [
+    "--quiet",
+    "--encoding", "UTF-8",
+    "--margin-top", "20",
+    "--margin-right", "20",
+    "--margin-bottom", "20",
+    "--margin-left", "20"
+]
+
+class RenderError(Exception):
+    pass
+
+@functools.lru_cache(maxsize=None)
+def find_wkhtmltopdf():
+    """Path of the wkhtmltopdf binary (WKHTMLTOPDF_PATH or PATH), looked up once per process"""
+    configured = os.environ.get("WKHTMLTOPDF_PATH")
+    if configured and os.access(configured, os.X_OK):
+        return configured
+    return shutil.which("wkhtmltopdf")
+
+class RenderJob:
+    def __init__(self, html, options):
+        self.html = html
+        self.options = options
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+        self.wait_seconds = None
+        self.render_seconds = None
+
+class RenderService:
+    """Queue of HTML-to-PDF jobs served by a fixed number of worker threads"""
+
+    def __init__(self, workers=RENDER_WORKERS, timeout=RENDER_TIMEOUT_SECONDS, binary=None):
+        self.binary = binary or find_wkhtmltopdf()
+        self.workers = workers
+        self.timeout = timeout
+        self._jobs = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopped = False
+        self.completed = 0
+        self.failed = 0
+        self.total_wait_seconds = 0.0
+        self.total_render_seconds = 0.0
+        self.max_render_seconds = 0.0
+
+    @property
+    def available(self):
+        return self.binary is not None
+
+    def _start(self):
+        # Threads are started on the first job so an unused service costs nothing
+        with self._lock:
+            if self._threads or self._stopped:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"render-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, html, options=None):
+        """Queue an HTML document; returns a Future resolving to the PDF bytes"""
+        if not self.available:
+            raise RenderError("wkhtmltopdf not found")
+        if self._stopped:
+            raise RenderError("Render service is shut down")
+        self._start()
+        job = RenderJob(html, DEFAULT_OPTIONS if options is None else options)
+        self._jobs.put(job)
+        return job.future
+
+    def render(self, html, options=None, timeout=None):
+        """Render one document and wait for it"""
+        return self.submit(html, options).result(timeout=timeout)
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            started = time.perf_counter()
+            job.wait_seconds = started - job.enqueued_at
+            try:
+                pdf = self._run(job)
+            except Exception as e:
+                job.render_seconds = time.perf_counter() - started
+                self._record(job, failed=True)
+                job.future.set_exception(e)
+            else:
+                job.render_seconds = time.perf_counter() - started
+                self._record(job, failed=False)
+                job.future.set_result(pdf)
+
+    def _run(self, job):
+        # "-" for input and output: HTML on stdin, PDF on stdout
+        cmd = [self.binary, *job.options, "-", "-"]
+        try:
+            result = subprocess.run(
+                cmd,
+                input=job.html.encode("utf-8") if isinstance(job.html, str) else job.html,
+                capture_output=True,
+                timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired:
+            raise RenderError(f"wkhtmltopdf timed out after {self.timeout:.0f}s")
+        # wkhtmltopdf exits with 1 on some recoverable network errors but still writes the PDF
+        if not result.stdout.startswith(b"%PDF"):
+            raise RenderError(result.stderr.decode("utf-8", "replace").strip() or f"exit code {result.returncode}")
+        return result.stdout
+
+    def _record(self, job, failed):
+        with self._lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+            self.total_wait_seconds += job.wait_seconds
+            self.total_render_seconds += job.render_seconds
+            self.max_render_seconds = max(self.max_render_seconds, job.render_seconds)
+
+    def stats(self):
+        with self._lock:
+            jobs = self.completed + self.failed
+            return {
+                "binary": self.binary,
+                "workers": self.workers,
+                "queued": self._jobs.qsize(),
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_wait_seconds": round(self.total_wait_seconds / jobs, 4) if jobs else 0.0,
+                "avg_render_seconds": round(self.total_render_seconds / jobs, 4) if jobs else 0.0,
+                "max_render_seconds": round(self.max_render_seconds, 4)
+            }
+
+    def shutdown(self):
+        with self._lock:
+            self._stopped = True
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_render_service():
+    """The process-wide render service"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = RenderService()
+        return _service
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render HTML files to PDF through the render service")
+    parser.add_argument("html_files", nargs="+")
+    parser.add_argument("--repeat", type=int, default=1, help="Render every file this many times")
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS)
+    args = parser.parse_args()
+
+    service = RenderService(workers=args.workers)
+    if not service.available:
+        raise SystemExit("wkhtmltopdf not found")
+    sources = []
+    for path in args.html_files:
+        with open(path, encoding="utf-8") as f:
+            sources.append(f.read())
+
+    start = time.perf_counter()
+    futures = [service.submit(html) for html in sources * args.repeat]
+    sizes = [len(future.result()) for future in futures]
+    elapsed = time.perf_counter() - start
+    service.shutdown()
+
+    print(f"{len(sizes)} PDFs ({sum(sizes)} bytes) in {elapsed:.2f}s ({len(sizes) / elapsed:.1f}/s)")
+    for key, value in service.stats().items():
+        print(f"  {key}: {value}")
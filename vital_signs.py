@@ -0,0 +1,58 @@
+"""
+Parsers for the free-text vital signs entered in the app ("37.2°C", "130/85").
+
+The text is kept for display; the numeric values go to the temp_c, systolic and
+diastolic columns so range queries can use an index. Anything that does not
+parse to a plausible value becomes None rather than a guess.
+"""
+import re
+
+_NUMBER = re.compile(r"[-+]?\d+(?:[.,]\d+)?")
+_BLOOD_PRESSURE = re.compile(r"(\d{2,3})\s*(?:/|\\|over)\s*(\d{2,3})", re.IGNORECASE)
+
+# Plausible ranges; values outside them are treated as typos
+TEMP_C_RANGE = (25.0, 45.0)
+SYSTOLIC_RANGE = (50, 300)
+DIASTOLIC_RANGE = (20, 200)
+
+def parse_temperature_c(text):
+    """Temperature in °C from text like '37.2°C', '37.2 C', '99.1°F' or '37.2'"""
+    if text is None:
+        return None
+    if isinstance(text, (int, float)):
+        value, unit = float(text), ""
+    else:
+        match = _NUMBER.search(str(text))
+        if not match:
+            return None
+        value = float(match.group().replace(",", "."))
+        unit = str(text)[match.end():].strip().lstrip("°º").strip()[:1].upper()
+    # A bare number above the Celsius range is a Fahrenheit reading
+    if unit == "F" or (unit != "C" and value > TEMP_C_RANGE[1]):
+        value = (value - 32) * 5 / 9
+    value = round(value, 1)
+    return value if TEMP_C_RANGE[0] <= value <= TEMP_C_RANGE[1] else None
+
+def parse_blood_pressure(text):
+    """(systolic, diastolic) in mmHg from text like '130/85' or '130 / 85 mmHg'"""
+    if not text:
+        return None, None
+    match = _BLOOD_PRESSURE.search(str(text))
+    if not match:
+        return None, None
+    systolic, diastolic = int(match.group(1)), int(match.group(2))
+    if not (SYSTOLIC_RANGE[0] <= systolic <= SYSTOLIC_RANGE[1]
+            and DIASTOLIC_RANGE[0] <= diastolic <= DIASTOLIC_RANGE[1]
+            and diastolic < systolic):
+        return None, None
+    return systolic, diastolic
+
+def numeric_vitals(temperature, blood_pressure):
+    """(temp_c, systolic, diastolic) for the numeric columns"""
+    systolic, diastolic = parse_blood_pressure(blood_pressure)
+    return parse_temperature_c(temperature), systolic, diastolic
+
+def numeric_vitals_from_dict(vital_signs):
+    """numeric_vitals for a consultation's vital_signs dict"""
+    vital_signs = vital_signs or {}
+    return numeric_vitals(vital_signs.get("temperature"), vital_signs.get("blood_pressure"))